@@ -20,7 +20,7 @@ class AnalysisAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'score_total', 'is_unlocked', 'created_at']
     list_filter = ['is_unlocked', 'created_at']
     search_fields = ['user__email']
-    readonly_fields = ['user', 'responses', 'score_total', 'created_at', 'updated_at']
+    readonly_fields = ['user', 'responses_display', 'score_total', 'created_at', 'updated_at']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -28,7 +28,7 @@ class AnalysisAdmin(admin.ModelAdmin):
             'fields': ('user', 'is_unlocked', 'score_total')
         }),
         ('Data', {
-            'fields': ('responses',),
+            'fields': ('responses_display',),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -36,6 +36,11 @@ class AnalysisAdmin(admin.ModelAdmin):
         }),
     )
     
+    def responses_display(self, obj):
+        # JSON oder gepackt gespeichert - Anzeige immer als JSON-Liste
+        return obj.get_responses()
+    responses_display.short_description = 'Responses'
+    
     def has_add_permission(self, request):
         # Analysen sollen nur über Frontend erstellt werden
         return False
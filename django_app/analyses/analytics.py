@@ -2,14 +2,20 @@
 Analytics Service für Data-Driven Insights
 Percentile-Berechnung, Altersgruppen-Vergleiche, Regional Stats
 """
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Avg, Count, Q
 from django.db.models.functions import Cast
 from django.db.models import FloatField
+from redflag_project.config import Config
 from .models import Analysis, CategoryScore
 from accounts.models import UserProfile
 import math
 
 
+AGE_GROUP_STATS_CACHE_KEY = 'analytics:age_group_statistics'
+
+
 class AnalyticsService:
     """
     Service für fortgeschrittene Analytics und Insights.
@@ -43,6 +49,21 @@ class AnalyticsService:
             pass
         return None
     
+    @classmethod
+    def age_group_for_birth_year(cls, birth_year, year):
+        """
+        Altersgruppe nach Geburtsjahr relativ zu einem Kalenderjahr
+        (min_age < year - Geburtsjahr <= max_age). Gespeichert als
+        Analysis.author_age_group mit dem Jahr der Erstellung.
+        """
+        if birth_year is None:
+            return None
+        year_age = year - birth_year
+        for min_age, max_age, label in cls.AGE_GROUPS:
+            if min_age < year_age <= max_age:
+                return label
+        return None
+    
     @classmethod
     def calculate_percentile(cls, score_total, age_group=None, country=None):
         """
@@ -58,34 +79,16 @@ class AnalyticsService:
         Returns:
             dict mit Percentile-Info
         """
-        # Base Query: Alle Analysen
-        query = Analysis.objects.filter(is_unlocked=True)
-        
-        # Filter nach Altersgruppe
-        if age_group:
-            min_age, max_age, _ = next((g for g in cls.AGE_GROUPS if g[2] == age_group), (None, None, None))
-            if min_age and max_age:
-                # Komplexe Query: Join mit UserProfile über User
-                from datetime import date
-                today = date.today()
-                
-                # Berechne Geburtsjahr-Range für Altersgruppe
-                min_birth_year = today.year - max_age
-                max_birth_year = today.year - min_age
-                
-                query = query.filter(
-                    user__profile__birthdate__year__gte=min_birth_year,
-                    user__profile__birthdate__year__lt=max_birth_year
-                )
+        from .histograms import ScoreHistogramService
         
-        # Filter nach Land
-        if country:
-            query = query.filter(user__profile__country=country)
+        # Segment aus Histogramm statt alle Scores zu laden: O(501)
+        if age_group and not any(g[2] == age_group for g in cls.AGE_GROUPS):
+            age_group = None
+        segment = ScoreHistogramService.segment_key(age_group, country)
+        histogram = ScoreHistogramService.percentile(score_total, segment)
+        total = histogram['total']
         
-        # Hole alle Scores sorted
-        all_scores = list(query.values_list('score_total', flat=True).order_by('score_total'))
-        
-        if not all_scores:
+        if not total:
             return {
                 'percentile': None,
                 'total_comparisons': 0,
@@ -95,11 +98,8 @@ class AnalyticsService:
             }
         
         # Berechne Percentile
-        better_than_count = sum(1 for s in all_scores if s < score_total)
-        total = len(all_scores)
-        
-        percentile = math.floor((better_than_count / total) * 100) if total > 0 else 0
-        average_score = sum(all_scores) / total if total > 0 else 0
+        percentile = math.floor((histogram['better_than_count'] / total) * 100)
+        average_score = histogram['average_score']
         
         return {
             'percentile': percentile,
@@ -130,38 +130,51 @@ class AnalyticsService:
         Hole Durchschnitts-Scores für alle Altersgruppen.
         
         Premium Feature: "Durchschnitts-Score nach Altersgruppe"
+        Gecacht (Config.AGE_GROUP_STATS_CACHE_SECONDS), invalidiert beim Entsperren.
         
         Returns:
             Liste von dicts mit Altersgruppen-Stats
         """
-        from datetime import date
-        today = date.today()
+        stats = cache.get(AGE_GROUP_STATS_CACHE_KEY)
+        if stats is None:
+            stats = cls._compute_age_group_statistics()
+            cache.set(AGE_GROUP_STATS_CACHE_KEY, stats, timeout=Config.AGE_GROUP_STATS_CACHE_SECONDS)
+        return stats
+    
+    @classmethod
+    def _compute_age_group_statistics(cls):
+        """
+        Eine Query über analyses: GROUP BY author_age_group (Altersgruppe bei
+        Erstellung), Index-Only-Scan über den partiellen Segment-Index.
+        """
+        rows = (
+            Analysis.objects.filter(is_unlocked=True, author_age_group__isnull=False)
+            .values('author_age_group')
+            .annotate(count=Count('*'), avg_score=Avg('score_total'))
+            .order_by()
+        )
+        by_label = {row['author_age_group']: row for row in rows}
         
         stats = []
-        
         for min_age, max_age, label in cls.AGE_GROUPS:
-            min_birth_year = today.year - max_age
-            max_birth_year = today.year - min_age
-            
-            group_analyses = Analysis.objects.filter(
-                is_unlocked=True,
-                user__profile__birthdate__year__gte=min_birth_year,
-                user__profile__birthdate__year__lt=max_birth_year
-            )
-            
-            count = group_analyses.count()
-            if count > 0:
-                avg_score = group_analyses.aggregate(Avg('score_total'))['score_total__avg']
+            row = by_label.get(label)
+            if row and row['count'] > 0:
+                avg_score = row['avg_score']
                 stats.append({
                     'age_group': label,
                     'min_age': min_age,
                     'max_age': max_age,
                     'avg_score': round(avg_score, 2) if avg_score else 0,
-                    'count': count,
+                    'count': row['count'],
                 })
         
         return stats
     
+    @staticmethod
+    def invalidate_age_group_statistics():
+        """Altersgruppen-Cache verwerfen (nach dem Commit)."""
+        transaction.on_commit(lambda: cache.delete(AGE_GROUP_STATS_CACHE_KEY))
+    
     @classmethod
     def get_regional_heatmap_data(cls):
         """
@@ -172,24 +185,10 @@ class AnalyticsService:
         Returns:
             Liste von dicts mit Land-Stats
         """
-        # Aggregiere nach Land
-        country_stats = Analysis.objects.filter(
-            is_unlocked=True,
-            user__profile__country__isnull=False
-        ).values('user__profile__country').annotate(
-            avg_score=Avg('score_total'),
-            count=Count('id')
-        ).filter(count__gte=5)  # Mindestens 5 Analysen für Statistik
+        from .rollups import CountryRollupService
         
-        results = []
-        for stat in country_stats:
-            results.append({
-                'country': stat['user__profile__country'],
-                'avg_score': round(stat['avg_score'], 2) if stat['avg_score'] else 0,
-                'count': stat['count'],
-            })
-        
-        return sorted(results, key=lambda x: x['avg_score'], reverse=True)
+        # Aus dem Länder-Rollup, mindestens 5 Analysen für Statistik
+        return CountryRollupService.heatmap(min_count=5)
     
     @classmethod
     def get_category_heatmap_by_country(cls, category):
@@ -202,38 +201,44 @@ class AnalyticsService:
         Returns:
             Liste von dicts mit Land und Category Score
         """
-        country_stats = CategoryScore.objects.filter(
-            category=category,
-            analysis__is_unlocked=True,
-            analysis__user__profile__country__isnull=False
-        ).values('analysis__user__profile__country').annotate(
-            avg_score=Avg('score'),
-            count=Count('id')
-        ).filter(count__gte=3)  # Mindestens 3 für Category
-        
-        results = []
-        for stat in country_stats:
-            results.append({
-                'country': stat['analysis__user__profile__country'],
-                'category': category,
-                'avg_score': round(stat['avg_score'], 2) if stat['avg_score'] else 0,
-                'count': stat['count'],
-            })
+        from .rollups import CountryRollupService
         
-        return sorted(results, key=lambda x: x['avg_score'], reverse=True)
+        # Aus dem Länder-Rollup, mindestens 3 für Category
+        results = CountryRollupService.heatmap(category=category, min_count=3)
+        for result in results:
+            result['category'] = category
+        return results
+    
+    @classmethod
+    def get_user_segment(cls, user):
+        """Altersgruppe und Land des Users heute (Vergleichsgruppe der Premium Insights)."""
+        country = user.profile.country if hasattr(user, 'profile') else None
+        return cls.get_user_age_group(user), country
     
     @classmethod
     def get_user_premium_insights(cls, analysis):
         """
         Generiere Premium Insights für eine Analyse.
         Nur für Premium Users.
+        Gecacht pro Statistik-Version (Histogramme/Rollups unverändert = gleiches Ergebnis).
+        Die globalen Tabellen (get_age_group_statistics, get_regional_heatmap_data)
+        sind für alle User gleich und werden separat geladen.
         
         Returns:
-            dict mit allen Premium Insights
+            dict mit Percentile, Altersgruppe und Land
         """
+        from .stats_version import current_stats_version
+        
         user = analysis.user
-        age_group = cls.get_user_age_group(user)
-        country = user.profile.country if hasattr(user, 'profile') else None
+        age_group, country = cls.get_user_segment(user)
+        
+        cache_key = (
+            f'analytics:premium_insights:{analysis.pk}:{analysis.score_total}:'
+            f'{age_group}:{country}:{current_stats_version()}'
+        )
+        insights = cache.get(cache_key)
+        if insights is not None:
+            return insights
         
         # Percentile Berechnung
         percentile_data = cls.calculate_percentile(
@@ -242,16 +247,10 @@ class AnalyticsService:
             country=country
         )
         
-        # Altersgruppen-Vergleich
-        age_stats = cls.get_age_group_statistics()
-        
-        # Regional Vergleich
-        regional_stats = cls.get_regional_heatmap_data()
-        
-        return {
+        insights = {
             'percentile': percentile_data,
             'age_group': age_group,
-            'age_group_stats': age_stats,
-            'regional_stats': regional_stats[:10],  # Top 10 Länder
             'country': country,
         }
+        cache.set(cache_key, insights, timeout=Config.ANALYSIS_DETAIL_CACHE_SECONDS)
+        return insights
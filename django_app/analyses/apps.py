@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AnalysesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analyses'
+
+    def ready(self):
+        # Importiere Signals für Score-Histogramme
+        import analyses.signals
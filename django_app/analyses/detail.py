@@ -0,0 +1,172 @@
+"""
+Context-Assembler für die Analyse-Detailseite
+Die Seite selbst kostet nur die Analyse-Zeile; alles Statistische wird nach
+dem Seitenaufbau per HTMX (hx-trigger="load") als Fragment nachgeladen:
+
+- Analyse + User + Subscription + Profil: eine Query (select_related)
+- Ergebnis-Block (Category Scores, Top Red Flags): gerendert und gecacht unter
+  (Analyse-ID, updated_at, Katalog-Version)
+- Fragment "Vergleich mit Durchschnitt": pro Analyse, gecacht unter
+  (Analyse-ID, updated_at, Statistik-Version)
+- Fragment "Premium Insights" (Percentile im eigenen Segment): pro Analyse
+- Geteilte Fragmente (Altersgruppen, Länder): für alle User gleich, einmal
+  pro Statistik-Version gerendert
+
+Die Seitenkosten bleiben damit unabhängig von der Größe des Datenbestands.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+
+from questionnaire.catalog import current_version
+from redflag_project.config import Config
+from subscriptions.models import Subscription
+
+from .analytics import AnalyticsService
+from .models import Analysis
+from .statistics import StatisticsService
+from .stats_version import current_stats_version
+
+
+UNLOCKED_TEMPLATE = 'analyses/partials/unlocked_content.html'
+COMPARISON_TEMPLATE = 'analyses/partials/comparison.html'
+PREMIUM_INSIGHTS_TEMPLATE = 'analyses/partials/premium_insights.html'
+
+# Geteilte Fragmente: Name (URL) → (Template, Context-Funktion)
+SHARED_FRAGMENTS = {
+    'age-groups': (
+        'analyses/partials/age_group_stats.html',
+        lambda: {'age_group_stats': AnalyticsService.get_age_group_statistics()},
+    ),
+    'regions': (
+        'analyses/partials/regional_stats.html',
+        lambda: {'regional_stats': AnalyticsService.get_regional_heatmap_data()[:10]},  # Top 10 Länder
+    ),
+}
+
+
+class AnalysisDetailAssembler:
+    """
+    Baut den Context der Detailseite, des HTMX-Unlock-Fragments und der
+    nachgeladenen Fragmente.
+    Fat Service Pattern: Queries und Caching hier, Views nur für Ablauf.
+    """
+
+    @staticmethod
+    def queryset(user):
+        """Eigene Analysen inkl. User, Subscription und Profil (eine Query)."""
+        return Analysis.objects.filter(user=user).select_related('user__subscription', 'user__profile')
+
+    @staticmethod
+    def get_subscription(analysis) -> Subscription:
+        """Subscription aus dem select_related-Join, angelegt nur beim ersten Aufruf."""
+        try:
+            return analysis.user.subscription
+        except Subscription.DoesNotExist:
+            subscription, _ = Subscription.objects.get_or_create(user=analysis.user)
+            return subscription
+
+    @staticmethod
+    def share_url(request) -> str:
+        """Share-Link der Seite: Schema, Host und Pfad, ohne Query-String."""
+        return request.build_absolute_uri(request.path)
+
+    @classmethod
+    def cache_key(cls, request, analysis) -> str:
+        """
+        Key des gerenderten Ergebnis-Blocks. Der Share-Link geht als Hash ein,
+        da der Block ihn enthält - ohne Query-String, sonst legt jeder
+        ?x=... Aufruf einen eigenen Eintrag an.
+        """
+        url_hash = hashlib.md5(cls.share_url(request).encode()).hexdigest()[:12]
+        return f'analyses:detail:{analysis.pk}:{analysis.updated_at.timestamp()}:{current_version()}:{url_hash}'
+
+    @staticmethod
+    def unlocked_context(analysis) -> dict:
+        """Daten des Ergebnis-Blocks (Category Scores nur einmal geladen)."""
+        prefetch_related_objects([analysis], 'category_scores')
+        return {
+            'analysis': analysis,
+            'category_scores': analysis.category_scores.all(),
+            'top_red_flags': analysis.get_top_red_flags(limit=10),
+        }
+
+    @classmethod
+    def render_unlocked(cls, request, analysis) -> str:
+        """Gerenderter Ergebnis-Block aus dem Cache (bei Miss rendern und cachen)."""
+        key = cls.cache_key(request, analysis)
+        html = cache.get(key)
+        if html is None:
+            # Ohne RequestContext: der Block braucht nur den Share-Link, keine Context Processors
+            html = render_to_string(UNLOCKED_TEMPLATE, {
+                **cls.unlocked_context(analysis),
+                'share_url': cls.share_url(request),
+            })
+            cache.set(key, html, timeout=Config.ANALYSIS_DETAIL_CACHE_SECONDS)
+        return html
+
+    @classmethod
+    def build(cls, request, analysis) -> dict:
+        """Context der Detailseite (Statistik-Fragmente lädt die Seite nach)."""
+        subscription = cls.get_subscription(analysis)
+        context = {
+            'subscription': subscription,
+            'is_premium': subscription.is_premium,
+            'user_credits': request.user.credits,
+        }
+
+        if analysis.is_unlocked:
+            context['unlocked_html'] = cls.render_unlocked(request, analysis)
+            context['show_premium_features'] = subscription.is_premium
+            context['show_premium_paywall'] = not subscription.is_premium
+        return context
+
+    # --- Nachgeladene Fragmente -------------------------------------------
+
+    @staticmethod
+    def fragment_etag(analysis=None, segment=()) -> str:
+        """
+        ETag eines Fragments: Statistik-Version (+ Analyse-Stand bei Analyse-Fragmenten,
+        + Segment des Users, wenn der Inhalt davon abhängt - wie im Cache-Key).
+        """
+        version = current_stats_version()
+        if analysis is None:
+            return f'stats-{version}'
+        parts = [analysis.pk, int(analysis.updated_at.timestamp()), version, *segment]
+        return '-'.join(str(part) for part in parts)
+
+    @staticmethod
+    def render_comparison(analysis) -> str:
+        """Vergleich mit dem Durchschnitt, gecacht pro Analyse-Stand und Statistik-Version."""
+        key = f'analyses:comparison:{analysis.pk}:{analysis.updated_at.timestamp()}:{current_stats_version()}'
+        html = cache.get(key)
+        if html is None:
+            html = render_to_string(COMPARISON_TEMPLATE, {
+                'comparison': StatisticsService.compare_with_average(analysis),
+            })
+            cache.set(key, html, timeout=Config.ANALYSIS_DETAIL_CACHE_SECONDS)
+        return html
+
+    @staticmethod
+    def render_premium_insights(analysis) -> str:
+        """Premium Insights der Analyse (Daten gecacht pro Statistik-Version)."""
+        return render_to_string(PREMIUM_INSIGHTS_TEMPLATE, {
+            'analysis': analysis,
+            'insights': AnalyticsService.get_user_premium_insights(analysis),
+        })
+
+    @staticmethod
+    def render_shared(name: str) -> str:
+        """
+        Geteiltes Fragment (für alle User gleich): einmal pro Statistik-Version
+        gerendert. KeyError bei unbekanntem Namen.
+        """
+        template, get_context = SHARED_FRAGMENTS[name]
+        key = f'analyses:shared_fragment:{name}:{current_stats_version()}'
+        html = cache.get(key)
+        if html is None:
+            html = render_to_string(template, get_context())
+            cache.set(key, html, timeout=Config.ANALYSIS_DETAIL_CACHE_SECONDS)
+        return html
@@ -0,0 +1,67 @@
+"""
+Auslieferung generierter Dateien (Share-Grafiken, PDF-Reports)
+
+Django prüft nur die Berechtigung. Ist X_ACCEL_REDIRECT_PREFIX gesetzt und
+kommt der Request über nginx (Header X-Sendfile-Type: X-Accel-Redirect),
+antwortet die View mit leerem Body und X-Accel-Redirect auf eine interne
+nginx-Location; nginx streamt die Datei, der Worker ist sofort wieder frei.
+Ohne Proxy (runserver, direkter Zugriff auf gunicorn): FileResponse.
+"""
+import os
+import tempfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+from redflag_project.config import Config
+
+
+X_ACCEL_REDIRECT = 'X-Accel-Redirect'
+
+
+def write_atomic(filepath, write):
+    """
+    Schreibt über write(Datei-Objekt) in eine Temp-Datei im selben Verzeichnis
+    und benennt sie um: parallele Requests sehen nie eine halbe Datei.
+    """
+    directory = os.path.dirname(filepath)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            write(tmp_file)
+        os.chmod(tmp_path, 0o644)  # mkstemp legt 0600 an; nginx muss lesen können
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def uses_x_accel(request) -> bool:
+    """X-Accel-Redirect nur, wenn konfiguriert und nginx davor sitzt."""
+    return bool(Config.X_ACCEL_REDIRECT_PREFIX) and (
+        request.headers.get('X-Sendfile-Type') == X_ACCEL_REDIRECT
+    )
+
+
+def file_response(request, filepath, filename, content_type):
+    """
+    Download-Antwort für eine Datei unter MEDIA_ROOT (als Attachment).
+    Header wie Cache-Control/Content-Disposition reicht nginx bei
+    X-Accel-Redirect an den Client durch.
+    """
+    if not uses_x_accel(request):
+        return FileResponse(open(filepath, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+    relative = os.path.relpath(filepath, settings.MEDIA_ROOT)
+    if relative.startswith(os.pardir):
+        raise ValueError(f'{filepath} liegt nicht unter MEDIA_ROOT')
+    response = HttpResponse(content_type=content_type)
+    response[X_ACCEL_REDIRECT] = Config.X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+    response['Content-Disposition'] = content_disposition_header(as_attachment=True, filename=filename)
+    return response
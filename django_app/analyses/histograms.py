@@ -0,0 +1,181 @@
+"""
+Score-Histogramme für Percentile und Durchschnitte
+Statt bei jedem Request alle score_total Werte eines Segments zu laden,
+hält ScoreHistogram pro Segment die Anzahl je Score (501 Buckets, 0.00-5.00).
+Percentile und Durchschnitt kosten damit O(501) - unabhängig von der Tabellengröße.
+
+Gepflegt inkrementell bei Unlock, Rescoring und Löschen. Segmente kommen aus
+Analysis.author_age_group / author_country (Stand bei Erstellung), sind also
+stabil. rebuild() baut alles mit einer gruppierten Query (Index-Only-Scan)
+neu auf - z.B. nach backfill_analysis_segments oder als Reparatur.
+"""
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Analysis, ScoreHistogram
+from .stats_version import invalidate_statistics
+
+
+BUCKETS = 501
+
+GLOBAL_SEGMENT = 'global'
+
+UPSERT_BATCH_SIZE = 5000
+
+
+class ScoreHistogramService:
+    """
+    Service für Score-Histogramme pro Segment.
+    Fat Service Pattern: Segment-Logik und Upserts hier.
+    """
+
+    @staticmethod
+    def bucket(score) -> int:
+        """score_total (0.00-5.00) → Bucket-Index 0-500."""
+        return min(BUCKETS - 1, max(0, int(Decimal(str(score)) * 100)))
+
+    @staticmethod
+    def segment_key(age_group: Optional[str] = None, country: Optional[str] = None) -> str:
+        """Segment-Key für eine Filter-Kombination."""
+        if age_group and country:
+            return f'age_country:{age_group}|{country}'
+        if age_group:
+            return f'age:{age_group}'
+        if country:
+            return f'country:{country}'
+        return GLOBAL_SEGMENT
+
+    @classmethod
+    def segments_for(cls, age_group: Optional[str], country: Optional[str]) -> List[str]:
+        """Alle Segmente, in die eine Analyse fällt."""
+        segments = [GLOBAL_SEGMENT]
+        if age_group:
+            segments.append(cls.segment_key(age_group=age_group))
+        if country:
+            segments.append(cls.segment_key(country=country))
+        if age_group and country:
+            segments.append(cls.segment_key(age_group, country))
+        return segments
+
+    @classmethod
+    def segments_for_analyses(cls, analysis_ids: Iterable[int]) -> Dict[int, List[str]]:
+        """Segmente mehrerer Analysen mit einer Query (ohne Join)."""
+        rows = Analysis.objects.filter(id__in=list(analysis_ids)).values_list(
+            'id', 'author_age_group', 'author_country'
+        )
+        return {
+            analysis_id: cls.segments_for(age_group, country)
+            for analysis_id, age_group, country in rows
+        }
+
+    @staticmethod
+    def apply(deltas: Counter):
+        """
+        Addiert {(segment, bucket): delta} per Upsert (ein Statement je 5000 Deltas):
+        INSERT ... ON CONFLICT DO UPDATE SET count = count + delta.
+        Sortiert, damit parallele Upserts Zeilen in gleicher Reihenfolge sperren.
+        """
+        rows = [(segment, bucket, delta) for (segment, bucket), delta in sorted(deltas.items()) if delta]
+        if rows:
+            invalidate_statistics()
+        table = connection.ops.quote_name(ScoreHistogram._meta.db_table)
+        with connection.cursor() as cursor:
+            # Batches: SQLite erlaubt max. 32766 Parameter pro Statement
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start:start + UPSERT_BATCH_SIZE]
+                placeholders = ', '.join(['(%s, %s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} (segment, bucket, count) VALUES {placeholders} '
+                    f'ON CONFLICT (segment, bucket) DO UPDATE SET count = {table}.count + excluded.count',
+                    [value for row in batch for value in row],
+                )
+
+    @classmethod
+    def add(cls, analysis):
+        """Entsperrte Analyse in alle Segmente eintragen."""
+        cls._book(analysis, +1)
+
+    @classmethod
+    def remove(cls, analysis):
+        """Analyse aus allen Segmenten austragen (Löschen)."""
+        cls._book(analysis, -1)
+
+    @classmethod
+    def _book(cls, analysis, sign: int):
+        segments = cls.segments_for(analysis.author_age_group, analysis.author_country)
+        bucket = cls.bucket(analysis.score_total)
+        cls.apply(Counter({(segment, bucket): sign for segment in segments}))
+
+    @classmethod
+    def move_deltas(cls, changes: Dict[int, tuple]) -> Counter:
+        """
+        Deltas für geänderte Scores entsperrter Analysen.
+        Args: {analysis_id: (alter_score, neuer_score)}
+        """
+        deltas = Counter()
+        for analysis_id, segments in cls.segments_for_analyses(changes).items():
+            old_score, new_score = changes[analysis_id]
+            old_bucket, new_bucket = cls.bucket(old_score), cls.bucket(new_score)
+            if old_bucket == new_bucket:
+                continue
+            for segment in segments:
+                deltas[(segment, old_bucket)] -= 1
+                deltas[(segment, new_bucket)] += 1
+        return deltas
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls) -> int:
+        """
+        Baut alle Histogramme mit einer gruppierten Query neu auf.
+        Returns: Anzahl Histogramm-Zeilen
+        """
+        rows = Analysis.objects.filter(is_unlocked=True).values_list(
+            'score_total', 'author_age_group', 'author_country'
+        ).annotate(n=Count('*')).order_by()
+
+        counts = Counter()
+        for score_total, age_group, country, n in rows:
+            bucket = cls.bucket(score_total)
+            for segment in cls.segments_for(age_group, country):
+                counts[(segment, bucket)] += n
+
+        ScoreHistogram.objects.all().delete()
+        ScoreHistogram.objects.bulk_create([
+            ScoreHistogram(segment=segment, bucket=bucket, count=count)
+            for (segment, bucket), count in counts.items()
+            if count
+        ], batch_size=5000)
+        invalidate_statistics()
+        return len(counts)
+
+    @staticmethod
+    def get_counts(segment: str) -> List[int]:
+        """501 Bucket-Zähler eines Segments."""
+        counts = [0] * BUCKETS
+        for bucket, count in ScoreHistogram.objects.filter(segment=segment).values_list('bucket', 'count'):
+            counts[bucket] = count
+        return counts
+
+    @classmethod
+    def percentile(cls, score, segment: str = GLOBAL_SEGMENT) -> dict:
+        """
+        Exakter Percentile-Rang und Durchschnitt aus dem Histogramm.
+        Returns: {'total', 'better_than_count', 'average_score'} (average als Decimal)
+        """
+        counts = cls.get_counts(segment)
+        total = sum(counts)
+        if total == 0:
+            return {'total': 0, 'better_than_count': 0, 'average_score': Decimal('0')}
+
+        better_than_count = sum(counts[:cls.bucket(score)])
+        score_sum = sum(bucket * count for bucket, count in enumerate(counts))
+        return {
+            'total': total,
+            'better_than_count': better_than_count,
+            'average_score': Decimal(score_sum) / 100 / total,
+        }
@@ -1,57 +1,186 @@
 """
 Image Generator Service für Share-Grafiken
 Erstellt personalisierte Share-Images mit Pillow
+
+Fonts werden einmal pro Prozess geladen, die statischen Teile jedes Formats
+(Hintergrund, Karte/Kreis, Titel, Footer) einmal pro Prozess als Basis-Layer
+gezeichnet. Pro Analyse wird nur eine Kopie des Layers erstellt und Score
+plus Kategorie-Zeilen darauf gezeichnet.
+
+Download-Grafiken liegen inhaltsadressiert unter MEDIA_ROOT/share_images
+(<format>_<hash>.png, Hash über Format, Scores und TEMPLATE_VERSION):
+existiert die Datei zum Hash, wird nicht gerendert. Veraltete Varianten
+entfernt manage.py cleanup_share_images.
 """
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from io import BytesIO
+
 from PIL import Image, ImageDraw, ImageFont
 from django.conf import settings
-import os
+from django.db.models import prefetch_related_objects
+
+from .downloads import write_atomic
+
+
+FONT_BOLD = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+FONT_REGULAR = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+SHARE_IMAGE_DIR = 'share_images'
+
+
+@lru_cache(maxsize=None)
+def get_font(path, size):
+    """Font einmal pro Prozess laden (Fallback: Pillow-Default-Font)."""
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _text_width(draw, text, font):
+    """Breite von text in Pixeln."""
+    bbox = draw.textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0]
 
 
 class ShareImageGenerator:
     """Generiert personalisierte Share-Grafiken für Social Media"""
-    
+
     # Instagram Story Format
     IG_STORY_WIDTH = 1080
     IG_STORY_HEIGHT = 1920
-    
+
     # Standard Post Format
     POST_WIDTH = 1200
     POST_HEIGHT = 630
-    
+
+    # Open-Graph-Bild für Share-Links (social)
+    OG_WIDTH = 1200
+    OG_HEIGHT = 630
+
     # Farben
     RED_FLAG_COLOR = '#EF4444'
     WHITE = '#FFFFFF'
     GRAY_900 = '#111827'
     GRAY_100 = '#F3F4F6'
     GRAY_600 = '#4B5563'
-    
+
+    # Layout-Version: bei Änderungen am Aussehen erhöhen (neue Hashes, alte Dateien → GC)
+    TEMPLATE_VERSION = 1
+
+    # Download-Formate (URL) → Render-Methode
+    FORMATS = {
+        'story': 'render_instagram_story',
+        'post': 'render_standard_post',
+    }
+
+    # Inhaltsadressierte Dateien ändern sich nie: Browser-Cache 1 Jahr
+    CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+    # Vorgezeichnete Basis-Layer pro Format (prozessweit)
+    _base_layers = {}
+    _base_lock = threading.Lock()
+
     @classmethod
-    def generate_instagram_story(cls, analysis):
+    def _base_layer(cls, name, draw_base):
+        """Kopie des Basis-Layers name (beim ersten Aufruf mit draw_base gezeichnet)."""
+        base = cls._base_layers.get(name)
+        if base is None:
+            with cls._base_lock:
+                base = cls._base_layers.get(name)
+                if base is None:
+                    base = cls._base_layers[name] = draw_base()
+        return base.copy()
+
+    @classmethod
+    def clear_cache(cls):
+        """Fonts und Basis-Layer verwerfen (Benchmark, Tests)."""
+        get_font.cache_clear()
+        with cls._base_lock:
+            cls._base_layers.clear()
+
+    # --- Datei-Cache (inhaltsadressiert) --------------------------------
+
+    @classmethod
+    def content_hash(cls, format, analysis):
         """
-        Generiert Instagram Story Share-Grafik (1080x1920)
-        
-        Args:
-            analysis: Analysis Model Instance
-            
+        Hash über alles, was das Bild bestimmt: Format, Score, die gezeichneten
+        Category Scores und TEMPLATE_VERSION. Lädt Category Scores einmal
+        (prefetch), Renderer und Hash sehen dieselbe Liste.
+        """
+        prefetch_related_objects([analysis], 'category_scores')
+        category_scores = [(cs.category, str(cs.score)) for cs in analysis.category_scores.all()[:4]]
+        payload = json.dumps([format, cls.TEMPLATE_VERSION, str(analysis.score_total), category_scores])
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def image_dir():
+        return os.path.join(settings.MEDIA_ROOT, SHARE_IMAGE_DIR)
+
+    @classmethod
+    def image_path(cls, format, digest):
+        return os.path.join(cls.image_dir(), f'{format}_{digest}.png')
+
+    @classmethod
+    def get_image(cls, analysis, format, digest=None):
+        """
+        Pfad der Share-Grafik; gerendert nur, wenn die Datei zum Hash fehlt.
+
         Returns:
-            str: Pfad zur generierten Bilddatei
+            (Pfad, Hash)
+        """
+        if digest is None:
+            digest = cls.content_hash(format, analysis)
+        filepath = cls.image_path(format, digest)
+        if not os.path.exists(filepath):
+            # Atomar (Temp-Datei + Rename); gleicher Hash = gleicher Inhalt
+            img = getattr(cls, cls.FORMATS[format])(analysis)
+            write_atomic(filepath, lambda file: img.save(file, format='PNG'))
+        return filepath, digest
+
+    @classmethod
+    def stale_files(cls, min_age_seconds=3600):
         """
-        # Erstelle Bild
+        Dateien in share_images, die zu keiner aktuellen Variante gehören
+        (alter Score, alte TEMPLATE_VERSION, gelöschte Analyse, alte
+        share_<id>.png, liegengebliebene Temp-Dateien). Jüngere Dateien als
+        min_age_seconds bleiben liegen (gerade im Schreiben/Ausliefern).
+        """
+        from .models import Analysis
+
+        directory = cls.image_dir()
+        if not os.path.isdir(directory):
+            return []
+
+        current = set()
+        analyses = Analysis.objects.filter(is_unlocked=True).only('id', 'score_total').prefetch_related('category_scores')
+        for analysis in analyses.iterator(chunk_size=2000):
+            for format in cls.FORMATS:
+                current.add(os.path.basename(cls.image_path(format, cls.content_hash(format, analysis))))
+
+        cutoff = time.time() - min_age_seconds
+        stale = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name not in current and entry.stat().st_mtime < cutoff:
+                    stale.append(entry.path)
+        return stale
+
+    # --- Instagram Story ------------------------------------------------
+
+    @classmethod
+    def _draw_instagram_story_base(cls):
+        """Statische Teile der Story: Hintergrund, weiße Karte, Titel, Untertitel, Footer."""
         img = Image.new('RGB', (cls.IG_STORY_WIDTH, cls.IG_STORY_HEIGHT), color=cls.RED_FLAG_COLOR)
         draw = ImageDraw.Draw(img)
-        
-        # Fonts laden
-        try:
-            title_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 80)
-            score_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 300)
-            text_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 60)
-            small_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 50)
-        except:
-            title_font = ImageFont.load_default()
-            score_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
+        title_font = get_font(FONT_BOLD, 80)
+        text_font = get_font(FONT_REGULAR, 60)
+
         # Weißer Bereich in der Mitte
         white_rect_margin = 80
         white_rect = [
@@ -61,92 +190,67 @@ class ShareImageGenerator:
             1500
         ]
         draw.rounded_rectangle(white_rect, radius=40, fill=cls.WHITE)
-        
+
         # Titel - kleinere Schrift, weiter oben
         title_text = "RedFlag Analyzer"
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        title_x = (cls.IG_STORY_WIDTH - title_width) // 2
-        draw.text((title_x, 250), title_text, fill=cls.WHITE, font=title_font)
-        
-        # Score
-        score_text = f"{float(analysis.score_total):.1f}"
-        score_bbox = draw.textbbox((0, 0), score_text, font=score_font)
-        score_width = score_bbox[2] - score_bbox[0]
-        score_x = (cls.IG_STORY_WIDTH - score_width) // 2
-        draw.text((score_x, 650), score_text, fill=cls.RED_FLAG_COLOR, font=score_font)
-        
+        draw.text(((cls.IG_STORY_WIDTH - _text_width(draw, title_text, title_font)) // 2, 250), title_text, fill=cls.WHITE, font=title_font)
+
         # "/5 Red Flags" Text
         subtitle_text = "/5 Red Flags"
-        subtitle_bbox = draw.textbbox((0, 0), subtitle_text, font=text_font)
-        subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-        subtitle_x = (cls.IG_STORY_WIDTH - subtitle_width) // 2
-        draw.text((subtitle_x, 1000), subtitle_text, fill=cls.GRAY_900, font=text_font)
-        
+        draw.text(((cls.IG_STORY_WIDTH - _text_width(draw, subtitle_text, text_font)) // 2, 1000), subtitle_text, fill=cls.GRAY_900, font=text_font)
+
+        # Footer
+        footer_text = "redflag-analyzer.com"
+        draw.text(((cls.IG_STORY_WIDTH - _text_width(draw, footer_text, text_font)) // 2, 1750), footer_text, fill=cls.WHITE, font=text_font)
+        return img
+
+    @classmethod
+    def render_instagram_story(cls, analysis):
+        """Instagram Story (1080x1920) als PIL-Image: Basis-Layer + Score + Kategorien."""
+        img = cls._base_layer('instagram_story', cls._draw_instagram_story_base)
+        draw = ImageDraw.Draw(img)
+        score_font = get_font(FONT_BOLD, 300)
+        small_font = get_font(FONT_REGULAR, 50)
+
+        # Score
+        score_text = f"{float(analysis.score_total):.1f}"
+        draw.text(((cls.IG_STORY_WIDTH - _text_width(draw, score_text, score_font)) // 2, 650), score_text, fill=cls.RED_FLAG_COLOR, font=score_font)
+
         # Kategorie Scores (ohne Emojis)
         y_offset = 1150
-        category_scores = analysis.category_scores.all()[:4]
-        
-        for cat_score in category_scores:
+        for cat_score in analysis.category_scores.all()[:4]:
             category_name = cls._get_category_name(cat_score.category)
             category_text = f"{category_name}: {float(cat_score.score):.1f}/5"
-            
-            text_bbox = draw.textbbox((0, 0), category_text, font=small_font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_x = (cls.IG_STORY_WIDTH - text_width) // 2
-            
-            draw.text((text_x, y_offset), category_text, fill=cls.GRAY_900, font=small_font)
+            draw.text(((cls.IG_STORY_WIDTH - _text_width(draw, category_text, small_font)) // 2, y_offset), category_text, fill=cls.GRAY_900, font=small_font)
             y_offset += 80
-        
-        # Footer
-        footer_text = "redflag-analyzer.com"
-        footer_bbox = draw.textbbox((0, 0), footer_text, font=text_font)
-        footer_width = footer_bbox[2] - footer_bbox[0]
-        footer_x = (cls.IG_STORY_WIDTH - footer_width) // 2
-        draw.text((footer_x, 1750), footer_text, fill=cls.WHITE, font=text_font)
-        
-        # Speichere Bild
-        filename = f'share_ig_story_{analysis.id}.png'
-        filepath = os.path.join(settings.MEDIA_ROOT, 'share_images', filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        img.save(filepath)
-        
-        return filepath
-    
+        return img
+
     @classmethod
-    def generate_standard_post(cls, analysis):
+    def generate_instagram_story(cls, analysis):
         """
-        Generiert Standard Share-Grafik (1200x630) für Twitter, Facebook etc.
-        Mit Kategorien-Durchschnitten
-        
+        Generiert Instagram Story Share-Grafik (1080x1920)
+        (aus dem Datei-Cache, falls die Variante schon existiert)
+
         Args:
             analysis: Analysis Model Instance
-            
+
         Returns:
-            str: Pfad zur generierten Bilddatei
+            str: Pfad zur Bilddatei
         """
-        # Erstelle Bild
+        return cls.get_image(analysis, 'story')[0]
+
+    # --- Standard Post --------------------------------------------------
+
+    @classmethod
+    def _draw_standard_post_base(cls):
+        """Statische Teile des Posts: Hintergrund, Score-Kreis, Überschriften, Footer."""
         img = Image.new('RGB', (cls.POST_WIDTH, cls.POST_HEIGHT), color=cls.RED_FLAG_COLOR)
         draw = ImageDraw.Draw(img)
-        
-        # Fonts laden
-        try:
-            title_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 50)
-            score_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 140)
-            text_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 35)
-            small_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 28)
-        except:
-            title_font = ImageFont.load_default()
-            score_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
-        # Linke Seite: Score
-        left_width = 500
-        
+        title_font = get_font(FONT_BOLD, 50)
+        text_font = get_font(FONT_REGULAR, 35)
+
         # Weißer Kreis für Score (links)
-        circle_center_x = left_width // 2
-        circle_center_y = cls.POST_HEIGHT // 2
+        circle_center_x, circle_center_y = cls._post_circle_center()
         circle_radius = 150
         draw.ellipse(
             [
@@ -157,62 +261,116 @@ class ShareImageGenerator:
             ],
             fill=cls.WHITE
         )
-        
+
+        # Titel rechts
+        draw.text((cls._post_right_x(), 80), "Kategorien:", fill=cls.WHITE, font=title_font)
+
+        # Titel oben
+        title_text = "RedFlag Analyzer"
+        draw.text(((cls.POST_WIDTH - _text_width(draw, title_text, title_font)) // 2, 30), title_text, fill=cls.WHITE, font=title_font)
+
+        # Footer
+        footer_text = "Wie viele Red Flags hat deine Partnerin?"
+        draw.text(((cls.POST_WIDTH - _text_width(draw, footer_text, text_font)) // 2, 560), footer_text, fill=cls.WHITE, font=text_font)
+        return img
+
+    @classmethod
+    def _post_circle_center(cls):
+        # Linke Seite (500px breit): Score
+        return 500 // 2, cls.POST_HEIGHT // 2
+
+    @classmethod
+    def _post_right_x(cls):
+        # Rechte Seite: Kategorien
+        return 500 + 50
+
+    @classmethod
+    def render_standard_post(cls, analysis):
+        """Standard-Post (1200x630) als PIL-Image: Basis-Layer + Score + Kategorien."""
+        img = cls._base_layer('standard_post', cls._draw_standard_post_base)
+        draw = ImageDraw.Draw(img)
+        score_font = get_font(FONT_BOLD, 140)
+        small_font = get_font(FONT_REGULAR, 28)
+
         # Score im Kreis
+        circle_center_x, circle_center_y = cls._post_circle_center()
         score_text = f"{float(analysis.score_total):.1f}"
         score_bbox = draw.textbbox((0, 0), score_text, font=score_font)
-        score_width = score_bbox[2] - score_bbox[0]
         score_height = score_bbox[3] - score_bbox[1]
-        score_x = circle_center_x - score_width // 2
         score_y = circle_center_y - score_height // 2 - 15
-        draw.text((score_x, score_y), score_text, fill=cls.RED_FLAG_COLOR, font=score_font)
-        
-        # "/5" unter dem Score
+        draw.text((circle_center_x - _text_width(draw, score_text, score_font) // 2, score_y), score_text, fill=cls.RED_FLAG_COLOR, font=score_font)
+
+        # "/5" unter dem Score (überlappt dessen Unterkante, daher nach dem Score)
+        text_font = get_font(FONT_REGULAR, 35)
         subtitle_text = "/5"
-        subtitle_bbox = draw.textbbox((0, 0), subtitle_text, font=text_font)
-        subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-        subtitle_x = circle_center_x - subtitle_width // 2
-        draw.text((subtitle_x, circle_center_y + 50), subtitle_text, fill=cls.GRAY_900, font=text_font)
-        
-        # Rechte Seite: Kategorien
-        right_x_start = left_width + 50
-        category_scores = analysis.category_scores.all()[:4]
-        
-        # Titel rechts
-        categories_title = "Kategorien:"
-        draw.text((right_x_start, 80), categories_title, fill=cls.WHITE, font=title_font)
-        
+        draw.text((circle_center_x - _text_width(draw, subtitle_text, text_font) // 2, circle_center_y + 50), subtitle_text, fill=cls.GRAY_900, font=text_font)
+
         # Kategorien auflisten
         y_offset = 160
-        for cat_score in category_scores:
+        for cat_score in analysis.category_scores.all()[:4]:
             category_name = cls._get_category_name(cat_score.category)
             category_text = f"{category_name}: {float(cat_score.score):.1f}/5"
-            
-            draw.text((right_x_start, y_offset), category_text, fill=cls.WHITE, font=small_font)
+            draw.text((cls._post_right_x(), y_offset), category_text, fill=cls.WHITE, font=small_font)
             y_offset += 70
-        
-        # Titel oben
-        title_text = "RedFlag Analyzer"
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        title_x = (cls.POST_WIDTH - title_width) // 2
-        draw.text((title_x, 30), title_text, fill=cls.WHITE, font=title_font)
-        
-        # Footer
-        footer_text = "Wie viele Red Flags hat deine Partnerin?"
-        footer_bbox = draw.textbbox((0, 0), footer_text, font=text_font)
-        footer_width = footer_bbox[2] - footer_bbox[0]
-        footer_x = (cls.POST_WIDTH - footer_width) // 2
-        draw.text((footer_x, 560), footer_text, fill=cls.WHITE, font=text_font)
-        
-        # Speichere Bild
-        filename = f'share_post_{analysis.id}.png'
-        filepath = os.path.join(settings.MEDIA_ROOT, 'share_images', filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        img.save(filepath)
-        
-        return filepath
-    
+        return img
+
+    @classmethod
+    def generate_standard_post(cls, analysis):
+        """
+        Generiert Standard Share-Grafik (1200x630) für Twitter, Facebook etc.
+        Mit Kategorien-Durchschnitten (aus dem Datei-Cache, falls vorhanden)
+
+        Args:
+            analysis: Analysis Model Instance
+
+        Returns:
+            str: Pfad zur Bilddatei
+        """
+        return cls.get_image(analysis, 'post')[0]
+
+    # --- Open-Graph-Bild (Share-Links) ----------------------------------
+
+    @classmethod
+    def _draw_og_base(cls):
+        """Statische Teile des OG-Bilds: Hintergrund, Branding, Untertitel, CTA."""
+        img = Image.new('RGB', (cls.OG_WIDTH, cls.OG_HEIGHT), color='#1F2937')  # Tailwind gray-800
+        draw = ImageDraw.Draw(img)
+        subtitle_font = get_font(FONT_REGULAR, 40)
+
+        # Draw branding
+        draw.text((60, 60), "=© RedFlag Analyzer", fill=cls.RED_FLAG_COLOR, font=get_font(FONT_BOLD, 80))
+
+        # Draw subtitle
+        draw.text((60, 360), "Red Flag Score", fill='#9CA3AF', font=subtitle_font)
+
+        # Draw CTA
+        draw.text((60, 500), "Analysiere deine Beziehung ", fill=cls.WHITE, font=subtitle_font)
+        return img
+
+    @classmethod
+    def render_og_image(cls, analysis):
+        """OG-Bild (1200x630) als PIL-Image: Basis-Layer + farbiger Score."""
+        img = cls._base_layer('og', cls._draw_og_base)
+        draw = ImageDraw.Draw(img)
+
+        # Draw score
+        score = float(analysis.score_total)
+        score_color = '#10B981' if score < 2.0 else '#EF4444' if score > 3.5 else '#F59E0B'
+        draw.text((60, 200), f"{score:.1f}", fill=score_color, font=get_font(FONT_BOLD, 120))
+        return img
+
+    @classmethod
+    def generate_og_image(cls, analysis):
+        """
+        Generiert OG-Image mit Score und Branding.
+
+        Returns:
+            bytes: PNG-Daten
+        """
+        buffer = BytesIO()
+        cls.render_og_image(analysis).save(buffer, format='PNG')
+        return buffer.getvalue()
+
     @staticmethod
     def _get_category_name(category):
         """Helper: Kategorie zu Name (ohne Emojis)"""
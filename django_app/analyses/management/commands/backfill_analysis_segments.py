@@ -0,0 +1,76 @@
+"""
+Management Command: Backfill Analysis Segments
+Füllt Analysis.author_age_group / author_country für bestehende Analysen
+batchweise aus dem Profil des Users. Die Altersgruppe bezieht sich auf das
+Jahr der Erstellung. Danach werden Score-Histogramme und Länder-Rollups
+neu aufgebaut, da sie die Segmente der Analysen verwenden.
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analyses.analytics import AnalyticsService
+from analyses.histograms import ScoreHistogramService
+from analyses.models import Analysis
+from analyses.rescoring import id_blocks
+from analyses.rollups import CountryRollupService
+
+
+UPDATE_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Füllt Altersgruppe und Land (Stand bei Erstellung) für bestehende Analysen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='ID-Bereich pro Batch (eine Transaktion pro Batch)'
+        )
+
+    def handle(self, *args, **options):
+        updated = 0
+        # Feste ID-Blöcke statt LIMIT: der Join bleibt auf den Block beschränkt,
+        # jeder Block ist eine eigene Transaktion
+        for start_id, end_id in id_blocks(block_size=options['batch_size']):
+            rows = Analysis.objects.filter(
+                id__gte=start_id, id__lt=end_id, author_age_group__isnull=True, author_country__isnull=True
+            ).values_list('id', 'created_at__year', 'user__profile__birthdate__year', 'user__profile__country')
+
+            changed = []
+            for analysis_id, created_year, birth_year, country in rows:
+                age_group = AnalyticsService.age_group_for_birth_year(birth_year, created_year)
+                if age_group or country:
+                    changed.append((analysis_id, age_group, country or None))
+
+            with transaction.atomic():
+                self._update_segments(changed)
+            updated += len(changed)
+            self.stdout.write(f'  ✓ bis ID {end_id - 1}: {updated} aktualisiert')
+
+        histogram_rows = ScoreHistogramService.rebuild()
+        rollup_rows = CountryRollupService.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully backfilled {updated} analyses '
+            f'(rebuilt {histogram_rows} histogram rows, {rollup_rows} rollup rows)'
+        ))
+
+    @staticmethod
+    def _update_segments(changed):
+        """
+        Ein UPDATE ... WHERE id IN (...) pro Segment statt bulk_update
+        (dessen CASE WHEN pro Zeile über alle Werte läuft). Wenige Segmente
+        pro Block → wenige Statements.
+        """
+        ids_by_segment = defaultdict(list)
+        for analysis_id, age_group, country in changed:
+            ids_by_segment[(age_group, country)].append(analysis_id)
+
+        for (age_group, country), ids in ids_by_segment.items():
+            for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+                Analysis.objects.filter(id__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                    author_age_group=age_group, author_country=country
+                )
@@ -0,0 +1,83 @@
+"""
+Management Command: Benchmark Age Group Statistics
+Vergleicht die alte Variante (count + aggregate pro Altersgruppe, 16 gejointe
+Queries) mit der GROUP BY-Query über analyses.author_age_group (1 Query)
+und dem gecachten Aufruf.
+"""
+import time
+from datetime import date
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg
+from django.test.utils import CaptureQueriesContext
+
+from analyses.analytics import AGE_GROUP_STATS_CACHE_KEY, AnalyticsService
+from analyses.models import Analysis
+
+
+def _legacy_age_group_statistics():
+    """Alte Implementierung: zwei gejointe Queries pro Altersgruppe."""
+    today = date.today()
+    stats = []
+    for min_age, max_age, label in AnalyticsService.AGE_GROUPS:
+        group_analyses = Analysis.objects.filter(
+            is_unlocked=True,
+            user__profile__birthdate__year__gte=today.year - max_age,
+            user__profile__birthdate__year__lt=today.year - min_age,
+        )
+        count = group_analyses.count()
+        if count > 0:
+            avg_score = group_analyses.aggregate(Avg('score_total'))['score_total__avg']
+            stats.append({
+                'age_group': label,
+                'min_age': min_age,
+                'max_age': max_age,
+                'avg_score': round(avg_score, 2) if avg_score else 0,
+                'count': count,
+            })
+    return stats
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Altersgruppen-Statistik (16 Queries vs. 1 Query vs. Cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Wiederholungen pro Messung (bester Lauf zählt)'
+        )
+
+    def handle(self, *args, **options):
+        def measure(func):
+            best = float('inf')
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    result = func()
+                    best = min(best, time.perf_counter() - started)
+            return result, best * 1000, len(queries)
+
+        def cached():
+            return AnalyticsService.get_age_group_statistics()
+
+        legacy, legacy_ms, legacy_queries = measure(_legacy_age_group_statistics)
+        single, single_ms, single_queries = measure(AnalyticsService._compute_age_group_statistics)
+        cache.delete(AGE_GROUP_STATS_CACHE_KEY)
+        cached()
+        _, cached_ms, cached_queries = measure(cached)
+
+        if legacy != single:
+            # Legacy rechnet mit dem Alter heute, author_age_group mit dem Alter bei Erstellung
+            self.stdout.write(self.style.WARNING('⚠️  Ergebnisse weichen ab (Alter heute vs. bei Erstellung)'))
+
+        total = Analysis.objects.filter(is_unlocked=True).count()
+        self.stdout.write(f'📊 {total} entsperrte Analysen ({connection.vendor})\n')
+        self.stdout.write(f'{"Variante":<30}{"Queries":>9}{"ms":>12}')
+        self.stdout.write('-' * 51)
+        self.stdout.write(f'{"count + aggregate pro Gruppe":<30}{legacy_queries:>9}{legacy_ms:>12.1f}')
+        self.stdout.write(f'{"GROUP BY author_age_group":<30}{single_queries:>9}{single_ms:>12.1f}')
+        self.stdout.write(f'{"Cache-Treffer":<30}{cached_queries:>9}{cached_ms:>12.3f}')
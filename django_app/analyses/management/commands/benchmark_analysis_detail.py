@@ -0,0 +1,100 @@
+"""
+Management Command: Benchmark Analysis Detail
+Misst die Detailseite einer entsperrten Analyse über den Test-Client
+(komplette Middleware, Templates) als Premium-User:
+
+- Seite + alle Statistik-Fragmente mit leerem Cache (Kosten, wenn alles
+  synchron und ungecacht im selben Request liefe)
+- Seite allein, Cache-Miss und Cache-Treffer
+- Fragmente, Cache-Treffer
+
+Läuft in einer Transaktion, die am Ende zurückgerollt wird (Session,
+Premium-Subscription des Benchmark-Users bleiben nicht stehen).
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from analyses.models import Analysis
+from subscriptions.models import Subscription, SubscriptionTier
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Analyse-Detailseite (Seite + Fragmente, Cache-Miss vs. Cache-Treffer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analysis',
+            type=int,
+            help='ID einer entsperrten Analyse (Standard: die neueste)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Wiederholungen pro Messung (bester Lauf zählt)'
+        )
+
+    def handle(self, *args, **options):
+        analyses = Analysis.objects.filter(is_unlocked=True)
+        if options['analysis']:
+            analyses = analyses.filter(pk=options['analysis'])
+        analysis = analyses.order_by('-pk').first()
+        if analysis is None:
+            raise CommandError('Keine entsperrte Analyse gefunden')
+
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            rows = self.run_benchmark(analysis, options['repeat'])
+            transaction.set_rollback(True)
+
+        total = Analysis.objects.filter(is_unlocked=True).count()
+        self.stdout.write(f'📊 Analyse {analysis.pk}, {total} entsperrte Analysen ({connection.vendor})\n')
+        self.stdout.write(f'{"Variante":<36}{"Requests":>9}{"Queries":>9}{"ms":>10}')
+        self.stdout.write('-' * 64)
+        for label, requests, queries, ms in rows:
+            self.stdout.write(f'{label:<36}{requests:>9}{queries:>9}{ms:>10.1f}')
+
+    def run_benchmark(self, analysis, repeat):
+        user = get_user_model().objects.get(pk=analysis.user_id)
+        Subscription.objects.update_or_create(
+            user=user, defaults={'tier': SubscriptionTier.PREMIUM, 'is_active': True, 'expires_at': None}
+        )
+        client = Client()
+        client.force_login(user)
+
+        page = [reverse('analyses:detail', args=[analysis.pk])]
+        fragments = [
+            reverse('analyses:comparison', args=[analysis.pk]),
+            reverse('analyses:premium_insights', args=[analysis.pk]),
+            reverse('analyses:shared_stats', args=['age-groups']),
+            reverse('analyses:shared_stats', args=['regions']),
+        ]
+
+        def measure(urls, clear_cache):
+            best, best_queries = float('inf'), 0
+            for _ in range(repeat):
+                if clear_cache:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for url in urls:
+                        response = client.get(url)
+                        if response.status_code != 200:
+                            raise CommandError(f'{url}: HTTP {response.status_code}')
+                    elapsed = time.perf_counter() - started
+                if elapsed < best:
+                    best, best_queries = elapsed, len(queries)
+            return len(urls), best_queries, best * 1000
+
+        return [
+            ('Seite + Fragmente, Cache leer', *measure(page + fragments, clear_cache=True)),
+            ('Seite, Cache-Miss', *measure(page, clear_cache=True)),
+            ('Seite, Cache-Treffer', *measure(page, clear_cache=False)),
+            ('Fragmente, Cache-Treffer', *measure(fragments, clear_cache=False)),
+        ]
@@ -0,0 +1,127 @@
+"""
+Management Command: Benchmark Country Rollups
+Vergleicht die alten Heatmap-Queries (Aggregation über analyses ⋈ users ⋈
+user_profiles, bei Kategorien zusätzlich ⋈ category_scores) mit dem Lesen
+aus country_rollups, dazu die Totals-Query des Rollup-Rebuilds über den Join
+bzw. über die Segment-Spalte analyses.author_country.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg, Count, Sum
+from django.test.utils import CaptureQueriesContext
+
+from analyses.analytics import AnalyticsService
+from analyses.models import Analysis, CategoryScore
+
+
+def _legacy_regional_heatmap():
+    """Alte Implementierung: Join-Aggregation nach Profil-Land."""
+    country_stats = Analysis.objects.filter(
+        is_unlocked=True,
+        user__profile__country__isnull=False
+    ).values('user__profile__country').annotate(
+        avg_score=Avg('score_total'),
+        count=Count('id')
+    ).filter(count__gte=5)
+    results = [
+        {
+            'country': stat['user__profile__country'],
+            'avg_score': round(stat['avg_score'], 2) if stat['avg_score'] else 0,
+            'count': stat['count'],
+        }
+        for stat in country_stats
+    ]
+    return sorted(results, key=lambda x: x['avg_score'], reverse=True)
+
+
+def _legacy_category_heatmap(category):
+    """Alte Implementierung: Join-Aggregation über category_scores."""
+    country_stats = CategoryScore.objects.filter(
+        category=category,
+        analysis__is_unlocked=True,
+        analysis__user__profile__country__isnull=False
+    ).values('analysis__user__profile__country').annotate(
+        avg_score=Avg('score'),
+        count=Count('id')
+    ).filter(count__gte=3)
+    results = [
+        {
+            'country': stat['analysis__user__profile__country'],
+            'category': category,
+            'avg_score': round(stat['avg_score'], 2) if stat['avg_score'] else 0,
+            'count': stat['count'],
+        }
+        for stat in country_stats
+    ]
+    return sorted(results, key=lambda x: x['avg_score'], reverse=True)
+
+
+def _legacy_country_totals():
+    """Totals pro Land für den Rebuild, Land über users ⋈ user_profiles."""
+    return list(Analysis.objects.filter(is_unlocked=True).values_list(
+        'user__profile__country'
+    ).annotate(n=Count('*'), total=Sum('score_total')).order_by())
+
+
+def _segment_country_totals():
+    """Totals pro Land für den Rebuild über author_country (wie CountryRollupService.compute)."""
+    return list(Analysis.objects.filter(is_unlocked=True).values_list(
+        'author_country'
+    ).annotate(n=Count('*'), total=Sum('score_total')).order_by())
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Länder-Heatmaps (Join-Aggregation vs. country_rollups) und Rebuild-Totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Wiederholungen pro Messung (bester Lauf zählt)'
+        )
+        parser.add_argument(
+            '--category',
+            default='TRUST',
+            help='Kategorie für die Category-Heatmap'
+        )
+
+    def handle(self, *args, **options):
+        def measure(func):
+            best = float('inf')
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    result = func()
+                    best = min(best, time.perf_counter() - started)
+            return result, best * 1000, len(queries)
+
+        category = options['category']
+        cases = [
+            ('Regional', _legacy_regional_heatmap, AnalyticsService.get_regional_heatmap_data),
+            (
+                f'Category {category}',
+                lambda: _legacy_category_heatmap(category),
+                lambda: AnalyticsService.get_category_heatmap_by_country(category),
+            ),
+        ]
+
+        total = Analysis.objects.filter(is_unlocked=True).count()
+        self.stdout.write(f'📊 {total} entsperrte Analysen ({connection.vendor})\n')
+        self.stdout.write(f'{"Heatmap":<22}{"Join ms":>12}{"Rollup ms":>12}{"Queries":>10}')
+        self.stdout.write('-' * 56)
+        for label, legacy, rollup in cases:
+            legacy_result, legacy_ms, _ = measure(legacy)
+            rollup_result, rollup_ms, rollup_queries = measure(rollup)
+            self.stdout.write(f'{label:<22}{legacy_ms:>12.1f}{rollup_ms:>12.2f}{rollup_queries:>10}')
+            if legacy_result != rollup_result:
+                # Join nutzt das Land im Profil heute, der Rollup author_country bei Erstellung
+                self.stdout.write(self.style.WARNING(f'⚠️  {label}: Ergebnisse weichen ab (Profil-Land heute vs. bei Erstellung)'))
+
+        _, legacy_ms, _ = measure(_legacy_country_totals)
+        _, segment_ms, _ = measure(_segment_country_totals)
+        self.stdout.write(f'\n{"Rebuild-Totals pro Land":<22}{"Join ms":>12}{"Segment ms":>12}')
+        self.stdout.write('-' * 46)
+        self.stdout.write(f'{"GROUP BY Land":<22}{legacy_ms:>12.1f}{segment_ms:>12.1f}')
@@ -0,0 +1,89 @@
+"""
+Management Command: Benchmark Responses
+Vergleicht JSON-responses mit dem gepackten Byte-Format:
+Speicher pro Zeile und Dekodier-Zeit pro Zeile.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from analyses.models import Analysis
+from analyses.packing import decode_array, pack_responses, unpack_responses
+from questionnaire.catalog import get_catalog
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: JSON vs. gepackte Analysis.responses (Größe + Dekodier-Zeit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=2000,
+            help='Anzahl Analysen für den Benchmark'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Wiederholungen pro Messung (bester Lauf zählt)'
+        )
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        analyses = list(Analysis.objects.order_by('id')[:options['sample']])
+        responses_list = [analysis.get_responses() for analysis in analyses]
+        if not responses_list:
+            raise CommandError('Keine Analysen vorhanden')
+
+        json_rows = [json.dumps(responses) for responses in responses_list]
+        packed_rows = [pack_responses(responses, catalog) for responses in responses_list]
+        packable = [(raw, packed) for raw, packed in zip(json_rows, packed_rows) if packed is not None]
+        if not packable:
+            raise CommandError('Keine der Analysen ist packbar')
+        json_rows = [raw for raw, _ in packable]
+        packed_rows = [packed for _, packed in packable]
+        n = len(packable)
+
+        def best_of(func):
+            best = float('inf')
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for row in func():
+                    pass
+                best = min(best, time.perf_counter() - started)
+            return best / n * 1e6
+
+        json_us = best_of(lambda: (json.loads(raw) for raw in json_rows))
+        unpack_us = best_of(lambda: (unpack_responses(packed, catalog=catalog) for packed in packed_rows))
+        array_us = best_of(lambda: (decode_array(packed) for packed in packed_rows))
+
+        json_bytes = sum(len(raw.encode()) for raw in json_rows) / n
+        packed_bytes = sum(len(packed) for packed in packed_rows) / n
+
+        self.stdout.write(f'📊 {n} Analysen (von {len(responses_list)} packbar)\n')
+        self.stdout.write(f'{"Format":<28}{"Bytes/Zeile":>14}{"µs/Zeile":>12}')
+        self.stdout.write('-' * 54)
+        self.stdout.write(f'{"JSON (json.loads)":<28}{json_bytes:>14.0f}{json_us:>12.2f}')
+        self.stdout.write(f'{"Gepackt (unpack_responses)":<28}{packed_bytes:>14.0f}{unpack_us:>12.2f}')
+        self.stdout.write(f'{"Gepackt (decode_array)":<28}{packed_bytes:>14.0f}{array_us:>12.2f}')
+
+        if connection.vendor == 'postgresql':
+            self._print_column_sizes()
+
+    def _print_column_sizes(self):
+        """Tatsächlicher Speicher in PostgreSQL (inkl. TOAST-Kompression)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(responses), COALESCE(AVG(pg_column_size(responses)), 0), '
+                'COUNT(responses_packed), COALESCE(AVG(pg_column_size(responses_packed)), 0), '
+                'pg_total_relation_size(%s) FROM analyses',
+                [Analysis._meta.db_table],
+            )
+            json_count, json_avg, packed_count, packed_avg, table_size = cursor.fetchone()
+        self.stdout.write('\n🐘 PostgreSQL')
+        self.stdout.write(f'  responses (JSONB):   {json_count:8} Zeilen, Ø {json_avg:8.0f} Bytes')
+        self.stdout.write(f'  responses_packed:    {packed_count:8} Zeilen, Ø {packed_avg:8.0f} Bytes')
+        self.stdout.write(f'  Tabelle gesamt:      {table_size / 1024 / 1024:8.1f} MB')
@@ -0,0 +1,69 @@
+"""
+Management Command: Benchmark Share Images
+Misst Renders pro Sekunde (ein Prozess = ein Kern) je Format:
+ohne Cache (Fonts laden und statische Teile zeichnen bei jedem Render, wie
+vor dem prozessweiten Cache) gegen Basis-Layer-Kopie mit gecachten Fonts.
+Jeweils nur Zeichnen und Zeichnen + PNG-Kodierung.
+"""
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyses.image_generator import ShareImageGenerator
+from analyses.models import Analysis
+
+
+FORMATS = {
+    'story': ShareImageGenerator.render_instagram_story,
+    'post': ShareImageGenerator.render_standard_post,
+    'og': ShareImageGenerator.render_og_image,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Share-Grafiken ohne/mit Font- und Basis-Layer-Cache (Renders/s pro Kern)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--renders',
+            type=int,
+            default=50,
+            help='Renders pro Messung (reihum über die Beispiel-Analysen)'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=20,
+            help='Anzahl entsperrter Analysen als Eingabe'
+        )
+
+    def handle(self, *args, **options):
+        analyses = list(
+            Analysis.objects.filter(is_unlocked=True).prefetch_related('category_scores').order_by('id')[:options['sample']]
+        )
+        if not analyses:
+            raise CommandError('Keine entsperrten Analysen vorhanden')
+        renders = options['renders']
+
+        def per_second(render, cached, encode):
+            ShareImageGenerator.clear_cache()
+            started = time.perf_counter()
+            for i in range(renders):
+                if not cached:
+                    ShareImageGenerator.clear_cache()
+                img = render(analyses[i % len(analyses)])
+                if encode:
+                    img.save(BytesIO(), format='PNG')
+            return renders / (time.perf_counter() - started)
+
+        self.stdout.write(f'📊 {renders} Renders pro Messung, {len(analyses)} Analysen\n')
+        self.stdout.write(f'{"Format":<8}{"Variante":<14}{"Zeichnen/s":>12}{"+ PNG/s":>10}')
+        self.stdout.write('-' * 44)
+        for name, render in FORMATS.items():
+            for label, cached in (('ohne Cache', False), ('Basis-Layer', True)):
+                self.stdout.write(
+                    f'{name:<8}{label:<14}'
+                    f'{per_second(render, cached, encode=False):>12.1f}'
+                    f'{per_second(render, cached, encode=True):>10.1f}'
+                )
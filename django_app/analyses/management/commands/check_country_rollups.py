@@ -0,0 +1,44 @@
+"""
+Management Command: Check Country Rollups
+Vergleicht die laufenden Summen in country_rollups (Heatmaps und globale
+Durchschnitte) mit einer vollständigen Neuberechnung. Mit --fix werden
+Abweichungen durch einen Rebuild behoben.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from analyses.rollups import CountryRollupService
+
+
+class Command(BaseCommand):
+    help = 'Prüft die Länder-Rollups gegen eine vollständige Neuberechnung'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Bei Abweichungen die Rollups neu aufbauen'
+        )
+
+    def handle(self, *args, **options):
+        stored = CountryRollupService.stored()
+        expected = CountryRollupService.compute()
+
+        mismatches = sorted(
+            key for key in stored.keys() | expected.keys()
+            if stored.get(key, [0, 0]) != expected.get(key, [0, 0])
+        )
+        for country, category in mismatches:
+            self.stdout.write(
+                f'  ✗ {country or "global"}/{category or "total"}: '
+                f'gespeichert {stored.get((country, category))}, erwartet {expected.get((country, category))}'
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'Country rollups are consistent ({len(expected)} rows)'))
+            return
+
+        if options['fix']:
+            CountryRollupService.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt country rollups ({len(mismatches)} mismatches fixed)'))
+        else:
+            raise CommandError(f'{len(mismatches)} Abweichungen gefunden (--fix zum Neuaufbau)')
@@ -0,0 +1,48 @@
+"""
+Management Command: Cleanup Share Images
+Entfernt veraltete Varianten der inhaltsadressierten Share-Grafiken
+(MEDIA_ROOT/share_images): geänderte Scores, alte TEMPLATE_VERSION,
+gelöschte oder wieder gesperrte Analysen, Temp-Dateien abgebrochener Writes.
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyses.image_generator import ShareImageGenerator
+
+
+class Command(BaseCommand):
+    help = 'Entfernt veraltete Share-Grafiken (inhaltsadressierter Datei-Cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Nur Dateien löschen, die älter sind (Minuten, schützt laufende Downloads)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Nur anzeigen, nichts löschen'
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('--min-age darf nicht negativ sein')
+
+        stale = ShareImageGenerator.stale_files(min_age_seconds=options['min_age'] * 60)
+        freed = 0
+        for path in stale:
+            try:
+                size = os.path.getsize(path)
+                if not options['dry_run']:
+                    os.unlink(path)
+            except FileNotFoundError:
+                continue  # Parallel gelöscht
+            freed += size
+
+        action = 'Would delete' if options['dry_run'] else 'Successfully deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {len(stale)} stale share images ({freed / 1024:.0f} KB)'
+        ))
@@ -0,0 +1,73 @@
+"""
+Management Command: Pack Analysis Responses
+Stellt bestehende Analysen batchweise von JSON-responses auf das gepackte
+Byte-Format um (siehe analyses/packing.py). Nicht verlustfrei packbare
+Analysen bleiben unverändert. Mit --unpack zurück auf JSON.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analyses.models import Analysis
+from analyses.packing import unpack_responses
+
+
+class Command(BaseCommand):
+    help = 'Konvertiert Analysis.responses batchweise ins gepackte Byte-Format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Analysen pro Batch (ein bulk_update pro Batch)'
+        )
+        parser.add_argument(
+            '--unpack',
+            action='store_true',
+            help='Gepackte Analysen zurück auf JSON konvertieren'
+        )
+
+    def handle(self, *args, **options):
+        if options['unpack']:
+            converted, skipped = self._convert(options['batch_size'], self._unpack_batch, responses_packed__isnull=False)
+        else:
+            converted, skipped = self._convert(options['batch_size'], self._pack_batch, responses__isnull=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully converted {converted} analyses ({skipped} not packable, kept as JSON)'
+        ))
+
+    def _convert(self, batch_size, convert_batch, **filters):
+        """Keyset-Pagination über die ID: jeder Batch ist eine eigene Transaktion."""
+        converted = skipped = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Analysis.objects.filter(id__gt=last_id, **filters)
+                .order_by('id')
+                .only('id', 'responses', 'responses_packed', 'responses_layout')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            changed = convert_batch(batch)
+            with transaction.atomic():
+                Analysis.objects.bulk_update(changed, ['responses', 'responses_packed', 'responses_layout'])
+
+            converted += len(changed)
+            skipped += len(batch) - len(changed)
+            self.stdout.write(f'  ✓ bis ID {last_id}: {converted} konvertiert')
+        return converted, skipped
+
+    @staticmethod
+    def _pack_batch(batch):
+        return [analysis for analysis in batch if analysis.pack_responses()]
+
+    @staticmethod
+    def _unpack_batch(batch):
+        for analysis in batch:
+            analysis.responses = unpack_responses(analysis.responses_packed, analysis.responses_layout)
+            analysis.responses_packed = None
+            analysis.responses_layout = None
+        return batch
@@ -0,0 +1,17 @@
+"""
+Management Command: Rebuild Country Rollups
+Baut die Länder-Rollups (Total + Category Scores pro Land und global)
+mit zwei gruppierten Queries neu auf (Konsistenz-Reparatur, siehe
+check_country_rollups).
+"""
+from django.core.management.base import BaseCommand
+
+from analyses.rollups import CountryRollupService
+
+
+class Command(BaseCommand):
+    help = 'Baut die Länder-Rollups (Regional-/Category-Heatmap) neu auf'
+
+    def handle(self, *args, **options):
+        rows = CountryRollupService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt country rollups ({rows} rows)'))
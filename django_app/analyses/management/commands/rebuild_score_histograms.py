@@ -0,0 +1,16 @@
+"""
+Management Command: Rebuild Score Histograms
+Baut alle ScoreHistogram-Segmente mit einer gruppierten Query neu auf
+(Reparatur, z.B. nach manuellen Änderungen an analyses).
+"""
+from django.core.management.base import BaseCommand
+
+from analyses.histograms import ScoreHistogramService
+
+
+class Command(BaseCommand):
+    help = 'Baut die Score-Histogramme (Percentile/Durchschnitt) neu auf'
+
+    def handle(self, *args, **options):
+        rows = ScoreHistogramService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt score histograms ({rows} rows)'))
@@ -0,0 +1,180 @@
+"""
+Management Command: Rescore Analyses
+Rechnet Analysis.score_total, CategoryScore.score und die Red-Flag-Impacts
+aller gespeicherten Analysen mit den aktuellen calculated_weights neu.
+
+- Arbeitet in festen ID-Blöcken (optional parallel mit --workers)
+- Checkpoint nach jedem Block: nach Abbruch einfach erneut starten
+- Der Gewichts-Snapshot wird im Checkpoint gespeichert, damit ein
+  fortgesetzter Lauf mit denselben Gewichten zu Ende rechnet
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time as datetime_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analyses.rescoring import ScoringTables, id_blocks, merge_stats, rescore_range, sorted_histogram
+from questionnaire.catalog import get_catalog
+
+
+def _rescore_block(block, tables, since, chunk_size, dry_run):
+    return block, rescore_range(block[0], block[1], tables, since=since, chunk_size=chunk_size, dry_run=dry_run)
+
+
+def _rescore_block_in_worker(*args):
+    """Worker-Einstieg: Connection nach jedem Block schließen (kein Leak im Pool)."""
+    try:
+        return _rescore_block(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Rechnet gespeicherte Analysen mit den aktuellen Gewichten neu (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Nur Analysen ab diesem Datum (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Anzahl paralleler Prozesse (je ein ID-Block pro Task)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Nichts schreiben, nur Drift-Histogramm ausgeben'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Analysen pro Chunk (Server-Side Cursor + Bulk-Write)'
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=20000,
+            help='Breite eines ID-Blocks (Arbeitseinheit für Worker und Checkpoint)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=str(settings.BASE_DIR / 'logs' / 'rescore_analyses.checkpoint.json'),
+            help='Pfad der Checkpoint-Datei'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Vorhandenen Checkpoint verwerfen und von vorne beginnen'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since_date = parse_date(options['since'])
+            if since_date is None:
+                raise CommandError('--since erwartet ein Datum im Format YYYY-MM-DD')
+            since = timezone.make_aware(datetime.combine(since_date, datetime_time.min))
+
+        if options['workers'] < 1:
+            raise CommandError('--workers muss mindestens 1 sein')
+
+        dry_run = options['dry_run']
+        checkpoint_path = options['checkpoint']
+        run_key = {'since': options['since'], 'block_size': options['block_size']}
+
+        checkpoint = None if (dry_run or options['restart']) else self._load_checkpoint(checkpoint_path, run_key)
+        if checkpoint:
+            tables = ScoringTables.from_dict(checkpoint['tables'])
+            completed = set(checkpoint['completed'])
+            stats = checkpoint['stats']
+            self.stdout.write(f'↻ Setze Lauf fort: {len(completed)} Blöcke bereits erledigt')
+        else:
+            tables = ScoringTables.from_catalog(get_catalog())
+            completed = set()
+            stats = {}
+
+        blocks = [block for block in id_blocks(since, options['block_size']) if block[0] not in completed]
+        self.stdout.write(
+            f'📊 {len(blocks)} ID-Blöcke à {options["block_size"]} IDs, '
+            f'{options["workers"]} Worker{" (DRY RUN)" if dry_run else ""}'
+        )
+
+        def block_done(block, block_stats):
+            merge_stats(stats, block_stats)
+            completed.add(block[0])
+            if not dry_run:
+                self._save_checkpoint(checkpoint_path, run_key, tables, completed, stats)
+            self.stdout.write(
+                f'  ✓ IDs {block[0]}-{block[1] - 1}: {block_stats["analyses"]} Analysen, '
+                f'{block_stats["changed"]} geändert'
+            )
+
+        task_args = (tables, since, options['chunk_size'], dry_run)
+        if options['workers'] == 1:
+            for block in blocks:
+                block_done(*_rescore_block(block, *task_args))
+        else:
+            # Fork erbt keine offene Connection: jeder Worker verbindet sich neu
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+            ) as pool:
+                futures = [pool.submit(_rescore_block_in_worker, block, *task_args) for block in blocks]
+                for future in as_completed(futures):
+                    block_done(*future.result())
+
+        self._print_summary(stats, dry_run)
+
+        if not dry_run and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def _load_checkpoint(self, path, run_key):
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('run') != run_key:
+            self.stdout.write(self.style.WARNING('⚠ Checkpoint gehört zu anderen Optionen - starte neu'))
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, path, run_key, tables, completed, stats):
+        # Atomar ersetzen: ein Abbruch hinterlässt nie eine halbe Datei
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'run': run_key,
+                'tables': tables.to_dict(),
+                'completed': sorted(completed),
+                'stats': {**stats, 'histogram': dict(stats.get('histogram', {}))},
+            }, f)
+        os.replace(tmp_path, path)
+
+    def _print_summary(self, stats, dry_run):
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write('DRIFT GESAMT-SCORE (|neu - alt|)')
+        self.stdout.write('=' * 60)
+        analyses = stats.get('analyses', 0)
+        for label, count in sorted_histogram(stats.get('histogram')):
+            bar = '█' * int(40 * count / analyses) if analyses else ''
+            self.stdout.write(f'  {label:>6}  {count:8}  {bar}')
+
+        verb = 'würden geändert' if dry_run else 'geändert'
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ {analyses} Analysen geprüft: {stats.get("changed", 0)} Gesamt-Scores und '
+            f'{stats.get("categories_changed", 0)} Category Scores {verb}'
+        ))
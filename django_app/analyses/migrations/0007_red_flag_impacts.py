@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0006_anonymousanalysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='red_flag_impacts',
+            field=models.JSONField(blank=True, help_text='Sorted red flag impacts as [key, value, weight] triples', null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='red_flag_version',
+            field=models.BigIntegerField(blank=True, help_text='Question catalog version the red flag impacts were computed with', null=True),
+        ),
+    ]
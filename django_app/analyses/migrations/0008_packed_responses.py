@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0007_red_flag_impacts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='responses_layout',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Byte layout version of responses_packed', null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='responses_packed',
+            field=models.BinaryField(blank=True, help_text='Packed responses: one byte (0-5) per question ordinal', null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysis',
+            name='responses',
+            field=models.JSONField(blank=True, help_text='Question responses as JSON array', null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0008_packed_responses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=40)),
+                ('bucket', models.PositiveSmallIntegerField(help_text='score_total × 100 (0-500)')),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'score_histograms',
+                'unique_together': {('segment', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0009_score_histograms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(max_length=2)),
+                ('category', models.CharField(blank=True, max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'country_rollups',
+                'unique_together': {('country', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0010_country_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='author_age_group',
+            field=models.CharField(blank=True, help_text='Age group of the author at creation (AnalyticsService.AGE_GROUPS)', max_length=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='author_country',
+            field=models.CharField(blank=True, help_text='Country code of the author at creation', max_length=2, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(condition=models.Q(('is_unlocked', True)), fields=['author_country', 'score_total'], name='analyses_country_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(condition=models.Q(('is_unlocked', True)), fields=['author_age_group', 'author_country', 'score_total'], name='analyses_age_country_score_idx'),
+        ),
+    ]
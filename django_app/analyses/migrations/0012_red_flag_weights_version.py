@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0011_analysis_segments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysis',
+            name='red_flag_version',
+            field=models.BigIntegerField(blank=True, help_text='Weights version (catalog.weights_version) the red flag impacts were computed with', null=True),
+        ),
+    ]
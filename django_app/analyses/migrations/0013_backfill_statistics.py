@@ -0,0 +1,108 @@
+"""
+Datenmigration: Segmente und Statistik-Tabellen für Bestands-Analysen
+Füllt author_age_group / author_country (0011) aus dem Profil und baut
+Score-Histogramme (0009) und Länder-Rollups (0010) auf. Ohne diesen Schritt
+wären Percentile und Durchschnitte nach dem Deploy leer, bis jemand
+backfill_analysis_segments von Hand startet.
+
+Arbeitet mit den historischen Models; nur die reinen Hilfsfunktionen
+(Bucket, Segmente, Altersgruppe) kommen aus den Services.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Max, Sum
+
+
+BLOCK_SIZE = 5000
+
+
+def backfill_segments(Analysis):
+    from analyses.analytics import AnalyticsService
+
+    max_id = Analysis.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    for start_id in range(1, max_id + 1, BLOCK_SIZE):
+        rows = Analysis.objects.filter(
+            id__gte=start_id, id__lt=start_id + BLOCK_SIZE,
+            author_age_group__isnull=True, author_country__isnull=True,
+        ).values_list('id', 'created_at__year', 'user__profile__birthdate__year', 'user__profile__country')
+
+        ids_by_segment = defaultdict(list)
+        for analysis_id, created_year, birth_year, country in rows:
+            age_group = AnalyticsService.age_group_for_birth_year(birth_year, created_year)
+            if age_group or country:
+                ids_by_segment[(age_group, country or None)].append(analysis_id)
+
+        for (age_group, country), ids in ids_by_segment.items():
+            Analysis.objects.filter(id__in=ids).update(author_age_group=age_group, author_country=country)
+
+
+def rebuild_histograms(Analysis, ScoreHistogram):
+    from analyses.histograms import ScoreHistogramService
+
+    rows = Analysis.objects.filter(is_unlocked=True).values_list(
+        'score_total', 'author_age_group', 'author_country'
+    ).annotate(n=Count('*')).order_by()
+
+    counts = Counter()
+    for score_total, age_group, country, n in rows:
+        bucket = ScoreHistogramService.bucket(score_total)
+        for segment in ScoreHistogramService.segments_for(age_group, country):
+            counts[(segment, bucket)] += n
+
+    ScoreHistogram.objects.all().delete()
+    ScoreHistogram.objects.bulk_create([
+        ScoreHistogram(segment=segment, bucket=bucket, count=count)
+        for (segment, bucket), count in counts.items()
+        if count
+    ], batch_size=BLOCK_SIZE)
+
+
+def rebuild_rollups(Analysis, CategoryScore, CountryRollup):
+    from analyses.rollups import TOTAL_CATEGORY, CountryRollupService
+
+    totals = Analysis.objects.filter(is_unlocked=True).values_list(
+        'author_country'
+    ).annotate(n=Count('*'), total=Sum('score_total')).order_by()
+    categories = CategoryScore.objects.filter(analysis__is_unlocked=True).values_list(
+        'analysis__author_country', 'category'
+    ).annotate(n=Count('*'), total=Sum('score')).order_by()
+
+    rollups = defaultdict(lambda: [0, Decimal('0')])
+    grouped = [(country, TOTAL_CATEGORY, n, total) for country, n, total in totals] + list(categories)
+    for country, category, n, total in grouped:
+        for rollup_country in CountryRollupService._rollup_countries(country):
+            rollup = rollups[(rollup_country, category)]
+            rollup[0] += n
+            rollup[1] += total
+
+    CountryRollup.objects.all().delete()
+    CountryRollup.objects.bulk_create([
+        CountryRollup(country=country, category=category, count=count, score_sum=score_sum)
+        for (country, category), (count, score_sum) in rollups.items()
+    ], batch_size=BLOCK_SIZE)
+
+
+def backfill_statistics(apps, schema_editor):
+    Analysis = apps.get_model('analyses', 'Analysis')
+    backfill_segments(Analysis)
+    rebuild_histograms(Analysis, apps.get_model('analyses', 'ScoreHistogram'))
+    rebuild_rollups(Analysis, apps.get_model('analyses', 'CategoryScore'), apps.get_model('analyses', 'CountryRollup'))
+
+    # Vor dem Deploy gecachte (leere) Durchschnitte verwerfen
+    from analyses.stats_version import invalidate_statistics
+    invalidate_statistics()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0012_red_flag_weights_version'),
+        ('accounts', '0007_alter_user_credits_alter_userbadge_points_and_more'),
+    ]
+
+    operations = [
+        # Rückwärts nichts zu tun: 0011/0010/0009 entfernen Spalten und Tabellen
+        migrations.RunPython(backfill_statistics, migrations.RunPython.noop),
+    ]
@@ -2,9 +2,12 @@
 Analysis Models für PostgreSQL
 Relationale Struktur mit ForeignKeys und JSONField für Flexibilität
 """
-from django.db import models
+from datetime import date
+
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from redflag_project.config import Config
 from questionnaire.models import Question
 
 
@@ -45,9 +48,23 @@ class Analysis(models.Model):
     )
     # JSON für responses ermöglicht Flexibilität
     # Format: [{"key": "father_absence", "value": 4}, ...]
+    # NULL wenn gepackt gespeichert - Zugriff immer über get_responses()
     responses = models.JSONField(
+        null=True,
+        blank=True,
         help_text="Question responses as JSON array"
     )
+    # Kompakte Alternative: 1 Byte pro Question.ordinal (siehe analyses/packing.py)
+    responses_packed = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text="Packed responses: one byte (0-5) per question ordinal"
+    )
+    responses_layout = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Byte layout version of responses_packed"
+    )
     score_total = models.DecimalField(
         max_digits=4,
         decimal_places=2,
@@ -55,6 +72,33 @@ class Analysis(models.Model):
         help_text="Total weighted score (0-5)"
     )
     
+    # Vorberechnete Red Flags, sortiert nach Impact (absteigend)
+    # Format: [["father_absence", 4, 3.85], ...] = [key, value, weight]
+    red_flag_impacts = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Sorted red flag impacts as [key, value, weight] triples"
+    )
+    red_flag_version = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Weights version (catalog.weights_version) the red flag impacts were computed with"
+    )
+    
+    # Segment des Users bei Erstellung (denormalisiert für Analytics ohne Join)
+    author_age_group = models.CharField(
+        max_length=5,
+        null=True,
+        blank=True,
+        help_text="Age group of the author at creation (AnalyticsService.AGE_GROUPS)"
+    )
+    author_country = models.CharField(
+        max_length=2,
+        null=True,
+        blank=True,
+        help_text="Country code of the author at creation"
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -64,73 +108,199 @@ class Analysis(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['is_unlocked']),
+            # Partielle Segment-Indizes: Index-Only-Scans für Statistiken
+            models.Index(
+                fields=['author_country', 'score_total'],
+                condition=models.Q(is_unlocked=True),
+                name='analyses_country_score_idx',
+            ),
+            models.Index(
+                fields=['author_age_group', 'author_country', 'score_total'],
+                condition=models.Q(is_unlocked=True),
+                name='analyses_age_country_score_idx',
+            ),
         ]
         ordering = ['-created_at']
     
     def __str__(self):
         return f"Analysis {self.id} by {self.user.email}"
     
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.author_age_group is None and self.author_country is None:
+            self.assign_author_segment()
+        super().save(*args, **kwargs)
+    
+    def assign_author_segment(self, year=None):
+        """
+        Business Logic: Altersgruppe und Land des Users festhalten.
+        year: Bezugsjahr der Altersgruppe (Standard: aktuelles Jahr)
+        """
+        from accounts.models import UserProfile
+        from analyses.analytics import AnalyticsService
+        
+        profile = UserProfile.objects.filter(user_id=self.user_id).values_list('birthdate', 'country').first()
+        birthdate, country = profile or (None, None)
+        self.author_age_group = AnalyticsService.age_group_for_birth_year(
+            birthdate.year if birthdate else None, year or date.today().year
+        )
+        self.author_country = country or None
+    
+    @classmethod
+    def create_with_scores(cls, user, responses, score_total, category_scores,
+                           partner_name=None, partner_age=None, partner_country=None) -> 'Analysis':
+        """
+        Business Logic: Erstelle Analyse inkl. Category Scores atomar.
+        Ein INSERT für die Analyse (PK via RETURNING) und ein bulk_create
+        für alle Category Scores in einer Transaktion.
+        """
+        analysis = cls(
+            user=user,
+            partner_name=partner_name,
+            partner_age=partner_age,
+            partner_country=partner_country,
+            responses=responses,
+            score_total=score_total,
+            is_unlocked=False  # User muss Credits verwenden
+        )
+        if Config.PACK_ANALYSIS_RESPONSES:
+            analysis.pack_responses()
+        
+        with transaction.atomic():
+            analysis.save(force_insert=True)
+            CategoryScore.objects.bulk_create([
+                CategoryScore(analysis=analysis, category=category, score=score)
+                for category, score in category_scores.items()
+            ])
+        return analysis
+    
+    def get_responses(self) -> list:
+        """
+        Business Logic: Antworten im JSON-Format, egal wie gespeichert.
+        Returns: [{"key": str, "value": int}, ...]
+        """
+        if self.responses is not None:
+            return self.responses
+        if self.responses_packed is None:
+            return []
+        from analyses.packing import unpack_responses
+        return unpack_responses(self.responses_packed, self.responses_layout)
+    
+    def pack_responses(self) -> bool:
+        """
+        Business Logic: Stelle auf gepackte Antworten um (ohne zu speichern).
+        Returns: False, wenn die Antworten nicht verlustfrei packbar sind
+        """
+        from analyses.packing import PACKED_LAYOUT_VERSION, pack_responses
+        
+        if self.responses is None:
+            return self.responses_packed is not None
+        packed = pack_responses(self.responses)
+        if packed is None:
+            return False
+        self.responses_packed = packed
+        self.responses_layout = PACKED_LAYOUT_VERSION
+        self.responses = None
+        return True
+    
     def unlock(self) -> bool:
         """
         Business Logic: Entsperre die Analyse.
         Prüft ob User genug Credits hat.
+        Analyse- und User-Zeile werden gesperrt (SELECT ... FOR UPDATE) und
+        neu geprüft: ein doppelter Unlock (Double-Submit, zwei Tabs) verbraucht
+        keinen zweiten Credit und zählt die Statistiken nicht doppelt.
         """
-        if not self.is_unlocked and self.user.consume_credit():
-            self.is_unlocked = True
-            self.save(update_fields=['is_unlocked'])
-            return True
-        return False
+        if self.is_unlocked:
+            return False
+        
+        from analyses.analytics import AnalyticsService
+        from analyses.histograms import ScoreHistogramService
+        from analyses.rollups import CountryRollupService
+        
+        with transaction.atomic():
+            locked = Analysis.objects.select_for_update().select_related('user').get(pk=self.pk)
+            self.user.credits = locked.user.credits
+            if locked.is_unlocked:
+                self.is_unlocked = True
+                return False
+            if not locked.user.consume_credit():
+                return False
+            self.user.credits = locked.user.credits
+            locked.is_unlocked = True
+            # Red Flags einmalig beim Entsperren berechnen
+            locked.refresh_red_flag_impacts(save=False)
+            locked.save(update_fields=['is_unlocked', 'red_flag_impacts', 'red_flag_version'])
+            
+            # Statistiken zählen nur entsperrte Analysen - gebucht mit dem gesperrten
+            # Stand, nicht mit self (ein paralleles Rescoring kann score_total geändert haben)
+            ScoreHistogramService.add(locked)
+            CountryRollupService.add(locked)
+            AnalyticsService.invalidate_age_group_statistics()
+        
+        self.is_unlocked = True
+        self.score_total = locked.score_total
+        self.red_flag_impacts = locked.red_flag_impacts
+        self.red_flag_version = locked.red_flag_version
+        return True
     
     def calculate_scores(self):
         """
         Business Logic: Berechne Category Scores aus responses.
         Verwendet DYNAMISCH aktuelle Question.calculated_weight Werte.
         """
-        from analyses.services import ScoreCalculator
-        calculator = ScoreCalculator(self.responses)
-        return calculator.calculate_category_scores()
+        from analyses.services import score_responses
+        return score_responses(self.get_responses())['category_scores']
+    
+    def refresh_red_flag_impacts(self, save=True) -> list:
+        """
+        Business Logic: Sortierte Impact-Liste, neu berechnet nur wenn sich
+        die Gewichte (catalog.weights_version) seit der letzten Berechnung
+        geändert haben. Text-Änderungen an Fragen lösen nichts aus.
+        Returns: [[key, value, weight], ...]
+        """
+        from analyses.services import red_flag_impacts
+        from questionnaire.catalog import get_catalog
+        
+        catalog = get_catalog()
+        if self.red_flag_impacts is not None and self.red_flag_version == catalog.weights_version:
+            return self.red_flag_impacts
+        
+        self.red_flag_impacts = red_flag_impacts(self.get_responses(), catalog.weights)
+        self.red_flag_version = catalog.weights_version
+        if save and self.pk:
+            self.save(update_fields=['red_flag_impacts', 'red_flag_version'])
+        return self.red_flag_impacts
     
-    def get_top_red_flags(self, limit=5):
+    def get_top_red_flags(self, limit=5, offset=0):
         """
         Business Logic: Hole Top Red Flags basierend auf Impact.
         Impact = response_value * calculated_weight (DYNAMISCH aus Question)
         Verwendet kompakte Texte für bessere mobile Darstellung.
+        Seiten sind Slices der vorberechneten Impact-Liste. Sind die Gewichte
+        neuer, wird einmal neu berechnet und gespeichert (ein UPDATE der zwei
+        Felder) - weitere Seiten lesen dann die aktuelle Liste.
         """
         if not self.is_unlocked:
             return None
         
-        # Hole aktuelle calculated_weights UND Texte aus Question Model
-        questions = {q.key: q for q in Question.objects.filter(is_active=True)}
+        from questionnaire.catalog import get_catalog
         
-        red_flags = []
-        for response in self.responses:
-            key = response['key']
-            value = response['value']
-            
-            # DYNAMISCH: Hole aktuelles calculated_weight und Text
-            question = questions.get(key)
-            weight = question.calculated_weight if question else 5.0
-            
-            # Verwende kompakten Text falls vorhanden, sonst normalen Text
-            if question:
-                text = question.text_short_de if question.text_short_de else question.text_de
-            else:
-                text = key.replace('_', ' ').title()
-            
-            impact = value * weight
-            max_possible = 5 * weight  # Maximum möglich: 5 × Gewicht
-            red_flags.append({
+        texts = get_catalog().short_texts
+        return [
+            {
                 'key': key,
-                'text': text,
+                'text': texts.get(key) or key.replace('_', ' ').title(),
                 'value': value,
                 'weight': weight,
-                'impact': impact,
-                'max_possible': max_possible
-            })
-        
-        # Sortiere nach Impact (absteigend)
-        red_flags.sort(key=lambda x: x['impact'], reverse=True)
-        return red_flags[:limit]
+                'impact': value * weight,
+                'max_possible': 5 * weight,  # Maximum möglich: 5 × Gewicht
+            }
+            for key, value, weight in self.refresh_red_flag_impacts()[offset:offset + limit]
+        ]
+    
+    def count_red_flags(self) -> int:
+        """Business Logic: Anzahl Red Flags (für Pagination)."""
+        return len(self.refresh_red_flag_impacts())
 
 
 class CategoryScore(models.Model):
@@ -162,3 +332,41 @@ class CategoryScore(models.Model):
     
     def __str__(self):
         return f"{self.category}: {self.score}"
+
+
+class ScoreHistogram(models.Model):
+    """
+    Histogramm der score_total Werte entsperrter Analysen pro Segment.
+    Scores haben 2 Nachkommastellen (0.00-5.00) → 501 Buckets = exakte Percentile.
+    Segmente: global, age:<Gruppe>, country:<Land>, age_country:<Gruppe>|<Land>
+    Gepflegt von ScoreHistogramService (analyses/histograms.py).
+    """
+    segment = models.CharField(max_length=40)
+    bucket = models.PositiveSmallIntegerField(help_text="score_total × 100 (0-500)")
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'score_histograms'
+        unique_together = ['segment', 'bucket']
+    
+    def __str__(self):
+        return f"{self.segment} [{self.bucket / 100:.2f}]: {self.count}"
+
+
+class CountryRollup(models.Model):
+    """
+    Voraggregierte Scores entsperrter Analysen pro Land.
+    category = '' für score_total, sonst Category Key (CategoryScore.score).
+    Gepflegt von CountryRollupService (analyses/rollups.py).
+    """
+    country = models.CharField(max_length=2)
+    category = models.CharField(max_length=20, blank=True)
+    count = models.IntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'country_rollups'
+        unique_together = ['country', 'category']
+    
+    def __str__(self):
+        return f"{self.country} {self.category or 'total'}: {self.count}"
@@ -0,0 +1,66 @@
+"""
+Kompakte Kodierung für Analysis.responses
+Statt [{"key": "father_absence", "value": 4}, ...] ein Byte pro Frage:
+Position = Question.ordinal, Wert = Bewertung 1-5, 0 = nicht beantwortet.
+Aus ~1 KB JSONB werden ~65 Bytes, Dekodieren braucht keinen JSON-Parser.
+
+Gepackt wird nur, wenn alle Keys bekannt sind, jede Frage höchstens einmal
+vorkommt und die Werte 1-5 sind - sonst bleibt die Analyse beim JSON-Format.
+Die ursprüngliche Reihenfolge wird nicht gespeichert: dekodiert wird in
+Ordinal-Reihenfolge (Scores sind reihenfolgeunabhängig bis auf Float-Rundung
+in der letzten Stelle).
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from questionnaire.catalog import get_catalog
+
+
+# Version des Byte-Layouts (Analysis.responses_layout)
+PACKED_LAYOUT_VERSION = 1
+
+
+def pack_responses(responses: List[Dict], catalog=None) -> Optional[bytes]:
+    """
+    Kodiert responses als Byte-String (Länge = höchstes beantwortetes Ordinal + 1).
+    Returns: bytes oder None, wenn die Liste nicht packbar ist
+    """
+    ordinals = (catalog or get_catalog()).ordinals
+    packed = bytearray()
+    for response in responses:
+        ordinal = ordinals.get(response['key'])
+        value = response['value']
+        if ordinal is None or type(value) is not int or not 1 <= value <= 5:
+            return None
+        if ordinal >= len(packed):
+            packed.extend(bytes(ordinal + 1 - len(packed)))
+        elif packed[ordinal]:
+            return None  # Doppelte Frage
+        packed[ordinal] = value
+    return bytes(packed)
+
+
+def unpack_responses(packed, layout: int = PACKED_LAYOUT_VERSION, catalog=None) -> List[Dict]:
+    """
+    Dekodiert einen Byte-String zurück ins JSON-Format
+    [{"key": str, "value": int}, ...] (in Ordinal-Reihenfolge).
+    """
+    if layout != PACKED_LAYOUT_VERSION:
+        raise ValueError(f'Unbekanntes Response-Layout: {layout}')
+    keys = (catalog or get_catalog()).keys_by_ordinal
+    return [
+        {'key': keys[ordinal], 'value': value}
+        for ordinal, value in enumerate(bytes(packed))
+        if value and ordinal < len(keys) and keys[ordinal] is not None
+    ]
+
+
+def decode_array(packed, layout: int = PACKED_LAYOUT_VERSION) -> np.ndarray:
+    """
+    Byte-String als NumPy-Array (uint8, Index = Ordinal, 0 = nicht beantwortet).
+    Zero-Copy über den Puffer der Datenbank.
+    """
+    if layout != PACKED_LAYOUT_VERSION:
+        raise ValueError(f'Unbekanntes Response-Layout: {layout}')
+    return np.frombuffer(packed, dtype=np.uint8)
@@ -1,20 +1,57 @@
 """
 PDF Export für Analysis Reports
 Nutzt WeasyPrint für HTML-to-PDF Conversion
+
+Fertige PDFs liegen unter MEDIA_ROOT/pdf_exports/analysis_<id>_<hash>.pdf
+(Hash über Analyse-Stand, Katalog-Version und TEMPLATE_VERSION) und werden
+erst bei geändertem Stand neu gerendert. Ausgeliefert über downloads.file_response
+(X-Accel-Redirect hinter nginx).
 """
+import glob
+import hashlib
+import os
+
+from django.conf import settings
 from django.template.loader import render_to_string
 from django.http import HttpResponse
 from weasyprint import HTML, CSS
 from weasyprint.text.fonts import FontConfiguration
 import logging
 
+from questionnaire.catalog import current_version
+
+from .downloads import write_atomic
+
 logger = logging.getLogger(__name__)
 
+PDF_EXPORT_DIR = 'pdf_exports'
+
+
+def pdf_dir():
+    return os.path.join(settings.MEDIA_ROOT, PDF_EXPORT_DIR)
+
+
+def remove_cached_pdfs(analysis_id, keep=None):
+    """Löscht gecachte PDFs einer Analyse (außer keep). Gibt die Anzahl zurück."""
+    removed = 0
+    for filepath in glob.glob(os.path.join(pdf_dir(), f'analysis_{analysis_id}_*.pdf')):
+        if filepath == keep:
+            continue
+        try:
+            os.unlink(filepath)
+            removed += 1
+        except FileNotFoundError:
+            pass  # parallel gelöscht
+    return removed
+
 
 class AnalysisPDFExporter:
     """
     PDF-Export für Analysis mit professionellem Layout.
     """
+
+    # Bei Änderungen an Template oder CSS erhöhen (alte Dateien werden ersetzt)
+    TEMPLATE_VERSION = 1
     
     def __init__(self, analysis):
         self.analysis = analysis
@@ -25,18 +62,7 @@ class AnalysisPDFExporter:
         Generiere PDF und return HttpResponse.
         """
         try:
-            # Render HTML Template
-            html_string = self._render_html()
-            
-            # WeasyPrint Configuration
-            font_config = FontConfiguration()
-            
-            # Custom CSS für PDF
-            css = CSS(string=self._get_custom_css(), font_config=font_config)
-            
-            # HTML zu PDF konvertieren
-            html = HTML(string=html_string)
-            pdf = html.write_pdf(stylesheets=[css], font_config=font_config)
+            pdf = self._render_pdf()
             
             # HTTP Response erstellen
             response = HttpResponse(pdf, content_type='application/pdf')
@@ -49,6 +75,41 @@ class AnalysisPDFExporter:
             logger.error(f"PDF export failed for analysis {self.analysis.id}: {str(e)}")
             raise
     
+    def content_hash(self) -> str:
+        """Hash über alles, was das PDF bestimmt (updated_at ist auto_now)."""
+        payload = f'{self.analysis.pk}:{self.analysis.updated_at.isoformat()}:{current_version()}:{self.TEMPLATE_VERSION}'
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def get_pdf_path(self) -> str:
+        """
+        Pfad des PDFs; gerendert nur, wenn die Datei zum aktuellen Stand fehlt.
+        Ältere Varianten der Analyse werden danach entfernt.
+        """
+        filepath = os.path.join(pdf_dir(), f'analysis_{self.analysis.id}_{self.content_hash()}.pdf')
+        if not os.path.exists(filepath):
+            pdf = self._render_pdf()
+            write_atomic(filepath, lambda file: file.write(pdf))
+            remove_cached_pdfs(self.analysis.id, keep=filepath)
+            logger.info(f"PDF export rendered for analysis {self.analysis.id}")
+        return filepath
+
+    def _render_pdf(self) -> bytes:
+        """
+        Rendert das PDF (WeasyPrint).
+        """
+        # Render HTML Template
+        html_string = self._render_html()
+        
+        # WeasyPrint Configuration
+        font_config = FontConfiguration()
+        
+        # Custom CSS für PDF
+        css = CSS(string=self._get_custom_css(), font_config=font_config)
+        
+        # HTML zu PDF konvertieren
+        html = HTML(string=html_string)
+        return html.write_pdf(stylesheets=[css], font_config=font_config)
+    
     def _render_html(self) -> str:
         """
         Render HTML Template für PDF.
@@ -204,3 +265,10 @@ def export_analysis_pdf(analysis):
     """
     exporter = AnalysisPDFExporter(analysis)
     return exporter.generate_pdf()
+
+
+def export_analysis_pdf_file(analysis):
+    """
+    Helper function: Pfad des (gecachten) PDFs.
+    """
+    return AnalysisPDFExporter(analysis).get_pdf_path()
@@ -0,0 +1,301 @@
+"""
+Bulk-Rescoring gespeicherter Analysen
+Analysis.score_total und CategoryScore.score werden beim Erstellen eingefroren.
+Nach Gewichts-Änderungen rechnet dieses Modul alle Analysen mit einem
+festen Gewichts-Snapshot neu - vektorisiert pro Chunk, Rundung identisch
+zu score_responses. Entsperrte Analysen bekommen dabei auch ihre
+Red-Flag-Impacts zum neuen Snapshot (statt beim nächsten Aufruf der Seite).
+
+Exaktheit: np.bincount summiert sequenziell in Eingabe-Reihenfolge, damit
+sind Summen, Division und round() bitgleich zum Python-Pfad.
+"""
+from array import array
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Min
+
+from questionnaire.catalog import weights_version
+
+from .histograms import ScoreHistogramService
+from .models import Analysis, CategoryScore
+from .packing import unpack_responses
+from .rollups import TOTAL_CATEGORY, CountryRollupService
+from .services import red_flag_impacts
+
+
+CATEGORIES = ('TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS')
+CATEGORY_INDEX = {category: index for index, category in enumerate(CATEGORIES)}
+
+# Obergrenzen der Drift-Buckets (|neu - alt| des Gesamt-Scores)
+DRIFT_BUCKETS = (0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class ScoringTables:
+    """
+    Picklebarer Gewichts-/Kategorie-Snapshot für einen kompletten Rescoring-Lauf.
+    Wird an Worker-Prozesse übergeben und im Checkpoint gespeichert.
+    """
+
+    def __init__(self, weights: Dict[str, float], categories: Dict[str, str]):
+        self.weights = dict(weights)
+        self.categories = dict(categories)
+        self.weights_version = weights_version(self.weights)
+
+    @classmethod
+    def from_catalog(cls, catalog) -> 'ScoringTables':
+        return cls(catalog.weights, catalog.categories)
+
+    def to_dict(self) -> dict:
+        return {'weights': self.weights, 'categories': self.categories}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ScoringTables':
+        return cls(data['weights'], data['categories'])
+
+
+def _round_score(weighted_sum: float, max_possible: float) -> Decimal:
+    """Gleiche Normalisierung/Rundung wie score_responses (Python-float, nicht np.round)."""
+    weighted_sum, max_possible = float(weighted_sum), float(max_possible)
+    if max_possible == 0:
+        return Decimal('0.00')
+    return Decimal(str(round((weighted_sum / max_possible) * 5, 2)))
+
+
+def score_batch(responses_list: List[List[Dict]], tables: ScoringTables) -> List[Tuple[Decimal, Dict[str, Decimal]]]:
+    """
+    Vektorisiertes Scoring vieler Analysen auf einmal.
+
+    Args:
+        responses_list: pro Analyse die Liste von {"key": str, "value": int}
+        tables: Gewichts-/Kategorie-Snapshot
+
+    Returns:
+        pro Analyse (score_total, {category: score})
+    """
+    n = len(responses_list)
+    if n == 0:
+        return []
+
+    # Spalte pro Frage-Key (unbekannte Keys: Gewicht 5.0, keine Kategorie)
+    columns = {}
+    column_weights = array('d')
+    column_categories = array('b')
+    rows, cols, values = array('q'), array('q'), array('d')
+
+    for row, responses in enumerate(responses_list):
+        for response in responses:
+            key = response['key']
+            col = columns.get(key)
+            if col is None:
+                col = columns[key] = len(columns)
+                column_weights.append(tables.weights.get(key, 5.0))
+                column_categories.append(CATEGORY_INDEX.get(tables.categories.get(key), -1))
+            rows.append(row)
+            cols.append(col)
+            values.append(response['value'])
+
+    rows = np.frombuffer(rows, dtype=np.int64)
+    cols = np.frombuffer(cols, dtype=np.int64)
+    weights = np.frombuffer(column_weights, dtype=np.float64)[cols]
+    impacts = np.frombuffer(values, dtype=np.float64) * weights
+    max_possible = 5 * weights
+
+    totals = np.bincount(rows, weights=impacts, minlength=n)
+    totals_max = np.bincount(rows, weights=max_possible, minlength=n)
+
+    # Kategorie-Summen: Slot = Zeile × 4 + Kategorie
+    categories = np.frombuffer(column_categories, dtype=np.int8)[cols]
+    known = categories >= 0
+    slots = rows[known] * len(CATEGORIES) + categories[known]
+    size = n * len(CATEGORIES)
+    category_totals = np.bincount(slots, weights=impacts[known], minlength=size).reshape(n, -1)
+    category_max = np.bincount(slots, weights=max_possible[known], minlength=size).reshape(n, -1)
+
+    results = []
+    for row in range(n):
+        results.append((
+            _round_score(totals[row], totals_max[row]),
+            {
+                category: _round_score(category_totals[row, index], category_max[row, index])
+                for index, category in enumerate(CATEGORIES)
+            },
+        ))
+    return results
+
+
+def drift_bucket(drift: Decimal) -> str:
+    """Histogramm-Label für |neu - alt|."""
+    drift = abs(float(drift))
+    if drift == 0:
+        return '0'
+    for upper in DRIFT_BUCKETS[1:]:
+        if drift <= upper:
+            return f'≤{upper:.2f}'
+    return f'>{DRIFT_BUCKETS[-1]:.2f}'
+
+
+def _rescore_chunk(chunk: List[Tuple[int, Decimal, List[Dict], bool, Optional[int]]], tables: ScoringTables,
+                   dry_run: bool, stats: dict):
+    """
+    Scoring + Write-Back eines Chunks: ein bulk_update, ein Upsert
+    (+ Histogramm-, Rollup- und Red-Flag-Updates für entsperrte Analysen).
+    Gescored wird außerhalb der Transaktion; geschrieben wird gegen die
+    gesperrten Zeilen (SELECT ... FOR UPDATE), damit ein paralleler Unlock
+    oder Rescore die Deltas nicht gegen einen veralteten Stand bucht.
+    """
+    scored = {
+        analysis_id: (responses, new_scores)
+        for (analysis_id, _, responses, _, _), new_scores in zip(
+            chunk, score_batch([responses for _, _, responses, _, _ in chunk], tables)
+        )
+    }
+    stats['analyses'] += len(chunk)
+
+    if dry_run:
+        current = [
+            (analysis_id, score_total, is_unlocked, red_flag_version)
+            for analysis_id, score_total, _, is_unlocked, red_flag_version in chunk
+        ]
+        _apply_chunk(current, scored, tables, dry_run, stats)
+        return
+
+    with transaction.atomic():
+        # Stand unter der Sperre neu lesen (Unlock sperrt dieselbe Zeile)
+        current = Analysis.objects.select_for_update().filter(id__in=list(scored)).order_by('id').values_list(
+            'id', 'score_total', 'is_unlocked', 'red_flag_version'
+        )
+        _apply_chunk(list(current), scored, tables, dry_run, stats)
+
+
+def _apply_chunk(current: List[Tuple[int, Decimal, bool, Optional[int]]], scored: Dict[int, tuple],
+                 tables: ScoringTables, dry_run: bool, stats: dict):
+    """Deltas gegen den (gesperrten) Stand berechnen und zurückschreiben."""
+    stored_categories = {}
+    for analysis_id, category, score in CategoryScore.objects.filter(
+        analysis_id__in=[analysis_id for analysis_id, _, _, _ in current]
+    ).values_list('analysis_id', 'category', 'score'):
+        stored_categories[(analysis_id, category)] = score
+
+    changed_totals = []
+    unlocked_changes = {}
+    rollup_changes = {}
+    category_rows = []
+    for analysis_id, old_total, is_unlocked, _ in current:
+        new_total, new_categories = scored[analysis_id][1]
+        stats['histogram'][drift_bucket(new_total - old_total)] += 1
+        if new_total != old_total:
+            changed_totals.append(Analysis(id=analysis_id, score_total=new_total))
+            if is_unlocked:
+                unlocked_changes[analysis_id] = (old_total, new_total)
+                rollup_changes.setdefault(analysis_id, {})[TOTAL_CATEGORY] = (old_total, new_total)
+        for category, score in new_categories.items():
+            old_score = stored_categories.get((analysis_id, category))
+            if old_score != score:
+                category_rows.append(CategoryScore(analysis_id=analysis_id, category=category, score=score))
+                if is_unlocked:
+                    rollup_changes.setdefault(analysis_id, {})[category] = (old_score, score)
+
+    stats['changed'] += len(changed_totals)
+    stats['categories_changed'] += len(category_rows)
+
+    if dry_run:
+        return
+
+    red_flag_rows = [
+        Analysis(
+            id=analysis_id,
+            red_flag_impacts=red_flag_impacts(scored[analysis_id][0], tables.weights),
+            red_flag_version=tables.weights_version,
+        )
+        for analysis_id, _, is_unlocked, red_flag_version in current
+        if is_unlocked and red_flag_version != tables.weights_version
+    ]
+    if changed_totals:
+        Analysis.objects.bulk_update(changed_totals, ['score_total'])
+    if red_flag_rows:
+        Analysis.objects.bulk_update(red_flag_rows, ['red_flag_impacts', 'red_flag_version'])
+    if unlocked_changes:
+        ScoreHistogramService.apply(ScoreHistogramService.move_deltas(unlocked_changes))
+    if rollup_changes:
+        CountryRollupService.apply(CountryRollupService.move_deltas(rollup_changes))
+    if category_rows:
+        CategoryScore.objects.bulk_create(
+            category_rows,
+            update_conflicts=True,
+            unique_fields=['analysis', 'category'],
+            update_fields=['score'],
+        )
+
+
+def rescore_range(start_id: int, end_id: int, tables: ScoringTables, since=None,
+                  chunk_size: int = 2000, dry_run: bool = False) -> dict:
+    """
+    Rescored alle Analysen mit start_id <= id < end_id.
+    Liest per Server-Side Cursor (iterator) und schreibt chunkweise zurück.
+
+    Returns: {'analyses', 'changed', 'categories_changed', 'histogram'}
+    """
+    stats = {'analyses': 0, 'changed': 0, 'categories_changed': 0, 'histogram': Counter()}
+
+    queryset = Analysis.objects.filter(id__gte=start_id, id__lt=end_id)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    rows = queryset.order_by('id').values_list(
+        'id', 'score_total', 'responses', 'responses_packed', 'responses_layout', 'is_unlocked', 'red_flag_version'
+    )
+
+    chunk = []
+    for analysis_id, score_total, responses, packed, layout, is_unlocked, red_flag_version in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        if responses is None:
+            responses = unpack_responses(packed, layout) if packed is not None else []
+        chunk.append((analysis_id, score_total, responses, is_unlocked, red_flag_version))
+        if len(chunk) >= chunk_size:
+            _rescore_chunk(chunk, tables, dry_run, stats)
+            chunk = []
+    if chunk:
+        _rescore_chunk(chunk, tables, dry_run, stats)
+
+    stats['histogram'] = dict(stats['histogram'])
+    return stats
+
+
+def id_blocks(since=None, block_size: int = 20000) -> List[Tuple[int, int]]:
+    """
+    Teilt den ID-Bereich der (ggf. gefilterten) Analysen in feste Blöcke [start, end).
+    Blöcke sind Arbeitseinheiten für Worker und Checkpoint.
+    """
+    queryset = Analysis.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+
+    first = bounds['low'] - bounds['low'] % block_size
+    return [
+        (start, start + block_size)
+        for start in range(first, bounds['high'] + 1, block_size)
+    ]
+
+
+def merge_stats(total: dict, part: dict) -> dict:
+    """Addiert Worker-Statistiken."""
+    for field in ('analyses', 'changed', 'categories_changed'):
+        total[field] = total.get(field, 0) + part[field]
+    histogram = Counter(total.get('histogram', {}))
+    histogram.update(part['histogram'])
+    total['histogram'] = histogram
+    return total
+
+
+def sorted_histogram(histogram: Optional[dict]) -> List[Tuple[str, int]]:
+    """Histogramm in Bucket-Reihenfolge."""
+    labels = ['0'] + [f'≤{upper:.2f}' for upper in DRIFT_BUCKETS[1:]] + [f'>{DRIFT_BUCKETS[-1]:.2f}']
+    histogram = histogram or {}
+    return [(label, histogram.get(label, 0)) for label in labels]
@@ -0,0 +1,188 @@
+"""
+Länder-Rollups für Heatmaps und globale Durchschnitte
+Statt analyses (⋈ category_scores) bei jedem Aufruf zu aggregieren, hält
+CountryRollup pro (Land, Kategorie) Anzahl und Summe. Land = Analysis.author_country.
+category = '' steht für score_total, country = '' für alle Länder
+(laufende globale Durchschnitte für StatisticsService).
+
+Gepflegt in derselben Transaktion wie Unlock, Löschen und Rescoring;
+rebuild() baut alles mit zwei gruppierten Queries neu auf
+(manage.py rebuild_country_rollups), manage.py check_country_rollups
+vergleicht den Bestand mit einer vollständigen Neuberechnung.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Analysis, CategoryScore, CountryRollup
+from .stats_version import invalidate_statistics
+
+
+TOTAL_CATEGORY = ''
+
+ALL_COUNTRIES = ''
+
+UPSERT_BATCH_SIZE = 5000
+
+
+class CountryRollupService:
+    """
+    Service für Länder-Rollups.
+    Fat Service Pattern: Deltas, Upserts und Rebuild hier.
+    """
+
+    @staticmethod
+    def countries_for_analyses(analysis_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Land mehrerer Analysen mit einer Query (ohne Join)."""
+        return dict(Analysis.objects.filter(id__in=list(analysis_ids)).values_list('id', 'author_country'))
+
+    @staticmethod
+    def apply(deltas: Dict[tuple, list]):
+        """
+        Addiert {(country, category): [count_delta, sum_delta]} per Upsert
+        (ein Statement je 5000 Deltas). Sortiert für gleiche Sperr-Reihenfolge.
+        """
+        rows = [
+            (country, category, count, score_sum)
+            for (country, category), (count, score_sum) in sorted(deltas.items())
+            if count or score_sum
+        ]
+        if rows:
+            invalidate_statistics()
+        table = connection.ops.quote_name(CountryRollup._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start:start + UPSERT_BATCH_SIZE]
+                placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} (country, category, count, score_sum) VALUES {placeholders} '
+                    f'ON CONFLICT (country, category) DO UPDATE SET '
+                    f'count = {table}.count + excluded.count, '
+                    f'score_sum = {table}.score_sum + excluded.score_sum',
+                    [value for row in batch for value in row],
+                )
+
+    @classmethod
+    def add(cls, analysis):
+        """Entsperrte Analyse (Total + Category Scores) eintragen."""
+        cls._book(analysis, +1)
+
+    @classmethod
+    def remove(cls, analysis):
+        """Analyse austragen (Löschen)."""
+        cls._book(analysis, -1)
+
+    @staticmethod
+    def _rollup_countries(country: Optional[str]) -> List[str]:
+        """Global immer, das Land nur wenn im Profil gesetzt."""
+        return [ALL_COUNTRIES, country] if country else [ALL_COUNTRIES]
+
+    @classmethod
+    def _book(cls, analysis, sign: int):
+        countries = cls._rollup_countries(analysis.author_country)
+        scores = [(TOTAL_CATEGORY, analysis.score_total)] + list(
+            CategoryScore.objects.filter(analysis_id=analysis.pk).values_list('category', 'score')
+        )
+        cls.apply({
+            (country, category): [sign, sign * score]
+            for country in countries
+            for category, score in scores
+        })
+
+    @classmethod
+    def move_deltas(cls, changes: Dict[int, Dict[str, tuple]]) -> Dict[tuple, list]:
+        """
+        Deltas für geänderte Scores entsperrter Analysen.
+        Args: {analysis_id: {category_or_'': (alter_score | None, neuer_score)}}
+        """
+        deltas = defaultdict(lambda: [0, Decimal('0')])
+        for analysis_id, country in cls.countries_for_analyses(changes).items():
+            for rollup_country in cls._rollup_countries(country):
+                for category, (old_score, new_score) in changes[analysis_id].items():
+                    delta = deltas[(rollup_country, category)]
+                    if old_score is None:
+                        delta[0] += 1
+                        delta[1] += new_score
+                    else:
+                        delta[1] += new_score - old_score
+        return deltas
+
+    @classmethod
+    def compute(cls) -> Dict[tuple, list]:
+        """
+        Vollständige Neuberechnung: eine gruppierte Query für Totals,
+        eine für Category Scores. Globale Zeilen = Summe über alle Gruppen.
+        Returns: {(country, category): [count, score_sum]}
+        """
+        totals = Analysis.objects.filter(is_unlocked=True).values_list(
+            'author_country'
+        ).annotate(n=Count('*'), total=Sum('score_total')).order_by()
+        categories = CategoryScore.objects.filter(analysis__is_unlocked=True).values_list(
+            'analysis__author_country', 'category'
+        ).annotate(n=Count('*'), total=Sum('score')).order_by()
+
+        rollups = defaultdict(lambda: [0, Decimal('0')])
+        grouped = [(country, TOTAL_CATEGORY, n, total) for country, n, total in totals] + list(categories)
+        for country, category, n, total in grouped:
+            for rollup_country in cls._rollup_countries(country):
+                rollup = rollups[(rollup_country, category)]
+                rollup[0] += n
+                rollup[1] += total
+        return dict(rollups)
+
+    @classmethod
+    def stored(cls) -> Dict[tuple, list]:
+        """Aktueller Stand der Rollup-Tabelle (ohne leere Zeilen)."""
+        return {
+            (country, category): [count, score_sum]
+            for country, category, count, score_sum in CountryRollup.objects.exclude(
+                count=0, score_sum=0
+            ).values_list('country', 'category', 'count', 'score_sum')
+        }
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls) -> int:
+        """
+        Baut alle Rollups neu auf.
+        Returns: Anzahl Rollup-Zeilen
+        """
+        rollups = [
+            CountryRollup(country=country, category=category, count=count, score_sum=score_sum)
+            for (country, category), (count, score_sum) in cls.compute().items()
+        ]
+        CountryRollup.objects.all().delete()
+        CountryRollup.objects.bulk_create(rollups, batch_size=5000)
+        invalidate_statistics()
+        return len(rollups)
+
+    @staticmethod
+    def averages() -> Dict[str, Optional[Decimal]]:
+        """
+        Exakte globale Durchschnitte entsperrter Analysen aus den laufenden Summen.
+        Returns: {'' (score_total) | category: Decimal oder None}
+        """
+        return {
+            category: score_sum / count if count else None
+            for category, count, score_sum in CountryRollup.objects.filter(
+                country=ALL_COUNTRIES
+            ).values_list('category', 'count', 'score_sum')
+        }
+
+    @staticmethod
+    def heatmap(category: str = TOTAL_CATEGORY, min_count: int = 5) -> List[dict]:
+        """
+        Länder mit mindestens min_count Analysen, sortiert nach Durchschnitt.
+        Returns: [{'country', 'avg_score', 'count'}, ...]
+        """
+        rows = CountryRollup.objects.filter(
+            category=category, count__gte=min_count
+        ).exclude(country=ALL_COUNTRIES).values_list('country', 'count', 'score_sum')
+        results = [
+            {'country': country, 'avg_score': round(score_sum / count, 2), 'count': count}
+            for country, count, score_sum in rows
+        ]
+        return sorted(results, key=lambda x: x['avg_score'], reverse=True)
@@ -23,13 +23,12 @@ class ScoreCalculator:
     
     def _get_current_weights(self) -> Dict[str, float]:
         """
-        Holt aktuelle calculated_weights aus Question Model.
-        DYNAMISCH: Gewichte werden immer frisch aus DB geladen.
+        Holt aktuelle calculated_weights aus dem Fragen-Katalog.
+        DYNAMISCH: Katalog wird neu geladen sobald sich ein Gewicht ändert.
         """
-        from questionnaire.models import Question
+        from questionnaire.catalog import get_catalog
         
-        questions = Question.objects.filter(is_active=True)
-        return {q.key: q.calculated_weight for q in questions}
+        return get_catalog().weights
     
     def calculate_total_score(self) -> Decimal:
         """
@@ -70,7 +69,7 @@ class ScoreCalculator:
         Berechne Scores pro Kategorie.
         Returns: {"TRUST": 5.2, "BEHAVIOR": 7.8, ...}
         """
-        from questionnaire.models import Question
+        from questionnaire.catalog import get_catalog
         
         # Gruppiere responses nach Kategorie
         category_responses = {
@@ -80,12 +79,8 @@ class ScoreCalculator:
             'DYNAMICS': []
         }
         
-        # Hole Question-Kategorien aus DB
-        questions = Question.objects.filter(
-            key__in=[r['key'] for r in self.responses]
-        ).values('key', 'category')
-        
-        key_to_category = {q['key']: q['category'] for q in questions}
+        # Question-Kategorien aus dem Katalog (alle Fragen, auch inaktive)
+        key_to_category = get_catalog().categories
         
         for response in self.responses:
             key = response['key']
@@ -103,3 +98,96 @@ class ScoreCalculator:
                 category_scores[category] = Decimal('0.00')
         
         return category_scores
+
+
+def _normalized_score(weighted_sum: float, max_possible: float) -> Decimal:
+    """Normalisiere gewichtete Summe auf 0-5 Skala (Rundung wie calculate_total_score)."""
+    if max_possible == 0:
+        return Decimal('0.00')
+    score = (weighted_sum / max_possible) * 5
+    return Decimal(str(round(score, 2)))
+
+
+def red_flag_impacts(responses: List[Dict], weights: Dict[str, float]) -> List[list]:
+    """
+    Red Flags als [key, value, weight], sortiert nach Impact (absteigend).
+    Gleiche Reihenfolge wie score_responses()['red_flags'] (stabile Sortierung).
+    """
+    impacts = [
+        [response['key'], response['value'], weights.get(response['key'], 5.0)]
+        for response in responses
+    ]
+    impacts.sort(key=lambda flag: flag[1] * flag[2], reverse=True)
+    return impacts
+
+
+def score_responses(responses: List[Dict]) -> Dict:
+    """
+    Berechnet Gesamt-Score, Category Scores und Red Flag Impacts in einem Durchlauf.
+    Ein Katalog-Lookup für Gewichte, Kategorien und Texte - identische Rundung
+    wie ScoreCalculator.calculate_total_score / calculate_category_scores.
+    
+    Args:
+        responses: List von {"key": str, "value": int}
+    
+    Returns:
+        {
+            'score_total': Decimal,
+            'category_scores': {"TRUST": Decimal, ...},
+            'red_flags': [{key, text, value, weight, impact, max_possible}, ...]
+                         sortiert nach Impact (absteigend)
+        }
+    """
+    from questionnaire.catalog import get_catalog
+    
+    catalog = get_catalog()
+    weights = catalog.weights
+    categories = catalog.categories
+    texts = catalog.short_texts
+    
+    total_weighted_sum = 0
+    total_max_possible = 0
+    # Pro Kategorie: [gewichtete Summe, max mögliche Summe]
+    category_sums = {
+        'TRUST': [0, 0],
+        'BEHAVIOR': [0, 0],
+        'VALUES': [0, 0],
+        'DYNAMICS': [0, 0],
+    }
+    red_flags = []
+    
+    for response in responses:
+        key = response['key']
+        value = response['value']
+        weight = weights.get(key, 5.0)
+        
+        impact = value * weight
+        max_possible = 5 * weight
+        
+        total_weighted_sum += impact
+        total_max_possible += max_possible
+        
+        sums = category_sums.get(categories.get(key))
+        if sums is not None:
+            sums[0] += impact
+            sums[1] += max_possible
+        
+        red_flags.append({
+            'key': key,
+            'text': texts.get(key) or key.replace('_', ' ').title(),
+            'value': value,
+            'weight': weight,
+            'impact': impact,
+            'max_possible': max_possible,
+        })
+    
+    red_flags.sort(key=lambda x: x['impact'], reverse=True)
+    
+    return {
+        'score_total': _normalized_score(total_weighted_sum, total_max_possible),
+        'category_scores': {
+            category: _normalized_score(weighted_sum, max_possible)
+            for category, (weighted_sum, max_possible) in category_sums.items()
+        },
+        'red_flags': red_flags,
+    }
@@ -0,0 +1,34 @@
+"""
+Signals für Score-Histogramme, Analytics-Caches und gecachte PDF-Reports
+"""
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from .analytics import AnalyticsService
+from .histograms import ScoreHistogramService
+from .rollups import CountryRollupService
+from .models import Analysis
+
+
+@receiver(pre_delete, sender=Analysis)
+def remove_from_statistics(sender, instance, **kwargs):
+    """
+    Entfernt entsperrte Analysen beim Löschen aus Histogrammen und Länder-Rollups.
+    pre_delete: Profil und Category Scores existieren auch bei Cascade noch.
+    """
+    if instance.is_unlocked:
+        ScoreHistogramService.remove(instance)
+        CountryRollupService.remove(instance)
+        AnalyticsService.invalidate_age_group_statistics()
+
+
+@receiver(pre_delete, sender=Analysis)
+def remove_cached_pdf_exports(sender, instance, **kwargs):
+    """
+    Entfernt gecachte PDF-Reports (enthalten den Partner-Namen) nach dem Commit.
+    Import erst hier: WeasyPrint wird nicht beim App-Start geladen.
+    """
+    from .pdf_export import remove_cached_pdfs
+
+    analysis_id = instance.id
+    transaction.on_commit(lambda: remove_cached_pdfs(analysis_id))
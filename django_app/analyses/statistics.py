@@ -1,9 +1,15 @@
 """
 Statistics Service für Compare with Average
-Berechnet Durchschnittswerte aus allen Analysen
+Berechnet Durchschnittswerte aus allen entsperrten Analysen
 """
-from django.db.models import Avg
-from .models import Analysis, CategoryScore
+from django.core.cache import cache
+
+from redflag_project.config import Config
+from .rollups import TOTAL_CATEGORY, CountryRollupService
+from .stats_version import current_stats_version
+
+
+_MISSING = object()
 
 
 class StatisticsService:
@@ -15,7 +21,8 @@ class StatisticsService:
     @staticmethod
     def get_average_scores():
         """
-        Berechnet Durchschnittswerte über alle Analysen
+        Berechnet Durchschnittswerte über alle entsperrten Analysen
+        (aus laufenden Summen, ohne Tabellen-Scan; gecacht pro Statistik-Version)
         
         Returns:
             dict: {
@@ -27,28 +34,37 @@ class StatisticsService:
                     'DYNAMICS': float
                 }
             }
+            None, wenn es (noch) keine entsperrten Analysen gibt.
+            Kategorien ohne Scores fehlen in by_category.
         """
-        # Durchschnittlicher Total Score
-        avg_total = Analysis.objects.filter(is_unlocked=True).aggregate(
-            avg=Avg('score_total')
-        )['avg']
-        avg_total = float(avg_total) if avg_total is not None else 0.0
+        cache_key = f'analyses:average_scores:{current_stats_version()}'
+        result = cache.get(cache_key, _MISSING)
+        if result is not _MISSING:
+            return result
         
-        # Durchschnitt pro Kategorie
-        categories = ['TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS']
-        by_category = {}
+        # Laufende Summen entsperrter Analysen (CountryRollup, country = '')
+        averages = CountryRollupService.averages()
         
-        for category in categories:
-            avg = CategoryScore.objects.filter(category=category).aggregate(
-                avg=Avg('score')
-            )['avg']
-            avg = float(avg) if avg is not None else 0.0
-            by_category[category] = round(avg, 1)
-        
-        return {
-            'total': round(avg_total, 1),
-            'by_category': by_category
-        }
+        # Durchschnittlicher Total Score - ohne Rollup-Zeile kein erfundener 0.0-Durchschnitt
+        avg_total = averages.get(TOTAL_CATEGORY)
+        if avg_total is None:
+            result = None
+        else:
+            # Durchschnitt pro Kategorie
+            categories = ['TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS']
+            by_category = {}
+            
+            for category in categories:
+                avg = averages.get(category)
+                if avg is not None:
+                    by_category[category] = round(float(avg), 1)
+            
+            result = {
+                'total': round(float(avg_total), 1),
+                'by_category': by_category
+            }
+        cache.set(cache_key, result, timeout=Config.ANALYSIS_DETAIL_CACHE_SECONDS)
+        return result
     
     @staticmethod
     def compare_with_average(analysis):
@@ -75,8 +91,11 @@ class StatisticsService:
                     }
                 ]
             }
+            None, solange es keine Durchschnittswerte gibt
         """
         averages = StatisticsService.get_average_scores()
+        if averages is None:
+            return None
         
         # Total Vergleich
         user_total = float(analysis.score_total)
@@ -0,0 +1,38 @@
+"""
+Versionszähler der Statistik-Tabellen
+Jede Änderung an Histogrammen oder Länder-Rollups (Unlock, Löschen,
+Rescoring, Rebuild) erhöht nach dem Commit eine Versionsnummer im Cache.
+Abgeleitete Werte (Durchschnitte, Premium Insights, gerenderte Detail-Blöcke)
+werden unter dieser Version gecacht und veralten damit ohne explizites Löschen.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+STATS_VERSION_KEY = 'analyses:stats_version'
+
+
+def current_stats_version() -> int:
+    """
+    Aktuelle Statistik-Version aus dem Cache.
+    Fehlt sie, wird sie mit einem ms-Zeitstempel gesetzt (nie kleiner als eine alte Version).
+    """
+    version = cache.get(STATS_VERSION_KEY)
+    if version is None:
+        cache.add(STATS_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(STATS_VERSION_KEY)
+    return version
+
+
+def _bump_stats_version():
+    try:
+        cache.incr(STATS_VERSION_KEY)
+    except ValueError:
+        cache.set(STATS_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_statistics():
+    """Markiert alle statistik-abhängigen Caches als veraltet (nach dem Commit)."""
+    transaction.on_commit(_bump_stats_version)
@@ -1,3 +1,1155 @@
-from django.test import TestCase
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import ImageFont
+
+from accounts.models import UserProfile
+from analytics.models import AnalyticsSettings
+from subscriptions.models import Subscription, SubscriptionTier
+from questionnaire.catalog import get_catalog, invalidate_catalog
+from questionnaire.models import Question
+from redflag_project.config import Config
+from .analytics import AnalyticsService
+from .detail import AnalysisDetailAssembler
+from .histograms import ScoreHistogramService
+from .image_generator import ShareImageGenerator
+from .pdf_export import AnalysisPDFExporter, pdf_dir
+from .models import Analysis, CategoryScore, CountryRollup, ScoreHistogram
+from .statistics import StatisticsService
+from .stats_version import current_stats_version
+from .trend_analysis import TrendAnalysisService, lttb_indices
+from .views import TrendsView
+from .packing import decode_array, pack_responses, unpack_responses
+from .rescoring import ScoringTables, _rescore_chunk, score_batch
+from .rollups import CountryRollupService
+from .services import ScoreCalculator, score_responses
+
+
+class ScoreResponsesTests(TestCase):
+    """Single-Pass Scoring muss exakt die Werte des ScoreCalculator liefern."""
+
+    def setUp(self):
+        self.rng = random.Random(7)
+        questions = list(Question.objects.all())
+        for question in questions:
+            question.calculated_weight = round(self.rng.uniform(1.0, 5.0), 2)
+        Question.objects.bulk_update(questions, ['calculated_weight'])
+
+        # Katalog mit den neuen Gewichten laden
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.keys = [q.key for q in get_catalog().questions]
+
+    def test_matches_score_calculator(self):
+        for _ in range(50):
+            keys = self.rng.sample(self.keys, self.rng.randint(1, len(self.keys)))
+            responses = [{'key': key, 'value': self.rng.randint(1, 5)} for key in keys]
+            responses.append({'key': 'unknown_question', 'value': 4})
+
+            calculator = ScoreCalculator(responses)
+            with self.assertNumQueries(0):
+                scores = score_responses(responses)
+
+            self.assertEqual(scores['score_total'], calculator.calculate_total_score())
+            self.assertEqual(scores['category_scores'], calculator.calculate_category_scores())
+            impacts = [flag['impact'] for flag in scores['red_flags']]
+            self.assertEqual(impacts, sorted(impacts, reverse=True))
+            self.assertEqual(len(scores['red_flags']), len(responses))
+
+    def test_empty_responses(self):
+        scores = score_responses([])
+        self.assertEqual(scores['score_total'], ScoreCalculator([]).calculate_total_score())
+        self.assertEqual(set(scores['category_scores'].values()), {ScoreCalculator([]).calculate_total_score()})
+        self.assertEqual(scores['red_flags'], [])
+
+
+class AnalysisCreationTests(TestCase):
+    """Analyse + Category Scores: atomar, mit wenigen Statements."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            username='submitter', email='submitter@example.com', password='x'
+        )
+        self.responses = [{'key': q.key, 'value': 4} for q in get_catalog().questions[:10]]
+
+    def test_submit_creates_analysis_and_scores_in_two_statements(self):
+        scores = score_responses(self.responses)
+        # Profil (Segment) + INSERT Analyse + bulk INSERT Category Scores (plus Savepoint im TestCase)
+        with self.assertNumQueries(5):
+            analysis = Analysis.create_with_scores(
+                user=self.user,
+                responses=self.responses,
+                score_total=scores['score_total'],
+                category_scores=scores['category_scores'],
+            )
+        self.assertIsNotNone(analysis.pk)
+        self.assertEqual(
+            dict(analysis.category_scores.values_list('category', 'score')),
+            scores['category_scores'],
+        )
+
+    def test_failed_category_insert_rolls_back_analysis(self):
+        scores = score_responses(self.responses)
+        with self.assertRaises(IntegrityError):
+            Analysis.create_with_scores(
+                user=self.user,
+                responses=self.responses,
+                score_total=scores['score_total'],
+                category_scores={'TRUST': None},
+            )
+        self.assertFalse(Analysis.objects.exists())
+        self.assertFalse(CategoryScore.objects.exists())
+
+    def test_submit_view_redirects_to_detail(self):
+        self.client.force_login(self.user)
+        data = {f"q_{r['key']}": r['value'] for r in self.responses}
+        response = self.client.post('/questionnaire/submit/', data)
+        analysis = Analysis.objects.get(user=self.user)
+        self.assertRedirects(response, f'/analyses/{analysis.pk}/', fetch_redirect_response=False)
+        self.assertEqual(analysis.category_scores.count(), 4)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Parallele Transaktionen benötigen PostgreSQL')
+class ConcurrentSubmitTests(TransactionTestCase):
+    """Lasttest: parallele Submits/Unlocks in eigenen Threads (eigene Connections)."""
+
+    serialized_rollback = True  # Fragen aus der Daten-Migration wiederherstellen
+    THREADS = 8
+    PER_THREAD = 5
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.rng = random.Random(23)
+        self.keys = [q.key for q in get_catalog().questions]
+        self.users = []
+        for i in range(self.THREADS):
+            user = get_user_model().objects.create_user(
+                username=f'load{i}', email=f'load{i}@example.com', password='x', credits=self.PER_THREAD
+            )
+            UserProfile.objects.create(user=user, country=['DE', 'AT', None][i % 3])
+            self.users.append(user)
+
+    def run_parallel(self, work):
+        """Startet work(index) in THREADS Threads gleichzeitig; Exceptions schlagen den Test fehl."""
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def run(index):
+            try:
+                barrier.wait()
+                work(index)
+            except Exception as e:  # noqa: BLE001 - wird unten gemeldet
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def submit(self, user):
+        responses = [{'key': key, 'value': self.rng.randint(1, 5)} for key in self.keys]
+        scores = score_responses(responses)
+        return Analysis.create_with_scores(
+            user=user,
+            responses=responses,
+            score_total=scores['score_total'],
+            category_scores=scores['category_scores'],
+        )
+
+    def test_concurrent_submits_stay_at_three_statements(self):
+        statements = [0] * self.THREADS
+
+        def work(index):
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(self.PER_THREAD):
+                    self.submit(self.users[index])
+            statements[index] = len([q for q in queries if q['sql'] not in ('BEGIN', 'COMMIT')])
+
+        self.run_parallel(work)
+
+        submits = self.THREADS * self.PER_THREAD
+        self.assertEqual(Analysis.objects.count(), submits)
+        self.assertEqual(CategoryScore.objects.count(), submits * 4)
+        # Profil (Segment) + INSERT Analyse + bulk INSERT Category Scores (ohne BEGIN/COMMIT)
+        self.assertEqual(statements, [self.PER_THREAD * 3] * self.THREADS)
+
+    def test_concurrent_unlocks_keep_statistics_exact(self):
+        # Unlocks teilen sich Histogramm- und Rollup-Zeilen: serialisiert, aber exakt
+        analyses = [[self.submit(user) for _ in range(self.PER_THREAD)] for user in self.users]
+
+        def work(index):
+            for analysis in analyses[index]:
+                self.assertTrue(Analysis.objects.select_related('user').get(pk=analysis.pk).unlock())
+
+        self.run_parallel(work)
+
+        self.assertEqual(Analysis.objects.filter(is_unlocked=True).count(), self.THREADS * self.PER_THREAD)
+        self.assertFalse(get_user_model().objects.filter(credits__gt=0).exists())
+        incremental = set(ScoreHistogram.objects.filter(count__gt=0).values_list('segment', 'bucket', 'count'))
+        ScoreHistogramService.rebuild()
+        self.assertEqual(incremental, set(ScoreHistogram.objects.filter(count__gt=0).values_list('segment', 'bucket', 'count')))
+        self.assertEqual(CountryRollupService.stored(), CountryRollupService.compute())
+
+
+class RescoreAnalysesTests(TestCase):
+    """rescore_analyses: exakte Scores, Checkpoint-Resume."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.rng = random.Random(11)
+        self.user = get_user_model().objects.create_user(
+            username='rescore', email='rescore@example.com', password='x'
+        )
+        keys = [q.key for q in get_catalog().questions]
+        for _ in range(40):
+            responses = [
+                {'key': key, 'value': self.rng.randint(1, 5)}
+                for key in self.rng.sample(keys, self.rng.randint(1, len(keys)))
+            ]
+            scores = score_responses(responses)
+            Analysis.create_with_scores(
+                user=self.user,
+                responses=responses,
+                score_total=scores['score_total'],
+                category_scores=scores['category_scores'],
+            )
+
+        # Gewichte verschieben: gespeicherte Scores driften
+        questions = list(Question.objects.all())
+        for question in questions:
+            question.calculated_weight = round(self.rng.uniform(1.0, 5.0), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.bulk_update(questions, ['calculated_weight'])
+            invalidate_catalog()
+
+        fd, self.checkpoint = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.checkpoint)
+
+    def assertScoresAreCurrent(self, analyses):
+        for analysis in analyses:
+            scores = score_responses(analysis.responses)
+            self.assertEqual(analysis.score_total, scores['score_total'])
+            self.assertEqual(
+                dict(analysis.category_scores.values_list('category', 'score')),
+                scores['category_scores'],
+            )
+
+    def test_score_batch_matches_score_responses(self):
+        responses_list = [analysis.responses for analysis in Analysis.objects.all()]
+        responses_list.append([{'key': 'unknown_question', 'value': 2}])
+        batch = score_batch(responses_list, ScoringTables.from_catalog(get_catalog()))
+        for responses, (total, categories) in zip(responses_list, batch):
+            scores = score_responses(responses)
+            self.assertEqual(total, scores['score_total'])
+            self.assertEqual(categories, scores['category_scores'])
+
+    def test_dry_run_reports_drift_without_writing(self):
+        before = list(Analysis.objects.values_list('id', 'score_total'))
+        out = StringIO()
+        call_command('rescore_analyses', dry_run=True, checkpoint=self.checkpoint, stdout=out)
+        self.assertIn('DRIFT', out.getvalue())
+        self.assertEqual(list(Analysis.objects.values_list('id', 'score_total')), before)
+
+    def test_resumes_from_checkpoint(self):
+        ids = sorted(Analysis.objects.values_list('id', flat=True))
+        block_size = 10
+        first_block = ids[0] - ids[0] % block_size
+        tables = ScoringTables.from_catalog(get_catalog())
+        with open(self.checkpoint, 'w', encoding='utf-8') as f:
+            json.dump({
+                'run': {'since': None, 'block_size': block_size},
+                'tables': tables.to_dict(),
+                'completed': [first_block],
+                'stats': {},
+            }, f)
+
+        call_command(
+            'rescore_analyses', block_size=block_size, chunk_size=4,
+            checkpoint=self.checkpoint, stdout=StringIO(),
+        )
+
+        # Bereits erledigter Block wird übersprungen, der Rest ist aktuell
+        skipped = Analysis.objects.filter(id__lt=first_block + block_size)
+        self.assertTrue(any(
+            analysis.score_total != score_responses(analysis.responses)['score_total']
+            for analysis in skipped
+        ))
+        self.assertScoresAreCurrent(Analysis.objects.filter(id__gte=first_block + block_size))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        call_command('rescore_analyses', block_size=block_size, checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertScoresAreCurrent(Analysis.objects.all())
+
+
+class RedFlagImpactTests(TestCase):
+    """Vorberechnete Impact-Liste: Seiten sind Slices, Neuberechnung nur bei neuer Version."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            username='flags', email='flags@example.com', password='x', credits=2
+        )
+        rng = random.Random(5)
+        responses = [{'key': q.key, 'value': rng.randint(1, 5)} for q in get_catalog().questions[:25]]
+        scores = score_responses(responses)
+        self.analysis = Analysis.create_with_scores(
+            user=self.user,
+            responses=responses,
+            score_total=scores['score_total'],
+            category_scores=scores['category_scores'],
+        )
+
+    def test_unlock_precomputes_sorted_impacts(self):
+        self.assertTrue(self.analysis.unlock())
+        self.analysis.refresh_from_db()
+        expected = score_responses(self.analysis.responses)['red_flags']
+
+        with self.assertNumQueries(0):
+            pages = [self.analysis.get_top_red_flags(limit=10, offset=offset) for offset in (0, 10, 20)]
+        self.assertEqual([flag for page in pages for flag in page], expected)
+        self.assertEqual(self.analysis.count_red_flags(), 25)
+
+    def test_impacts_are_recomputed_when_weights_change(self):
+        self.analysis.unlock()
+        stored = (self.analysis.red_flag_impacts, self.analysis.red_flag_version)
+
+        question = Question.objects.get(key=self.analysis.responses[0]['key'])
+        question.calculated_weight = 4.99
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+
+        # Erster GET rechnet neu und speichert die Liste (ein UPDATE)
+        analysis = Analysis.objects.get(pk=self.analysis.pk)
+        with CaptureQueriesContext(connection) as queries:
+            flags = analysis.get_top_red_flags(limit=25)
+            self.assertEqual(analysis.count_red_flags(), 25)
+        self.assertEqual(len([q for q in queries if q['sql'].lstrip().upper().startswith('UPDATE')]), 1)
+        self.assertEqual(flags, score_responses(self.analysis.responses)['red_flags'])
+        self.analysis.refresh_from_db()
+        self.assertNotEqual((self.analysis.red_flag_impacts, self.analysis.red_flag_version), stored)
+        self.assertEqual(self.analysis.red_flag_version, get_catalog().weights_version)
+        self.assertEqual(
+            self.analysis.red_flag_impacts,
+            [[flag['key'], flag['value'], flag['weight']] for flag in flags],
+        )
+
+        # Weitere Seiten (LoadMore) lesen die gespeicherte Liste
+        analysis = Analysis.objects.get(pk=self.analysis.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(analysis.get_top_red_flags(limit=10, offset=10), flags[10:20])
+            self.assertEqual(analysis.count_red_flags(), 25)
+
+    def test_text_changes_keep_stored_impacts(self):
+        self.analysis.unlock()
+        version = self.analysis.red_flag_version
+
+        question = Question.objects.get(key=self.analysis.responses[0]['key'])
+        question.text_short_de = 'Geänderter Kurztext'
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+
+        self.assertEqual(get_catalog().weights_version, version)
+        with self.assertNumQueries(0):
+            flags = self.analysis.get_top_red_flags(limit=25)
+        self.assertIn('Geänderter Kurztext', [flag['text'] for flag in flags])
+
+
+class PackedResponsesTests(TestCase):
+    """Gepackte responses: gleiche Antworten, gleiche Scores, Backfill per Command."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            username='packed', email='packed@example.com', password='x'
+        )
+        self.catalog = get_catalog()
+        self.keys = [q.key for q in self.catalog.questions]
+        self.rng = random.Random(13)
+
+    def random_responses(self):
+        return [
+            {'key': key, 'value': self.rng.randint(1, 5)}
+            for key in self.rng.sample(self.keys, self.rng.randint(1, len(self.keys)))
+        ]
+
+    def test_round_trip(self):
+        for _ in range(20):
+            responses = self.random_responses()
+            packed = pack_responses(responses)
+            self.assertEqual(len(packed), max(self.catalog.ordinals[r['key']] for r in responses) + 1)
+
+            unpacked = unpack_responses(packed)
+            by_ordinal = sorted(responses, key=lambda r: self.catalog.ordinals[r['key']])
+            self.assertEqual(unpacked, by_ordinal)
+
+            array = decode_array(packed)
+            for response in responses:
+                self.assertEqual(array[self.catalog.ordinals[response['key']]], response['value'])
+
+    def test_unpackable_responses_stay_json(self):
+        self.assertIsNone(pack_responses([{'key': 'unknown_question', 'value': 3}]))
+        self.assertIsNone(pack_responses([{'key': self.keys[0], 'value': 6}]))
+        self.assertIsNone(pack_responses([{'key': self.keys[0], 'value': 2}, {'key': self.keys[0], 'value': 3}]))
+
+    def test_backfill_command_keeps_scores(self):
+        for _ in range(15):
+            responses = self.random_responses()
+            scores = score_responses(responses)
+            Analysis.create_with_scores(
+                user=self.user,
+                responses=responses,
+                score_total=scores['score_total'],
+                category_scores=scores['category_scores'],
+            )
+        odd = Analysis.create_with_scores(
+            user=self.user,
+            responses=[{'key': 'unknown_question', 'value': 3}],
+            score_total=0,
+            category_scores={},
+        )
+        before = {a.id: a.get_responses() for a in Analysis.objects.all()}
+
+        call_command('pack_analysis_responses', batch_size=4, stdout=StringIO())
+
+        for analysis in Analysis.objects.exclude(id=odd.id):
+            self.assertIsNone(analysis.responses)
+            self.assertEqual(
+                sorted(analysis.get_responses(), key=lambda r: r['key']),
+                sorted(before[analysis.id], key=lambda r: r['key']),
+            )
+            self.assertEqual(
+                score_responses(analysis.get_responses())['category_scores'],
+                score_responses(before[analysis.id])['category_scores'],
+            )
+        self.assertEqual(Analysis.objects.get(id=odd.id).responses, before[odd.id])
+
+        call_command('pack_analysis_responses', unpack=True, stdout=StringIO())
+        self.assertFalse(Analysis.objects.filter(responses__isnull=True).exists())
+
+
+class RescoreWithRandomWeightsMixin:
+    """Neue Zufallsgewichte veröffentlichen und alle Analysen neu bewerten (braucht self.rng)."""
+
+    def rescore_with_random_weights(self):
+        questions = list(Question.objects.all())
+        for question in questions:
+            question.calculated_weight = round(self.rng.uniform(1.0, 5.0), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.bulk_update(questions, ['calculated_weight'])
+            invalidate_catalog()
+        fd, checkpoint = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(checkpoint)
+        call_command('rescore_analyses', checkpoint=checkpoint, stdout=StringIO())
+
+
+class ScoreHistogramTests(RescoreWithRandomWeightsMixin, TestCase):
+    """Histogramm-Percentile = exakte Werte; inkrementelle Pflege = Rebuild."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.rng = random.Random(17)
+        self.keys = [q.key for q in get_catalog().questions]
+        this_year = date.today().year
+        profiles = [(this_year - 25, 'DE'), (this_year - 25, 'AT'), (this_year - 40, 'DE'), (None, None)]
+        for i, (birth_year, country) in enumerate(profiles):
+            user = get_user_model().objects.create_user(
+                username=f'hist{i}', email=f'hist{i}@example.com', password='x', credits=20
+            )
+            UserProfile.objects.create(
+                user=user, birthdate=date(birth_year, 6, 1) if birth_year else None, country=country
+            )
+            for _ in range(8):
+                analysis = self.create_analysis(user)
+                if self.rng.random() < 0.75:
+                    analysis.unlock()
+
+    def create_analysis(self, user):
+        responses = [
+            {'key': key, 'value': self.rng.randint(1, 5)}
+            for key in self.rng.sample(self.keys, self.rng.randint(1, len(self.keys)))
+        ]
+        scores = score_responses(responses)
+        return Analysis.create_with_scores(
+            user=user,
+            responses=responses,
+            score_total=scores['score_total'],
+            category_scores=scores['category_scores'],
+        )
+
+    def histogram_rows(self):
+        return set(ScoreHistogram.objects.filter(count__gt=0).values_list('segment', 'bucket', 'count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.histogram_rows()
+        ScoreHistogramService.rebuild()
+        self.assertEqual(incremental, self.histogram_rows())
+
+    def expected_percentile(self, score, **filters):
+        scores = list(Analysis.objects.filter(is_unlocked=True, **filters).values_list('score_total', flat=True))
+        better_than = sum(1 for s in scores if s < score)
+        return {
+            'percentile': math.floor(better_than / len(scores) * 100),
+            'total_comparisons': len(scores),
+            'average_score': round(sum(scores) / len(scores), 2),
+        }
+
+    def test_percentile_matches_exact_computation(self):
+        age_group = AnalyticsService.age_group_for_birth_year(date.today().year - 25, date.today().year)
+        cases = [
+            ({}, {}),
+            ({'country': 'DE'}, {'user__profile__country': 'DE'}),
+            ({'age_group': age_group}, {'user__profile__birthdate__year': date.today().year - 25}),
+            ({'age_group': age_group, 'country': 'DE'},
+             {'user__profile__birthdate__year': date.today().year - 25, 'user__profile__country': 'DE'}),
+        ]
+        for score in (Decimal('0.00'), Decimal('2.50'), Decimal('3.71'), Decimal('5.00')):
+            for kwargs, filters in cases:
+                result = AnalyticsService.calculate_percentile(score, **kwargs)
+                expected = self.expected_percentile(score, **filters)
+                for key, value in expected.items():
+                    self.assertEqual(result[key], value, (score, kwargs, key))
+
+    def test_unknown_segment_has_no_data(self):
+        result = AnalyticsService.calculate_percentile(Decimal('2.00'), country='FR')
+        self.assertIsNone(result['percentile'])
+        self.assertEqual(result['total_comparisons'], 0)
+
+    def test_second_unlock_of_same_row_is_noop(self):
+        user = get_user_model().objects.get(username='hist0')
+        credits = user.credits
+        analysis = self.create_analysis(user)
+        stale = Analysis.objects.get(pk=analysis.pk)  # zweiter Tab / Double-Submit
+
+        self.assertTrue(analysis.unlock())
+        self.assertFalse(stale.unlock())
+        self.assertTrue(stale.is_unlocked)
+        user.refresh_from_db()
+        self.assertEqual(user.credits, credits - 1)
+        self.assertMatchesRebuild()
+
+    def test_unlock_books_the_locked_score(self):
+        analysis = self.create_analysis(get_user_model().objects.get(username='hist0'))
+        # Rescoring zwischen Laden und Unlock
+        Analysis.objects.filter(pk=analysis.pk).update(score_total=Decimal('4.87'))
+
+        self.assertTrue(analysis.unlock())
+        self.assertEqual(analysis.score_total, Decimal('4.87'))
+        self.assertMatchesRebuild()
+
+    def test_rescore_chunk_rereads_rows_unlocked_meanwhile(self):
+        analysis = self.create_analysis(get_user_model().objects.get(username='hist0'))
+        stale_chunk = [(analysis.pk, analysis.score_total, analysis.get_responses(), False, None)]
+        analysis.unlock()
+
+        questions = list(Question.objects.all())
+        for question in questions:
+            question.calculated_weight = round(self.rng.uniform(1.0, 5.0), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.bulk_update(questions, ['calculated_weight'])
+            invalidate_catalog()
+        stats = {'analyses': 0, 'changed': 0, 'categories_changed': 0, 'histogram': Counter()}
+        _rescore_chunk(stale_chunk, ScoringTables.from_catalog(get_catalog()), False, stats)
+
+        self.assertMatchesRebuild()
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.red_flag_version, get_catalog().weights_version)
+
+    def test_unlock_delete_and_rescore_keep_histograms_current(self):
+        self.assertMatchesRebuild()
+
+        Analysis.objects.filter(is_unlocked=True).first().delete()
+        self.assertMatchesRebuild()
+
+        self.rescore_with_random_weights()
+        self.assertMatchesRebuild()
+
+
+class AgeGroupStatisticsTests(TestCase):
+    """Altersgruppen-Statistik: eine Query, gecacht, invalidiert beim Entsperren."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        this_year = date.today().year
+        self.scores = {}
+        for i, age in enumerate([20, 20, 25, 35, 60, None]):
+            user = get_user_model().objects.create_user(
+                username=f'age{i}', email=f'age{i}@example.com', password='x', credits=5
+            )
+            UserProfile.objects.create(user=user, birthdate=date(this_year - age, 1, 1) if age else None)
+            for score in (Decimal('1.20'), Decimal('3.45')):
+                Analysis.objects.create(user=user, responses=[], score_total=score, is_unlocked=True)
+        self.locked = Analysis.objects.create(
+            user=get_user_model().objects.get(username='age0'), responses=[], score_total=Decimal('4.90')
+        )
+
+    def test_single_query_matches_per_group_queries(self):
+        from .management.commands.benchmark_age_group_statistics import _legacy_age_group_statistics
+
+        with self.assertNumQueries(1):
+            stats = AnalyticsService.get_age_group_statistics()
+        self.assertEqual(stats, _legacy_age_group_statistics())
+        self.assertEqual([s['age_group'] for s in stats], ['18-23', '23-28', '33-38', '53+'])
+        self.assertEqual(stats[0]['count'], 4)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(AnalyticsService.get_age_group_statistics(), stats)
+
+    def test_backfill_assigns_segments_at_creation(self):
+        self.assertEqual(
+            Analysis.objects.get(pk=self.locked.pk).author_age_group, '18-23'
+        )
+        Analysis.objects.update(author_age_group=None, author_country=None)
+        UserProfile.objects.filter(user__username='age0').update(country='DE')
+
+        call_command('backfill_analysis_segments', batch_size=3, stdout=StringIO())
+        self.assertEqual(
+            sorted(Analysis.objects.filter(user__username='age0').values_list('author_age_group', 'author_country')),
+            [('18-23', 'DE')] * 3,
+        )
+        self.assertFalse(Analysis.objects.filter(user__username='age5', author_age_group__isnull=False).exists())
+        self.assertEqual(len(AnalyticsService._compute_age_group_statistics()), 4)
+
+    def test_unlock_invalidates_cache(self):
+        before = AnalyticsService.get_age_group_statistics()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.locked.unlock())
+        after = AnalyticsService.get_age_group_statistics()
+        self.assertEqual(after[0]['count'], before[0]['count'] + 1)
+
+
+class CountryRollupTests(RescoreWithRandomWeightsMixin, TestCase):
+    """Heatmaps aus dem Rollup = Join-Aggregation; Pflege bei Unlock/Löschen/Rescoring."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.rng = random.Random(19)
+        self.keys = [q.key for q in get_catalog().questions]
+        for i, country in enumerate(['DE', 'DE', 'AT', 'CH', None]):
+            user = get_user_model().objects.create_user(
+                username=f'roll{i}', email=f'roll{i}@example.com', password='x', credits=20
+            )
+            UserProfile.objects.create(user=user, country=country)
+            for _ in range(4):
+                responses = [
+                    {'key': key, 'value': self.rng.randint(1, 5)}
+                    for key in self.rng.sample(self.keys, self.rng.randint(1, len(self.keys)))
+                ]
+                scores = score_responses(responses)
+                analysis = Analysis.create_with_scores(
+                    user=user,
+                    responses=responses,
+                    score_total=scores['score_total'],
+                    category_scores=scores['category_scores'],
+                )
+                if self.rng.random() < 0.8:
+                    analysis.unlock()
+
+    def rollup_rows(self):
+        return set(CountryRollup.objects.exclude(count=0).values_list('country', 'category', 'count', 'score_sum'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollup_rows()
+        call_command('rebuild_country_rollups', stdout=StringIO())
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_heatmaps_match_join_aggregation(self):
+        by_country = {}
+        for country, score in Analysis.objects.filter(
+            is_unlocked=True, user__profile__country__isnull=False
+        ).values_list('user__profile__country', 'score_total'):
+            by_country.setdefault(country, []).append(score)
+        expected = sorted([
+            {'country': country, 'avg_score': round(sum(scores) / len(scores), 2), 'count': len(scores)}
+            for country, scores in by_country.items() if len(scores) >= 5
+        ], key=lambda x: x['avg_score'], reverse=True)
+
+        from .management.commands.benchmark_country_rollups import (
+            _legacy_category_heatmap, _legacy_regional_heatmap,
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(AnalyticsService.get_regional_heatmap_data(), expected)
+        self.assertTrue(expected)
+        self.assertEqual(_legacy_regional_heatmap(), expected)
+
+        category = CategoryScore.objects.values_list('category', flat=True).first()
+        with self.assertNumQueries(1):
+            heatmap = AnalyticsService.get_category_heatmap_by_country(category)
+        self.assertEqual(heatmap, _legacy_category_heatmap(category))
+        for row in heatmap:
+            scores = list(CategoryScore.objects.filter(
+                category=category, analysis__is_unlocked=True, analysis__user__profile__country=row['country']
+            ).values_list('score', flat=True))
+            self.assertEqual(row['count'], len(scores))
+            self.assertGreaterEqual(row['count'], 3)
+            self.assertEqual(row['avg_score'], round(sum(scores) / len(scores), 2))
+
+    def test_second_unlock_of_same_row_is_noop(self):
+        analysis = Analysis.create_with_scores(
+            user=get_user_model().objects.get(username='roll0'), responses=[], score_total=Decimal('2.40'),
+            category_scores={'TRUST': Decimal('2.40')},
+        )
+        stale = Analysis.objects.get(pk=analysis.pk)  # zweiter Tab / Double-Submit
+        self.assertTrue(analysis.unlock())
+        self.assertFalse(stale.unlock())
+        self.assertMatchesRebuild()
+        call_command('check_country_rollups', stdout=StringIO())  # globale Summen (country='') stimmen
+
+    def test_unlock_delete_and_rescore_keep_rollups_current(self):
+        self.assertMatchesRebuild()
+
+        Analysis.objects.filter(is_unlocked=True, user__profile__country='DE').first().delete()
+        self.assertMatchesRebuild()
+
+        self.rescore_with_random_weights()
+        self.assertMatchesRebuild()
+
+    def test_global_averages_cover_unlocked_analyses_only(self):
+        unlocked = Analysis.objects.filter(is_unlocked=True)
+        totals = list(unlocked.values_list('score_total', flat=True))
+        expected_by_category = {}
+        for category in ['TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS']:
+            scores = list(CategoryScore.objects.filter(
+                category=category, analysis__is_unlocked=True
+            ).values_list('score', flat=True))
+            if scores:
+                expected_by_category[category] = round(float(sum(scores) / len(scores)), 1)
+
+        with self.assertNumQueries(1):
+            averages = StatisticsService.get_average_scores()
+        self.assertEqual(averages['total'], round(float(sum(totals) / len(totals)), 1))
+        self.assertEqual(averages['by_category'], expected_by_category)
+
+    def test_no_averages_without_rollup_rows(self):
+        CountryRollup.objects.all().delete()
+        analysis = Analysis.objects.filter(is_unlocked=True).first()
+
+        self.assertIsNone(StatisticsService.get_average_scores())
+        self.assertIsNone(StatisticsService.compare_with_average(analysis))
+
+    def test_check_command_detects_drift(self):
+        call_command('check_country_rollups', stdout=StringIO())
+
+        CountryRollup.objects.filter(country='', category='').update(count=1)
+        with self.assertRaises(CommandError):
+            call_command('check_country_rollups', stdout=StringIO())
+
+        call_command('check_country_rollups', fix=True, stdout=StringIO())
+        call_command('check_country_rollups', stdout=StringIO())
+
+
+class TrendAnalysisTests(TestCase):
+    """Trends: Statistik + Vergleich in einer Window-Query, Verläufe in einer Query (LTTB)."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='trend', email='trend@example.com', password='x')
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='x')
+        now = timezone.now()
+        self.analyses = []
+        scores = ['3.10', '2.90', '4.00', '2.50', '1.80', '2.20', '1.50', '1.00']
+        for i, score in enumerate(scores):
+            analysis = Analysis.objects.create(
+                user=self.user, responses=[], score_total=Decimal(score), is_unlocked=i != 5
+            )
+            Analysis.objects.filter(pk=analysis.pk).update(created_at=now - timedelta(days=40 - 5 * i))
+            for category, offset in (('TRUST', '0.10'), ('VALUES', '-0.20')):
+                CategoryScore.objects.create(
+                    analysis=analysis, category=category, score=Decimal(score) + Decimal(offset)
+                )
+            self.analyses.append(Analysis.objects.get(pk=analysis.pk))
+        Analysis.objects.create(user=other, responses=[], score_total=Decimal('5.00'), is_unlocked=True)
+
+    def test_statistics_over_unlocked_analyses(self):
+        with self.assertNumQueries(1):
+            stats = TrendAnalysisService.get_trend_statistics(self.user)
+
+        unlocked = [a.score_total for a in self.analyses if a.is_unlocked]
+        self.assertEqual(stats['total_analyses'], 7)
+        self.assertAlmostEqual(stats['avg_score'], float(sum(unlocked) / 7))
+        self.assertEqual((stats['min_score'], stats['max_score']), (1.0, 4.0))
+        # Neueste 3 (1.80, 1.50, 1.00) vs. älteste 3 (3.10, 2.90, 4.00)
+        self.assertAlmostEqual(stats['trend_direction'], (4.3 - 10.0) / 3)
+        self.assertEqual(stats['trend_class'], 'positive')
+
+    def test_comparison_skips_locked_previous_analysis(self):
+        current = self.analyses[6]  # Vorgänger 5 ist gesperrt → Vergleich mit 4
+        with self.assertNumQueries(1):
+            summary = TrendAnalysisService.get_trend_summary(self.user.pk, current)
+
+        comparison = summary['comparison']
+        self.assertEqual(comparison['previous_analysis'].pk, self.analyses[4].pk)
+        self.assertAlmostEqual(comparison['score_diff'], -0.3)
+        self.assertTrue(comparison['improved'])
+        self.assertEqual(comparison['days_between'], 10)
+        self.assertEqual(sorted(comparison['category_comparisons']), ['TRUST', 'VALUES'])
+        self.assertAlmostEqual(comparison['category_comparisons']['TRUST']['previous'], 1.9)
+        self.assertEqual(summary['statistics']['total_analyses'], 7)
+
+        # Gesperrte aktuelle Analyse: eigene Partition, zählt nicht zur Statistik
+        locked = TrendAnalysisService.get_trend_summary(self.user.pk, self.analyses[5])
+        self.assertEqual(locked['comparison']['previous_analysis'].pk, self.analyses[4].pk)
+        self.assertEqual(locked['statistics']['total_analyses'], 7)
+
+        self.assertIsNone(TrendAnalysisService.compare_with_previous_analysis(self.analyses[0]))
+
+    def test_series_are_aligned_in_one_query(self):
+        with self.assertNumQueries(1):
+            trend = TrendAnalysisService.get_trend_series(self.user)
+
+        unlocked = [a for a in self.analyses if a.is_unlocked]
+        self.assertEqual(trend['analysis_ids'], [a.pk for a in unlocked])
+        self.assertEqual(trend['series']['total'], [float(a.score_total) for a in unlocked])
+        self.assertEqual(trend['series']['TRUST'][0], 3.2)
+        self.assertEqual(trend['series']['BEHAVIOR'], [None] * 7)
+        self.assertEqual({len(values) for values in trend['series'].values()}, {7})
+
+    def test_series_are_downsampled_with_lttb(self):
+        trend = TrendAnalysisService.get_trend_series(self.user, max_points=4)
+        self.assertEqual(trend['total_points'], 7)
+        self.assertEqual(len(trend['dates']), 4)
+        self.assertEqual(trend['analysis_ids'][0], self.analyses[0].pk)
+        self.assertEqual(trend['analysis_ids'][-1], self.analyses[7].pk)
+        self.assertEqual({len(values) for values in trend['series'].values()}, {4})
+
+        # Ausreißer bleibt erhalten, Reihenfolge aufsteigend
+        ys = [1.0] * 50
+        ys[17] = 5.0
+        indices = lttb_indices(list(range(50)), ys, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertIn(17, indices)
+        self.assertEqual(indices, sorted(indices))
+
+    def test_trends_view_context_queries(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        view = TrendsView()
+        view.setup(request, pk=self.analyses[6].pk)
+        # Analyse laden + Statistik/Vergleich + Verläufe
+        with self.assertNumQueries(3):
+            view.object = view.get_object()
+            context = view.get_context_data(object=view.object)
+        self.assertEqual(context['trend_stats']['total_analyses'], 7)
+        self.assertEqual(len(context['category_trends']['VALUES']), 7)
+        self.assertEqual(context['comparison']['previous_analysis'].pk, self.analyses[4].pk)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+@mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_SECONDS', 3600)  # kein Flush während der Messung
+class AnalysisDetailQueryBudgetTests(TestCase):
+    """Detailseite: fester Query-Umfang unabhängig vom Datenbestand, Statistik als Fragmente."""
+
+    # Session, User, Analyse (+ Subscription/Profil), Category Scores,
+    # Analytics Settings (Context Processor). Statistik lädt die Seite nach.
+    QUERY_BUDGET = 5
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            username='detail', email='detail@example.com', password='x', credits=5
+        )
+        Subscription.objects.create(user=self.user, tier=SubscriptionTier.PREMIUM, is_active=True)
+        self.analysis = self.create_analysis(self.user, '2.40')
+        AnalyticsSettings.load()  # Singleton vorab anlegen (sonst INSERT beim ersten Request)
+        self.client.force_login(self.user)
+        self.url = reverse('analyses:detail', args=[self.analysis.pk])
+
+    def create_analysis(self, user, score):
+        if not hasattr(user, 'profile'):
+            UserProfile.objects.create(user=user, birthdate=date(1995, 5, 5), country='DE')
+        analysis = Analysis.create_with_scores(
+            user=user,
+            responses=[{'key': key, 'value': 3} for key in list(get_catalog().by_key)[:5]],
+            score_total=Decimal(score),
+            category_scores={'TRUST': Decimal(score), 'VALUES': Decimal('1.50')},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            analysis.unlock()
+        return analysis
+
+    def get_detail(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_stays_flat_as_data_grows(self):
+        response, small = self.get_detail()
+        self.assertLessEqual(small, self.QUERY_BUDGET)
+        self.assertContains(response, '2,40')  # LANGUAGE_CODE = 'de'
+        self.assertTrue(response.context['show_premium_features'])
+
+        for i in range(15):
+            other = get_user_model().objects.create_user(
+                username=f'd{i}', email=f'd{i}@example.com', password='x', credits=1
+            )
+            self.create_analysis(other, f'{1 + i / 10:.2f}')
+        # Neuer Analyse-Stand: Ergebnis-Block wird neu gerendert
+        Analysis.objects.filter(pk=self.analysis.pk).update(updated_at=timezone.now())
+
+        _, large = self.get_detail()
+        self.assertEqual(large, small)
+
+    def test_unlocked_block_is_cached(self):
+        response, cold = self.get_detail()
+        self.assertContains(response, reverse('analyses:comparison', args=[self.analysis.pk]))
+        self.assertContains(response, 'hx-trigger="load"')
+        _, warm = self.get_detail()
+        self.assertLess(warm, cold)
+        self.assertLessEqual(warm, 4)  # Session, User, Analyse-Join, Analytics Settings
+
+        # Key nur (ID, updated_at, Katalog-Version): fremde Unlocks ändern die
+        # Statistik-Version, der Ergebnis-Block bleibt trotzdem im Cache
+        stats_version = current_stats_version()
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='x', credits=1
+        )
+        self.create_analysis(other, '4.80')
+        self.assertNotEqual(current_stats_version(), stats_version)
+        _, after_unlock = self.get_detail()
+        self.assertEqual(after_unlock, warm)
+
+    def test_query_string_shares_the_cached_block(self):
+        self.get_detail()
+        _, warm = self.get_detail()
+
+        # Beliebige Query-Strings legen keine eigenen Cache-Einträge an
+        path = self.url
+        self.url = f'{path}?utm_source=x&ref=1'
+        response, with_query = self.get_detail()
+        self.assertEqual(with_query, warm)
+        self.assertContains(response, f'sharer.php?u=http://testserver{path}"')
+
+    def test_comparison_fragment_cache_headers_and_stats_version(self):
+        url = reverse('analyses:comparison', args=[self.analysis.pk])
+        response = self.client.get(url, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'Vergleich mit dem Durchschnitt')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        # Unveränderter Stand: 304 ohne Rendern
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Neue entsperrte Analyse ändert die Durchschnitte → neue Version, neuer Inhalt
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='x', credits=1
+        )
+        self.create_analysis(other, '4.80')
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed.content, response.content)
+
+    def test_premium_fragment_etag_follows_user_segment(self):
+        url = reverse('analyses:premium_insights', args=[self.analysis.pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Vergleichsgruppe hängt am Profil von heute: neues Land, neuer Inhalt
+        UserProfile.objects.filter(user=self.user).update(country='AT')
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed['ETag'], etag)
+
+    def test_premium_fragments(self):
+        response = self.client.get(reverse('analyses:premium_insights', args=[self.analysis.pk]))
+        self.assertContains(response, 'Premium Insights')
+        self.assertEqual(response.context['insights']['percentile']['total_comparisons'], 1)
+
+        # Geteilte Tabellen: einmal gerendert, danach für jeden User aus dem Cache
+        url = reverse('analyses:shared_stats', args=['age-groups'])
+        self.assertContains(self.client.get(url), '28-33')
+        with self.assertNumQueries(0):
+            AnalysisDetailAssembler.render_shared('age-groups')
+        self.assertEqual(self.client.get(reverse('analyses:shared_stats', args=['unknown'])).status_code, 404)
+
+        # Ohne Premium: Insights leer, geteilte Tabellen gesperrt
+        Subscription.objects.filter(user=self.user).update(tier=SubscriptionTier.FREE)
+        response = self.client.get(reverse('analyses:premium_insights', args=[self.analysis.pk]))
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ShareImageGeneratorTests(TestCase):
+    """Share-Grafiken: Fonts einmal pro Prozess, Basis-Layer wird nicht verändert."""
+
+    def setUp(self):
+        ShareImageGenerator.clear_cache()
+        self.addCleanup(ShareImageGenerator.clear_cache)
+        user = get_user_model().objects.create_user(username='share', email='share@example.com', password='x')
+        self.analyses = [
+            Analysis.create_with_scores(
+                user=user, responses=[], score_total=Decimal(score),
+                category_scores={'TRUST': Decimal(score), 'DYNAMICS': Decimal('1.10')},
+            )
+            for score in ('1.40', '4.60')
+        ]
+
+    def test_fonts_loaded_once_and_base_layer_reused(self):
+        renders = (
+            ShareImageGenerator.render_instagram_story,
+            ShareImageGenerator.render_standard_post,
+            ShareImageGenerator.render_og_image,
+        )
+        with mock.patch('analyses.image_generator.ImageFont.truetype', wraps=ImageFont.truetype) as truetype:
+            first = {render: render(self.analyses[0]).tobytes() for render in renders}
+            loaded = truetype.call_count
+            for render in renders:
+                self.assertNotEqual(render(self.analyses[1]).tobytes(), first[render])
+                self.assertEqual(render(self.analyses[0]).tobytes(), first[render])
+        self.assertEqual(truetype.call_count, loaded)
+        self.assertEqual(loaded, len({call.args for call in truetype.call_args_list}))
+
+
+class ShareImageCacheTests(TestCase):
+    """Share-Downloads: inhaltsadressiert, atomar geschrieben, ohne Pillow bei Wiederholung."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.user = get_user_model().objects.create_user(username='png', email='png@example.com', password='x')
+        self.analysis = Analysis.create_with_scores(
+            user=self.user, responses=[], score_total=Decimal('2.40'),
+            category_scores={'TRUST': Decimal('2.40'), 'VALUES': Decimal('1.50')},
+        )
+        Analysis.objects.filter(pk=self.analysis.pk).update(is_unlocked=True)
+        self.client.force_login(self.user)
+        self.url = reverse('analyses:share_image', args=[self.analysis.pk, 'story'])
+
+    def download(self, **headers):
+        response = self.client.get(self.url, follow=True, **headers)
+        if response.status_code == 200:
+            b''.join(response.streaming_content)
+        return response
+
+    def test_repeat_download_does_no_pillow_work(self):
+        first = self.download()
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('immutable', first['Cache-Control'])
+        digest = ShareImageGenerator.content_hash('story', self.analysis)
+        self.assertEqual(first['ETag'], f'"{digest}"')
+        self.assertEqual(os.listdir(ShareImageGenerator.image_dir()), [f'story_{digest}.png'])  # keine Temp-Dateien
+
+        with mock.patch.object(ShareImageGenerator, 'render_instagram_story') as render:
+            self.assertEqual(self.download().status_code, 200)
+            self.assertEqual(self.download(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        render.assert_not_called()
+
+        # Neuer Score → neuer Hash, neue Datei, Redirect auf die neue Variante
+        CategoryScore.objects.filter(analysis=self.analysis, category='TRUST').update(score=Decimal('4.00'))
+        second = self.download()
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(os.listdir(ShareImageGenerator.image_dir())), 2)
+
+    def test_cleanup_removes_stale_variants(self):
+        self.download()
+        CategoryScore.objects.filter(analysis=self.analysis, category='TRUST').update(score=Decimal('4.00'))
+        self.download()
+        legacy = os.path.join(ShareImageGenerator.image_dir(), f'share_post_{self.analysis.pk}.png')
+        open(legacy, 'wb').close()
+
+        call_command('cleanup_share_images', min_age=0, stdout=StringIO())
+
+        current = ShareImageGenerator.content_hash('story', Analysis.objects.get(pk=self.analysis.pk))
+        self.assertEqual(os.listdir(ShareImageGenerator.image_dir()), [f'story_{current}.png'])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+@mock.patch.object(Config, 'X_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+@mock.patch.object(AnalysisPDFExporter, '_render_pdf', return_value=b'%PDF-1.4')
+class DownloadDeliveryTests(TestCase):
+    """Downloads: X-Accel-Redirect hinter nginx, sonst FileResponse; PDFs aus dem Datei-Cache."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.user = get_user_model().objects.create_user(username='dl', email='dl@example.com', password='x')
+        self.analysis = Analysis.create_with_scores(
+            user=self.user, responses=[], score_total=Decimal('2.40'), partner_name='Alex',
+            category_scores={'TRUST': Decimal('2.40')},
+        )
+        Analysis.objects.filter(pk=self.analysis.pk).update(is_unlocked=True)
+        self.client.force_login(self.user)
+        self.pdf_url = reverse('analyses:export_pdf', args=[self.analysis.pk])
+
+    def download_pdf(self, **headers):
+        response = self.client.get(self.pdf_url, **headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def test_x_accel_redirect_behind_nginx(self, render_pdf):
+        response = self.client.get(
+            reverse('analyses:share_image', args=[self.analysis.pk, 'post']),
+            follow=True, HTTP_X_SENDFILE_TYPE='X-Accel-Redirect',
+        )
+        digest = ShareImageGenerator.content_hash('post', self.analysis)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/share_images/post_{digest}.png')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="redflag_analysis_{self.analysis.pk}_post.png"'
+        )
+
+        response = self.download_pdf(HTTP_X_SENDFILE_TYPE='X-Accel-Redirect')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertRegex(response['X-Accel-Redirect'], rf'^/protected-media/pdf_exports/analysis_{self.analysis.pk}_\w+\.pdf$')
+
+    def test_file_response_without_proxy(self, render_pdf):
+        response = self.download_pdf()  # kein nginx davor
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+        self.assertEqual(response.body, b'%PDF-1.4')
+        with mock.patch.object(Config, 'X_ACCEL_REDIRECT_PREFIX', ''):
+            response = self.download_pdf(HTTP_X_SENDFILE_TYPE='X-Accel-Redirect')
+            self.assertTrue(response.streaming)
+
+    def test_pdf_cache_reuses_replaces_and_removes_files(self, render_pdf):
+        self.download_pdf()
+        self.download_pdf()
+        self.assertEqual(render_pdf.call_count, 1)
+
+        # Geänderte Analyse (updated_at) → neues PDF ersetzt das alte
+        Analysis.objects.get(pk=self.analysis.pk).save()
+        self.download_pdf()
+        self.assertEqual(render_pdf.call_count, 2)
+        self.assertEqual(len(os.listdir(pdf_dir())), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Analysis.objects.get(pk=self.analysis.pk).delete()
+        self.assertEqual(os.listdir(pdf_dir()), [])
@@ -1,14 +1,54 @@
 """
 Trend-Analyse für User Score-Verlauf über Zeit
 """
-from django.db.models import Avg, Count, Max, Min
+from django.db import connection
 from datetime import timedelta
+from typing import List, Optional
 from django.utils import timezone
-from .models import Analysis
+from redflag_project.config import Config
+from .models import Analysis, CategoryScore
 import logging
 
 logger = logging.getLogger(__name__)
 
+TREND_CATEGORIES = ['TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS']
+
+# Anzahl ältester/neuester Analysen für die Trend-Richtung
+TREND_WINDOW = 3
+
+
+def lttb_indices(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: wählt threshold Punkte, die die Form der
+    Kurve erhalten (erster und letzter Punkt bleiben immer).
+    Returns: Indizes der gewählten Punkte (aufsteigend)
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Durchschnitt des nächsten Buckets = dritte Ecke des Dreiecks
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        # Punkt des aktuellen Buckets mit der größten Dreiecksfläche
+        ax, ay = xs[a], ys[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
 
 class TrendAnalysisService:
     """
@@ -40,69 +80,187 @@ class TrendAnalysisService:
         return trend_data
     
     @staticmethod
-    def get_trend_statistics(user):
+    def get_trend_series(user, days: Optional[int] = None, max_points: Optional[int] = None) -> dict:
         """
-        Berechne Trend-Statistiken für einen User.
+        Gesamt-Score und alle Category Scores der entsperrten Analysen eines
+        Users in einer Query (LEFT JOIN category_scores), ausgerichtet auf
+        dieselben Daten. Mehr als max_points Punkte werden per LTTB auf dem
+        Gesamt-Score reduziert - dieselben Indizes für alle Serien.
+        
+        Args:
+            days: Nur die letzten N Tage (None = alle)
+            max_points: Default Config.TREND_MAX_POINTS (0 = nicht reduzieren)
+        Returns: {'dates', 'analysis_ids', 'series': {'total', 'TRUST', ...}, 'total_points'}
+            (fehlende Category Scores = None)
         """
+        if max_points is None:
+            max_points = Config.TREND_MAX_POINTS
+
         analyses = Analysis.objects.filter(user=user, is_unlocked=True)
-        
-        if not analyses.exists():
-            return None
-        
-        stats = analyses.aggregate(
-            avg_score=Avg('score_total'),
-            max_score=Max('score_total'),
-            min_score=Min('score_total'),
-            total_analyses=Count('id')
+        if days is not None:
+            analyses = analyses.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        rows = analyses.order_by('created_at', 'id').values_list(
+            'id', 'created_at', 'score_total', 'category_scores__category', 'category_scores__score'
         )
-        
+
+        points = []  # [analysis_id, created_at, total, {category: score}]
+        for analysis_id, created_at, score_total, category, score in rows:
+            if not points or points[-1][0] != analysis_id:
+                points.append([analysis_id, created_at, float(score_total), {}])
+            if category is not None:
+                points[-1][3][category] = float(score)
+
+        total_points = len(points)
+        if max_points and total_points > max_points:
+            indices = lttb_indices(
+                [point[1].timestamp() for point in points], [point[2] for point in points], max_points
+            )
+            points = [points[index] for index in indices]
+
+        return {
+            'dates': [point[1].strftime('%Y-%m-%d') for point in points],
+            'analysis_ids': [point[0] for point in points],
+            'series': {
+                'total': [point[2] for point in points],
+                **{category: [point[3].get(category) for point in points] for category in TREND_CATEGORIES},
+            },
+            'total_points': total_points,
+        }
+
+    @staticmethod
+    def _trend_summary_sql() -> str:
+        analyses = connection.ops.quote_name(Analysis._meta.db_table)
+        category_scores = connection.ops.quote_name(CategoryScore._meta.db_table)
+        category_columns = ',\n                   '.join(
+            f'(SELECT score FROM {category_scores} cs WHERE cs.analysis_id = ranked.id AND cs.category = %s) '
+            f'AS category_{category.lower()}'
+            for category in TREND_CATEGORIES
+        )
+        # Fenster pro is_unlocked: Statistik und Ränge nur über entsperrte Analysen,
+        # die (evtl. gesperrte) aktuelle Analyse steht in ihrer eigenen Partition
+        return f"""
+            WITH ranked AS (
+                SELECT id, user_id, created_at, score_total, is_unlocked,
+                       COUNT(*) OVER unlocked AS total_analyses,
+                       AVG(score_total) OVER unlocked AS avg_score,
+                       MIN(score_total) OVER unlocked AS min_score,
+                       MAX(score_total) OVER unlocked AS max_score,
+                       ROW_NUMBER() OVER (PARTITION BY is_unlocked ORDER BY created_at, id) AS rank_first,
+                       ROW_NUMBER() OVER (PARTITION BY is_unlocked ORDER BY created_at DESC, id DESC) AS rank_last,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY is_unlocked, created_at < %s ORDER BY created_at DESC, id DESC
+                       ) AS rank_before
+                FROM {analyses}
+                WHERE (user_id = %s AND is_unlocked) OR id = %s
+                WINDOW unlocked AS (PARTITION BY is_unlocked)
+            )
+            SELECT ranked.*,
+                   {category_columns}
+            FROM ranked
+            WHERE id = %s OR (is_unlocked AND (
+                rank_first <= %s OR rank_last <= %s OR (created_at < %s AND rank_before = 1)
+            ))
+        """
+
+    @classmethod
+    def get_trend_summary(cls, user_id: int, analysis=None) -> dict:
+        """
+        Trend-Statistik eines Users und Vergleich einer Analyse mit der
+        vorherigen entsperrten Analyse - eine Query mit Window-Functions.
+        Liefert nur die benötigten Zeilen: je 3 älteste/neueste, die aktuelle
+        und die vorherige Analyse (Category Scores per Subquery nur für diese).
+        Returns: {'statistics': dict | None, 'comparison': dict | None}
+        """
+        before = analysis.created_at if analysis else None
+        target = analysis.pk if analysis else None
+        rows = list(Analysis.objects.raw(
+            cls._trend_summary_sql(),
+            [before, user_id, target, *TREND_CATEGORIES, target, TREND_WINDOW, TREND_WINDOW, before],
+        ))
+        unlocked = [row for row in rows if row.is_unlocked]
+        current = next((row for row in rows if row.pk == target), None)
+        previous = next(
+            (row for row in unlocked if before and row.created_at < before and row.rank_before == 1), None
+        )
+        return {
+            'statistics': cls._trend_statistics(unlocked) if unlocked else None,
+            'comparison': cls._comparison(current, previous) if current and previous else None,
+        }
+
+    @staticmethod
+    def _trend_statistics(unlocked) -> dict:
+        latest = [row.score_total for row in unlocked if row.rank_last <= TREND_WINDOW]
+        earliest = [row.score_total for row in unlocked if row.rank_first <= TREND_WINDOW]
+        latest_avg = sum(latest) / len(latest)
+        earliest_avg = sum(earliest) / len(earliest)
+
         # Berechne Trend (Verbesserung oder Verschlechterung)
-        latest_analyses = analyses.order_by('-created_at')[:3]
-        earliest_analyses = analyses.order_by('created_at')[:3]
-        
-        if latest_analyses.exists() and earliest_analyses.exists():
-            latest_avg = sum(a.score_total for a in latest_analyses) / len(latest_analyses)
-            earliest_avg = sum(a.score_total for a in earliest_analyses) / len(earliest_analyses)
-            
-            trend_direction = float(latest_avg - earliest_avg)
-            
-            if trend_direction < -0.3:
-                trend_text = "📉 Deutliche Verbesserung - Weniger Red Flags!"
-                trend_class = "positive"
-            elif trend_direction < -0.1:
-                trend_text = "↘️ Leichte Verbesserung"
-                trend_class = "positive"
-            elif trend_direction > 0.3:
-                trend_text = "📈 Achtung: Mehr Red Flags erkannt"
-                trend_class = "negative"
-            elif trend_direction > 0.1:
-                trend_text = "↗️ Leichter Anstieg der Red Flags"
-                trend_class = "negative"
-            else:
-                trend_text = "➡️ Stabil - Keine große Veränderung"
-                trend_class = "neutral"
+        trend_direction = float(latest_avg - earliest_avg)
+
+        if trend_direction < -0.3:
+            trend_text = "📉 Deutliche Verbesserung - Weniger Red Flags!"
+            trend_class = "positive"
+        elif trend_direction < -0.1:
+            trend_text = "↘️ Leichte Verbesserung"
+            trend_class = "positive"
+        elif trend_direction > 0.3:
+            trend_text = "📈 Achtung: Mehr Red Flags erkannt"
+            trend_class = "negative"
+        elif trend_direction > 0.1:
+            trend_text = "↗️ Leichter Anstieg der Red Flags"
+            trend_class = "negative"
         else:
-            trend_direction = 0
-            trend_text = "➡️ Zu wenig Daten für Trend-Analyse"
+            trend_text = "➡️ Stabil - Keine große Veränderung"
             trend_class = "neutral"
-        
+
+        row = unlocked[0]  # Fenster-Aggregate sind in allen Zeilen gleich
         return {
-            **stats,
-            'avg_score': float(stats['avg_score']),
-            'max_score': float(stats['max_score']),
-            'min_score': float(stats['min_score']),
+            'total_analyses': row.total_analyses,
+            'avg_score': float(row.avg_score),
+            'max_score': float(row.max_score),
+            'min_score': float(row.min_score),
             'trend_direction': trend_direction,
             'trend_text': trend_text,
             'trend_class': trend_class,
         }
+
+    @staticmethod
+    def _comparison(current, previous) -> dict:
+        score_diff = float(current.score_total - previous.score_total)
+
+        category_comparisons = {}
+        for category in TREND_CATEGORIES:
+            current_score = getattr(current, f'category_{category.lower()}')
+            previous_score = getattr(previous, f'category_{category.lower()}')
+            if current_score is not None and previous_score is not None:
+                diff = float(current_score) - float(previous_score)
+                category_comparisons[category] = {
+                    'current': float(current_score),
+                    'previous': float(previous_score),
+                    'diff': diff,
+                    'improved': diff < 0,
+                }
+
+        return {
+            'previous_analysis': previous,
+            'score_diff': score_diff,
+            'improved': score_diff < 0,
+            'category_comparisons': category_comparisons,
+            'days_between': (current.created_at - previous.created_at).days,
+        }
+
+    @classmethod
+    def get_trend_statistics(cls, user):
+        """
+        Berechne Trend-Statistiken für einen User.
+        """
+        return cls.get_trend_summary(user.pk)['statistics']
     
     @staticmethod
     def get_category_trends(user, category):
         """
         Hole Trend für eine spezifische Kategorie.
         """
-        from .models import CategoryScore
-        
         category_scores = CategoryScore.objects.filter(
             analysis__user=user,
             analysis__is_unlocked=True,
@@ -119,49 +277,9 @@ class TrendAnalysisService:
         
         return trend_data
     
-    @staticmethod
-    def compare_with_previous_analysis(analysis):
+    @classmethod
+    def compare_with_previous_analysis(cls, analysis):
         """
         Vergleiche aktuelle Analyse mit vorheriger vom selben User.
         """
-        previous = Analysis.objects.filter(
-            user=analysis.user,
-            is_unlocked=True,
-            created_at__lt=analysis.created_at
-        ).order_by('-created_at').first()
-        
-        if not previous:
-            return None
-        
-        score_diff = float(analysis.score_total - previous.score_total)
-        
-        # Vergleiche auch Category Scores
-        from .models import CategoryScore
-        category_comparisons = {}
-        
-        for cat in ['TRUST', 'BEHAVIOR', 'VALUES', 'DYNAMICS']:
-            current_cat = CategoryScore.objects.filter(
-                analysis=analysis, 
-                category=cat
-            ).first()
-            previous_cat = CategoryScore.objects.filter(
-                analysis=previous, 
-                category=cat
-            ).first()
-            
-            if current_cat and previous_cat:
-                diff = float(current_cat.score - previous_cat.score)
-                category_comparisons[cat] = {
-                    'current': float(current_cat.score),
-                    'previous': float(previous_cat.score),
-                    'diff': diff,
-                    'improved': diff < 0,
-                }
-        
-        return {
-            'previous_analysis': previous,
-            'score_diff': score_diff,
-            'improved': score_diff < 0,
-            'category_comparisons': category_comparisons,
-            'days_between': (analysis.created_at - previous.created_at).days,
-        }
+        return cls.get_trend_summary(analysis.user_id, analysis)['comparison']
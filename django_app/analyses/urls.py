@@ -10,6 +10,9 @@ urlpatterns = [
     path('', views.AnalysisListView.as_view(), name='list'),
     path('<int:pk>/', views.AnalysisDetailView.as_view(), name='detail'),
     path('<int:pk>/unlock/', views.UnlockAnalysisView.as_view(), name='unlock'),
+    path('<int:pk>/comparison/', views.ComparisonFragmentView.as_view(), name='comparison'),
+    path('<int:pk>/premium-insights/', views.PremiumInsightsFragmentView.as_view(), name='premium_insights'),
+    path('stats/<slug:name>/', views.SharedStatsFragmentView.as_view(), name='shared_stats'),
     path('<int:pk>/delete/', views.DeleteAnalysisView.as_view(), name='delete'),
     path('<int:pk>/share/<str:format>/', views.GenerateShareImageView.as_view(), name='share_image'),
     path('<int:pk>/export/pdf/', views.ExportAnalysisPDFView.as_view(), name='export_pdf'),
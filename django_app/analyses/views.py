@@ -6,16 +6,19 @@ from django.views.generic import ListView, DetailView
 from django.views import View
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.contrib import messages
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from redflag_project.config import Config
+from subscriptions.models import Subscription
 from .models import Analysis
 from .analytics import AnalyticsService
+from .detail import SHARED_FRAGMENTS, AnalysisDetailAssembler
+from .downloads import file_response
 from .image_generator import ShareImageGenerator
-from .statistics import StatisticsService
-from subscriptions.models import Subscription
-from django.http import FileResponse
-from .pdf_export import export_analysis_pdf
-from .trend_analysis import TrendAnalysisService
+from .pdf_export import export_analysis_pdf_file
+from .trend_analysis import TREND_CATEGORIES, TrendAnalysisService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,41 +55,85 @@ class AnalysisDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'analysis'
     
     def get_queryset(self):
-        # User kann nur eigene Analysen sehen
-        return Analysis.objects.filter(user=self.request.user)
+        # User kann nur eigene Analysen sehen (inkl. Subscription/Profil im selben Join)
+        return AnalysisDetailAssembler.queryset(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        analysis = self.object
-        
-        # Subscription Status holen
-        subscription, _ = Subscription.objects.get_or_create(user=self.request.user)
-        context['subscription'] = subscription
-        context['is_premium'] = subscription.is_premium
-        
-        if analysis.is_unlocked:
-            # Hole Category Scores (optimiert mit prefetch)
-            context['category_scores'] = analysis.category_scores.all()
-            # Hole Top Red Flags (Business Logic im Model)
-            context['top_red_flags'] = analysis.get_top_red_flags(limit=10)
-            
-            # Compare with Average
-            context['comparison'] = StatisticsService.compare_with_average(analysis)
-            
-            # PREMIUM FEATURES: Analytics & Insights
-            if subscription.is_premium:
-                # Generiere Premium Insights
-                premium_insights = AnalyticsService.get_user_premium_insights(analysis)
-                context['premium_insights'] = premium_insights
-                context['show_premium_features'] = True
-            else:
-                context['show_premium_features'] = False
-                context['show_premium_paywall'] = True
-        
-        context['user_credits'] = self.request.user.credits
+        # Fester, kleiner Query-Umfang; Ergebnis-Block gecacht
+        context.update(AnalysisDetailAssembler.build(self.request, self.object))
         return context
 
 
+def fragment_response(request, etag, render):
+    """
+    HTMX-Fragment mit eigenen Cache-Headern (privat, max-age, ETag).
+    Kennt der Browser den Stand (If-None-Match), wird nicht gerendert: 304.
+    """
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render())
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=Config.FRAGMENT_MAX_AGE_SECONDS)
+    return response
+
+
+class ComparisonFragmentView(LoginRequiredMixin, View):
+    """
+    HTMX-Fragment: Vergleich mit dem Durchschnitt.
+    Wird von der Detailseite nach dem Laden angefragt (hx-trigger="load").
+    """
+    
+    def get(self, request, pk):
+        analysis = get_object_or_404(Analysis, pk=pk, user=request.user, is_unlocked=True)
+        return fragment_response(
+            request,
+            AnalysisDetailAssembler.fragment_etag(analysis),
+            lambda: AnalysisDetailAssembler.render_comparison(analysis),
+        )
+
+
+class PremiumInsightsFragmentView(LoginRequiredMixin, View):
+    """
+    HTMX-Fragment: Premium Insights (Percentile + geteilte Tabellen).
+    Ohne Premium leer, damit der Platzhalter verschwindet.
+    """
+    
+    def get(self, request, pk):
+        analysis = get_object_or_404(
+            AnalysisDetailAssembler.queryset(request.user), pk=pk, is_unlocked=True
+        )
+        if not AnalysisDetailAssembler.get_subscription(analysis).is_premium:
+            response = HttpResponse('')
+            add_never_cache_headers(response)  # nach einem Upgrade sofort sichtbar
+            return response
+        return fragment_response(
+            request,
+            AnalysisDetailAssembler.fragment_etag(analysis, AnalyticsService.get_user_segment(analysis.user)),
+            lambda: AnalysisDetailAssembler.render_premium_insights(analysis),
+        )
+
+
+class SharedStatsFragmentView(LoginRequiredMixin, View):
+    """
+    HTMX-Fragment: globale Tabellen (Altersgruppen, Länder) für Premium User.
+    Für alle User gleich gerendert und gecacht (pro Statistik-Version).
+    """
+    
+    def get(self, request, name):
+        if name not in SHARED_FRAGMENTS:
+            raise Http404
+        subscription = Subscription.objects.filter(user=request.user).first()
+        if subscription is None or not subscription.is_premium:
+            return HttpResponse(status=403)
+        return fragment_response(
+            request,
+            AnalysisDetailAssembler.fragment_etag(),
+            lambda: AnalysisDetailAssembler.render_shared(name),
+        )
+
+
 class UnlockAnalysisView(LoginRequiredMixin, View):
     """
     HTMX-Endpoint für Analyse-Unlock.
@@ -103,18 +150,14 @@ class UnlockAnalysisView(LoginRequiredMixin, View):
         # Business Logic im Model (Fat Model Pattern)
         success = analysis.unlock()
         
-        if success:
-            messages.success(request, f'Analyse erfolgreich entsperrt! Verbleibende Credits: {request.user.credits}')
+        # Bereits entsperrt (z.B. Double-Submit): Inhalt zeigen, kein Credit verbraucht
+        if success or analysis.is_unlocked:
+            if success:
+                messages.success(request, f'Analyse erfolgreich entsperrt! Verbleibende Credits: {analysis.user.credits}')
             
             # HTMX: Returniere updated Analysis-Detail Fragment
             if request.htmx:
-                context = {
-                    'analysis': analysis,
-                    'category_scores': analysis.category_scores.all(),
-                    'top_red_flags': analysis.get_top_red_flags(limit=10),
-                    'user_credits': request.user.credits,
-                }
-                return render(request, 'analyses/partials/unlocked_content.html', context)
+                return HttpResponse(AnalysisDetailAssembler.render_unlocked(request, analysis))
         else:
             messages.error(request, 'Nicht genug Credits! Bitte kaufe Credits.')
             
@@ -148,25 +191,34 @@ class DeleteAnalysisView(LoginRequiredMixin, View):
 
 class GenerateShareImageView(LoginRequiredMixin, View):
     """
-    Generiert und liefert Share-Grafik für eine Analyse.
+    Liefert die Share-Grafik einer Analyse (inhaltsadressiert gecacht).
     Format: 'story' für Instagram Story (1080x1920), 'post' für Standard (1200x630)
+    
+    Die URL trägt den Inhalts-Hash (?v=<hash>); ohne bzw. mit veraltetem Hash
+    wird auf die aktuelle Variante umgeleitet. Damit ist die Antwort immutable
+    cachebar, und wiederholte Downloads machen keine Pillow-Arbeit.
     """
     
     def get(self, request, pk, format='post'):
         analysis = get_object_or_404(Analysis, pk=pk, user=request.user, is_unlocked=True)
+        if format not in ShareImageGenerator.FORMATS:
+            format = 'post'
         
-        # Generiere Grafik basierend auf Format
-        if format == 'story':
-            filepath = ShareImageGenerator.generate_instagram_story(analysis)
-        else:
-            filepath = ShareImageGenerator.generate_standard_post(analysis)
+        digest = ShareImageGenerator.content_hash(format, analysis)
+        if request.GET.get('v') != digest:
+            return redirect(f'{request.path}?v={digest}')
         
-        # Liefere Datei als Download
-        return FileResponse(
-            open(filepath, 'rb'),
-            as_attachment=True,
-            filename=f'redflag_analysis_{analysis.id}_{format}.png'
-        )
+        etag = quote_etag(digest)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # Gerendert nur, wenn die Datei zum Hash noch fehlt
+            filepath, _ = ShareImageGenerator.get_image(analysis, format, digest)
+            response = file_response(
+                request, filepath, f'redflag_analysis_{analysis.id}_{format}.png', 'image/png'
+            )
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=ShareImageGenerator.CACHE_MAX_AGE, immutable=True)
+        return response
 
 
 class ExportAnalysisPDFView(LoginRequiredMixin, View):
@@ -187,11 +239,13 @@ class ExportAnalysisPDFView(LoginRequiredMixin, View):
         try:
             logger.info(f"PDF export requested for analysis {pk} by user {request.user.id}")
             
-            # Generiere PDF
-            response = export_analysis_pdf(analysis)
+            # PDF aus dem Datei-Cache (generiert nur bei geändertem Stand)
+            filepath = export_analysis_pdf_file(analysis)
             
             logger.info(f"PDF export successful for analysis {pk}")
-            return response
+            return file_response(
+                request, filepath, f'redflag_analysis_{analysis.id}.pdf', 'application/pdf'
+            )
             
         except Exception as e:
             logger.error(f"PDF export failed for analysis {pk}: {str(e)}")
@@ -212,12 +266,11 @@ class LoadMoreRedFlagsView(LoginRequiredMixin, View):
         offset = int(request.GET.get('offset', 10))
         limit = 10
         
-        # Hole Red Flags mit Offset + Limit
-        all_flags = analysis.get_top_red_flags(limit=offset + limit)
-        flags = all_flags[offset:offset + limit]
+        # Seite als Slice der vorberechneten Impact-Liste
+        flags = analysis.get_top_red_flags(limit=limit, offset=offset)
         
         # Prüfe ob weitere Flags vorhanden
-        has_more = len(all_flags) > offset + limit
+        has_more = analysis.count_red_flags() > offset + limit
         next_offset = offset + limit
         
         context = {
@@ -245,21 +298,27 @@ class TrendsView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Hole Trend-Daten
-        trend_data = TrendAnalysisService.get_user_score_trend(self.request.user, days=90)
-        trend_stats = TrendAnalysisService.get_trend_statistics(self.request.user)
-        comparison = TrendAnalysisService.compare_with_previous_analysis(self.object)
-        
-        context['trend_data'] = trend_data
-        context['trend_stats'] = trend_stats
-        context['comparison'] = comparison
+        # Statistik + Vergleich mit vorheriger Analyse in einer Query
+        summary = TrendAnalysisService.get_trend_summary(self.request.user.pk, self.object)
+        context['trend_stats'] = summary['statistics']
+        context['comparison'] = summary['comparison']
         
-        # Category Trends
+        # Gesamt- und Category-Verlauf in einer Query, auf gleiche Daten ausgerichtet
+        trend_series = TrendAnalysisService.get_trend_series(self.request.user)
+        context['trend_series'] = trend_series
+        context['trend_data'] = [
+            {'date': day, 'score': score}
+            for day, score in zip(trend_series['dates'], trend_series['series']['total'])
+        ]
         context['category_trends'] = {
-            'TRUST': TrendAnalysisService.get_category_trends(self.request.user, 'TRUST'),
-            'BEHAVIOR': TrendAnalysisService.get_category_trends(self.request.user, 'BEHAVIOR'),
-            'VALUES': TrendAnalysisService.get_category_trends(self.request.user, 'VALUES'),
-            'DYNAMICS': TrendAnalysisService.get_category_trends(self.request.user, 'DYNAMICS'),
+            category: [
+                {'date': day, 'score': score, 'analysis_id': analysis_id}
+                for day, score, analysis_id in zip(
+                    trend_series['dates'], trend_series['series'][category], trend_series['analysis_ids']
+                )
+                if score is not None
+            ]
+            for category in TREND_CATEGORIES
         }
         
         return context
@@ -0,0 +1,145 @@
+"""
+Aktivitäts-Bitmaps für Retention
+Pro Tag ein Bitset der aktiven User-IDs (Analyse erstellt, Session gestartet,
+Login) und eines der neu registrierten User-IDs. Bit i = User mit id i.
+
+Retention für Kohorte D und Offset k = popcount(signups[D] & active[D+k]) -
+statt eines Self-Joins pro Kohorte und Offset. Python-ints dienen als
+Bitsets (&, |, int.bit_count()).
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import User
+from analyses.models import Analysis
+
+from .models import DailyActivity, UserLogin, UserSession
+
+
+Bitmaps = Dict[date, Tuple[int, int]]
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def to_bitset(ids) -> int:
+    """User-IDs → Bitset (über bytearray, schneller als 1 << id pro ID)."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for user_id in ids:
+        bits[user_id >> 3] |= 1 << (user_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitset_bytes(bitset: int) -> bytes:
+    """Bitset → Bytes für DailyActivity (little-endian, ohne führende Nullbytes)."""
+    return bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+
+
+class ActivityStore:
+    """
+    Service für die Aktivitäts-Bitmaps.
+    Fat Service Pattern: Aufbau aus den Quelltabellen, Speichern, Retention.
+    """
+
+    @staticmethod
+    def collect(start: date, end: date) -> Bitmaps:
+        """
+        Baut die Bitmaps für start bis end (inklusive) aus den Quelltabellen:
+        je eine DISTINCT (Tag, User)-Query für Analysen, Sessions, Logins, Signups.
+        Returns: {Tag: (active, signups)}
+        """
+        range_start, range_end = _day_start(start), _day_start(end + timedelta(days=1))
+        active = defaultdict(set)
+        signups = defaultdict(set)
+
+        sources = (
+            (Analysis.objects.filter(user__isnull=False), 'created_at', 'user_id', active),
+            (UserSession.objects.filter(user__isnull=False), 'started_at', 'user_id', active),
+            (UserLogin.objects.all(), 'logged_in_at', 'user_id', active),
+            (User.objects.all(), 'created_at', 'id', signups),
+        )
+        for queryset, field, user_field, target in sources:
+            pairs = queryset.filter(**{f'{field}__gte': range_start, f'{field}__lt': range_end}).annotate(
+                day=TruncDate(field)
+            ).values_list('day', user_field).distinct().order_by()
+            for day, user_id in pairs:
+                target[day].add(user_id)
+
+        return {
+            start + timedelta(days=offset): (
+                to_bitset(active.get(start + timedelta(days=offset), ())),
+                to_bitset(signups.get(start + timedelta(days=offset), ())),
+            )
+            for offset in range((end - start).days + 1)
+        }
+
+    @staticmethod
+    def save(bitmaps: Bitmaps) -> int:
+        """Idempotenter Upsert pro Tag."""
+        DailyActivity.objects.bulk_create(
+            [
+                DailyActivity(
+                    date=day,
+                    active=bitset_bytes(active),
+                    signups=bitset_bytes(signups),
+                    active_count=active.bit_count(),
+                    signup_count=signups.bit_count(),
+                )
+                for day, (active, signups) in bitmaps.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['active', 'signups', 'active_count', 'signup_count'],
+        )
+        return len(bitmaps)
+
+    @classmethod
+    def rebuild(cls, start: date, end: date) -> Bitmaps:
+        bitmaps = cls.collect(start, end)
+        cls.save(bitmaps)
+        return bitmaps
+
+    @staticmethod
+    def load(start: date, end: date) -> Bitmaps:
+        """Gespeicherte Bitmaps mit einer Query (fehlende Tage = leer)."""
+        return {
+            day: (int.from_bytes(active, 'little'), int.from_bytes(signups, 'little'))
+            for day, active, signups in DailyActivity.objects.filter(
+                date__gte=start, date__lte=end
+            ).values_list('date', 'active', 'signups').order_by()
+        }
+
+    @classmethod
+    def retention_matrix(cls, last_cohort: date, cohorts: int = 90, offsets: int = 30) -> List[dict]:
+        """
+        Retention-Matrix: eine Zeile pro Kohorte (neueste zuerst),
+        Spalten = Tag 1..offsets. Zukünftige Tage = None.
+        Returns: [{'cohort': date, 'size': int, 'cells': [float | None, ...]}, ...]
+        """
+        first_cohort = last_cohort - timedelta(days=cohorts - 1)
+        bitmaps = cls.load(first_cohort, last_cohort + timedelta(days=offsets))
+        today = timezone.localdate()
+
+        rows = []
+        for index in range(cohorts):
+            cohort_day = last_cohort - timedelta(days=index)
+            cohort = bitmaps.get(cohort_day, (0, 0))[1]
+            size = cohort.bit_count()
+            cells = []
+            for offset in range(1, offsets + 1):
+                day = cohort_day + timedelta(days=offset)
+                if day > today or not size:
+                    cells.append(None)
+                else:
+                    active = bitmaps.get(day, (0, 0))[0]
+                    cells.append((cohort & active).bit_count() * 100 / size)
+            rows.append({'cohort': cohort_day, 'size': size, 'cells': cells})
+        return rows
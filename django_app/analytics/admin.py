@@ -2,11 +2,16 @@
 Analytics Admin Interface
 KPI Dashboard und Settings-Management
 """
+from datetime import timedelta
+
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Sum, Avg
 from django.urls import path
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .activity import ActivityStore
 from .models import AnalyticsSettings, DailyMetrics, UserSession
 
 
@@ -119,6 +124,36 @@ class DailyMetricsAdmin(admin.ModelAdmin):
         """Metrics nicht löschbar."""
         return False
     
+    def get_urls(self):
+        urls = [
+            path(
+                'retention-matrix/',
+                self.admin_site.admin_view(self.retention_matrix_view),
+                name='analytics_dailymetrics_retention_matrix',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def retention_matrix_view(self, request):
+        """Retention-Matrix: 90 Kohorten × Tag 1-30 aus den Aktivitäts-Bitmaps."""
+        last_cohort = parse_date(request.GET.get('until', '')) or timezone.localdate() - timedelta(days=1)
+        rows = ActivityStore.retention_matrix(last_cohort, cohorts=90, offsets=30)
+        for row in rows:
+            # (Wert, Deckkraft der Zellfarbe)
+            row['cells'] = [
+                None if value is None else (value, round(0.1 + 0.9 * value / 100, 2))
+                for value in row['cells']
+            ]
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Retention-Matrix',
+            'opts': self.model._meta,
+            'until': last_cohort,
+            'offsets': range(1, 31),
+            'rows': rows,
+        }
+        return render(request, 'admin/analytics/retention_matrix.html', context)
+    
     def changelist_view(self, request, extra_context=None):
         """Erweitere Changelist mit Aggregaten."""
         response = super().changelist_view(request, extra_context)
@@ -5,3 +5,7 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
     verbose_name = 'Analytics & Metrics'
+
+    def ready(self):
+        # Importiere Signals für Login-Ereignisse
+        import analytics.signals
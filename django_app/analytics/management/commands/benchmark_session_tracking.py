@@ -0,0 +1,111 @@
+"""
+Management Command: Benchmark Session Tracking
+Vergleicht ein UPDATE/INSERT pro Request (direktes Schreiben) mit der
+gepufferten SessionTrackingMiddleware: Queries und Zeit pro Request.
+Flushes laufen dabei im messenden Thread (ohne Flush-Thread), damit ihre
+Queries und ihre Zeit vollständig mitzählen.
+Legt Sessions mit dem Präfix "bench-" an und löscht sie danach wieder.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils import timezone
+
+from analytics.models import UserSession
+from analytics.tracking import SessionTracker, SessionTrackingMiddleware
+from redflag_project.config import Config
+
+
+class _Session:
+    def __init__(self, session_key):
+        self.session_key = session_key
+
+
+class _Anonymous:
+    pk = None
+    is_authenticated = False
+
+
+def _write_directly(session_key):
+    """Naive Variante: ein Schreibzugriff pro Request."""
+    updated = UserSession.objects.filter(session_id=session_key, ended_at__isnull=True).update(
+        pages_visited=F('pages_visited') + 1, last_seen_at=timezone.now()
+    )
+    if not updated:
+        UserSession.objects.create(session_id=session_key, pages_visited=1, last_seen_at=timezone.now())
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Session-Tracking direkt vs. gepuffert (Queries und ms pro Request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Anzahl simulierter Requests')
+        parser.add_argument('--sessions', type=int, default=300, help='Anzahl verschiedener Sessions')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        keys = [rng.choice(range(options['sessions'])) for _ in range(options['requests'])]
+        factory = RequestFactory()
+
+        def page_response(request):
+            return HttpResponse('<html></html>', content_type='text/html')
+
+        def build(prefix):
+            requests = []
+            for key in keys:
+                request = factory.get('/')
+                request.session = _Session(f'bench-{prefix}-{key}')
+                request.user = _Anonymous()
+                requests.append(request)
+            return requests
+
+        def measure(run):
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            return elapsed * 1e6 / len(keys), len(queries)
+
+        SessionTracker.flush()
+        try:
+            direct = build('direct')
+            direct_us, direct_queries = measure(
+                lambda: [_write_directly(request.session.session_key) for request in direct]
+            )
+
+            middleware = SessionTrackingMiddleware(page_response)
+            buffered = build('buffered')
+
+            def run_buffered():
+                for request in buffered:
+                    middleware(request)
+                SessionTracker.flush()
+
+            flush_thread, Config.SESSION_TRACKING_FLUSH_THREAD = Config.SESSION_TRACKING_FLUSH_THREAD, False
+            try:
+                buffered_us, buffered_queries = measure(run_buffered)
+            finally:
+                Config.SESSION_TRACKING_FLUSH_THREAD = flush_thread
+
+            plain = build('plain')
+            plain_us, _ = measure(lambda: [page_response(request) for request in plain])
+        finally:
+            UserSession.objects.filter(session_id__startswith='bench-').delete()
+
+        self.stdout.write(f'📊 {len(keys)} Requests, {options["sessions"]} Sessions ({connection.vendor})\n')
+        self.stdout.write(f'{"Variante":<28}{"Queries":>9}{"µs/Request":>13}')
+        self.stdout.write('-' * 50)
+        self.stdout.write(f'{"Ohne Tracking":<28}{0:>9}{plain_us:>13.1f}')
+        self.stdout.write(f'{"Direkt (UPDATE/INSERT)":<28}{direct_queries:>9}{direct_us:>13.1f}')
+        self.stdout.write(f'{"Gepuffert (inkl. Flushes)":<28}{buffered_queries:>9}{buffered_us:>13.1f}')
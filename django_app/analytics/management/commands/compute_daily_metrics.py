@@ -0,0 +1,114 @@
+"""
+Management Command: Compute Daily Metrics
+Berechnet DailyMetrics für einen Tag (Standard: gestern) oder einen Zeitraum.
+Idempotent: vorhandene Tage werden überschrieben (Upsert auf date).
+
+Backfill: der Zeitraum wird in Abschnitte (--chunk-days) geteilt, die mit
+--workers parallel in eigenen Prozessen berechnet werden.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analytics.metrics import DailyMetricsService
+
+
+def _compute_chunk(start, end):
+    return start, end, DailyMetricsService.compute_and_save(start, end)
+
+
+def _compute_chunk_in_worker(start, end):
+    """Worker-Einstieg: Connection nach jedem Abschnitt schließen (kein Leak im Pool)."""
+    try:
+        return _compute_chunk(start, end)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Berechnet die täglichen KPI-Metriken (DailyMetrics)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Einzelner Tag (YYYY-MM-DD, Standard: gestern)'
+        )
+        parser.add_argument(
+            '--start',
+            type=str,
+            help='Backfill ab diesem Tag (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--end',
+            type=str,
+            help='Backfill bis einschließlich diesem Tag (Standard: gestern)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Anzahl paralleler Prozesse für den Backfill'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Tage pro Abschnitt (Arbeitseinheit eines Workers)'
+        )
+
+    def _parse(self, value, option):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{option} erwartet ein Datum im Format YYYY-MM-DD')
+        return day
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if options['date']:
+            if options['start'] or options['end']:
+                raise CommandError('--date nicht zusammen mit --start/--end verwenden')
+            start = end = self._parse(options['date'], '--date')
+        else:
+            end = self._parse(options['end'], '--end') if options['end'] else yesterday
+            start = self._parse(options['start'], '--start') if options['start'] else end
+
+        if start > end:
+            raise CommandError('--start liegt nach --end')
+        if options['workers'] < 1 or options['chunk_days'] < 1:
+            raise CommandError('--workers und --chunk-days müssen mindestens 1 sein')
+
+        chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=options['chunk_days'] - 1))
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(f'📊 {start} bis {end}: {len(chunks)} Abschnitte, {options["workers"]} Worker')
+
+        total = 0
+        if options['workers'] == 1 or len(chunks) == 1:
+            results = (_compute_chunk(*chunk) for chunk in chunks)
+            for chunk_start, chunk_end, days in results:
+                total += days
+                self.stdout.write(f'  ✓ {chunk_start} bis {chunk_end}: {days} Tage')
+        else:
+            # Fork erbt keine offene Connection: jeder Worker verbindet sich neu
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+            ) as pool:
+                futures = [pool.submit(_compute_chunk_in_worker, *chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    chunk_start, chunk_end, days = future.result()
+                    total += days
+                    self.stdout.write(f'  ✓ {chunk_start} bis {chunk_end}: {days} Tage')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully computed daily metrics for {total} days'))
@@ -0,0 +1,26 @@
+"""
+Management Command: End Idle Sessions
+Beendet offene UserSessions ohne Aktivität seit SESSION_IDLE_TIMEOUT_SECONDS
+(ended_at = letzte Aktivität, duration_seconds berechnet).
+Läuft alle 5 Minuten in run_scheduled_jobs.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.tracking import SessionTracker
+
+
+class Command(BaseCommand):
+    help = 'Beendet inaktive Sessions (Session-Tracking)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-seconds',
+            type=int,
+            help='Inaktivität bis Session-Ende (Standard: SESSION_IDLE_TIMEOUT_SECONDS)'
+        )
+
+    def handle(self, *args, **options):
+        if options['idle_seconds'] is not None and options['idle_seconds'] < 0:
+            raise CommandError('--idle-seconds darf nicht negativ sein')
+        ended = SessionTracker.end_idle_sessions(options['idle_seconds'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully ended {ended} idle sessions'))
@@ -0,0 +1,57 @@
+"""
+Management Command: Run Scheduled Jobs
+Einfacher Scheduler für die periodischen Commands, ohne System-Cron:
+läuft als eigener Prozess (docker-compose Service "scheduler", bei Railway
+neben gunicorn) und startet jeden Job in seinem Intervall.
+
+Fehler eines Jobs werden geloggt, die anderen laufen weiter.
+"""
+import logging
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+# (Command, Intervall in Sekunden)
+JOBS = (
+    ('process_weight_updates', 60),
+    ('end_idle_sessions', 5 * 60),
+    ('cleanup_share_images', 24 * 60 * 60),
+    ('compute_daily_metrics', 24 * 60 * 60),
+)
+
+
+class Command(BaseCommand):
+    help = 'Führt die periodischen Jobs (Gewichte, Sessions, Share-Grafiken, KPIs) im Intervall aus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Jeden Job einmal ausführen und beenden (z.B. für einen externen Cron)'
+        )
+
+    def handle(self, *args, **options):
+        next_run = {name: 0.0 for name, _ in JOBS}
+        while True:
+            now = time.monotonic()
+            for name, interval in JOBS:
+                if next_run[name] <= now:
+                    self.run_job(name)
+                    next_run[name] = now + interval
+            if options['once']:
+                return
+            time.sleep(max(1.0, min(next_run.values()) - time.monotonic()))
+
+    def run_job(self, name):
+        close_old_connections()
+        try:
+            call_command(name, stdout=self.stdout)
+        except Exception:
+            logger.exception('Scheduled job %s failed', name)
+        finally:
+            close_old_connections()
@@ -0,0 +1,189 @@
+"""
+Berechnung der DailyMetrics
+Ein Tag oder ein ganzer Zeitraum wird mit wenigen mengenbasierten Queries
+berechnet (eine gruppierte Query pro Quelltabelle für den gesamten Zeitraum),
+nicht mit Queries pro Tag. DAU, Rolling MAU und Retention kommen aus den
+Aktivitäts-Bitmaps pro Tag (ActivityStore): Popcount von OR/AND.
+
+Aktivität = Analyse erstellt, Session gestartet (user_sessions) oder Login.
+Umsatz = abgeschlossene Credit-Käufe (Subscriptions haben keinen Betrag).
+Premium = aktuell aktive Premium-Subscriptions mit started_at/expires_at
+(es gibt keine Subscription-Historie).
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import User
+from analyses.models import Analysis
+from referrals.models import ReferralReward
+from subscriptions.models import CreditPurchase, Subscription, SubscriptionTier
+
+from .activity import ActivityStore, Bitmaps, to_bitset
+from .models import DailyMetrics, UserSession
+
+
+MAU_WINDOW_DAYS = 30
+
+RETENTION_DAYS = (1, 7, 30)
+
+METRIC_FIELDS = [
+    'new_signups', 'dau', 'mau', 'signup_conversion_rate',
+    'total_analyses_created', 'avg_analyses_per_user', 'avg_session_duration_seconds',
+    'retention_day1', 'retention_day7', 'retention_day30',
+    'new_premium_users', 'total_premium_users', 'free_to_premium_conversion_rate',
+    'revenue_eur', 'arpu', 'referral_codes_used', 'referral_conversion_rate',
+]
+
+
+def _day_start(day: date) -> datetime:
+    """Tagesbeginn in der lokalen Zeitzone (TIME_ZONE)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _percent(part, whole) -> Decimal:
+    """Prozent, begrenzt auf 100 (z.B. Signups ohne getrackte Session)."""
+    if not whole:
+        return Decimal('0')
+    return min(Decimal('100'), round(Decimal(part) * 100 / Decimal(whole), 2))
+
+
+def _ratio(part, whole) -> Decimal:
+    if not whole:
+        return Decimal('0')
+    return round(Decimal(part) / Decimal(whole), 2)
+
+
+class DailyMetricsService:
+    """
+    Service für die KPI-Berechnung.
+    Fat Service Pattern: Queries und Formeln hier, Command nur für Ablauf.
+    """
+
+    @staticmethod
+    def days(start: date, end: date) -> List[date]:
+        """Alle Tage von start bis end (inklusive)."""
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    @staticmethod
+    def _per_day(queryset, field: str, start: datetime, end: datetime, **aggregates) -> Dict[date, dict]:
+        """Eine gruppierte Query: Aggregate pro lokalem Kalendertag."""
+        rows = queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end}).annotate(
+            day=TruncDate(field)
+        ).values('day').annotate(**aggregates).order_by()
+        return {row.pop('day'): row for row in rows}
+
+    @staticmethod
+    def lookback_start(start: date) -> date:
+        """Erster Tag mit benötigter Aktivität (Vorlauf für MAU und Retention-Kohorten)."""
+        return start - timedelta(days=max(MAU_WINDOW_DAYS, max(RETENTION_DAYS)))
+
+    @classmethod
+    def compute_range(cls, start: date, end: date, bitmaps: Optional[Bitmaps] = None) -> List[dict]:
+        """
+        Berechnet die Metriken für alle Tage von start bis end.
+        bitmaps: Aktivitäts-Bitmaps ab lookback_start(start) (sonst neu gesammelt)
+        Returns: [{'date': date, <METRIC_FIELDS>...}, ...]
+        """
+        days = cls.days(start, end)
+        range_start, range_end = _day_start(start), _day_start(end + timedelta(days=1))
+        if bitmaps is None:
+            bitmaps = ActivityStore.collect(cls.lookback_start(start), end)
+        empty = (0, 0)
+        users_before = User.objects.filter(created_at__lt=range_start).count()
+
+        analyses = cls._per_day(
+            Analysis.objects, 'created_at', range_start, range_end,
+            count=Count('id'), authors=Count('user', distinct=True),
+        )
+        sessions = cls._per_day(
+            UserSession.objects, 'started_at', range_start, range_end,
+            visitors=Count('session_id', distinct=True), avg_duration=Avg('duration_seconds'),
+        )
+        revenue = cls._per_day(
+            CreditPurchase.objects.filter(payment_status='completed'), 'purchased_at', range_start, range_end,
+            total=Sum('amount_paid'),
+        )
+        referrals = defaultdict(list)
+        for day, user_id in ReferralReward.objects.filter(
+            reward_type='signup_bonus', created_at__gte=range_start, created_at__lt=range_end
+        ).annotate(day=TruncDate('created_at')).values_list('day', 'used_by_id').order_by():
+            referrals[day].append(user_id)
+
+        # Premium-Intervalle [started_at, expires_at) einmal laden, pro Tag zählen
+        premium = list(Subscription.objects.filter(
+            tier=SubscriptionTier.PREMIUM, is_active=True, started_at__lt=range_end
+        ).values_list('started_at', 'expires_at'))
+        new_premium = Counter(
+            timezone.localdate(started_at) for started_at, _ in premium if started_at >= range_start
+        )
+
+        results = []
+        total_users = users_before
+        for day in days:
+            # Rolling MAU: OR der Bitmaps der letzten 30 Tage
+            window = 0
+            for offset in range(MAU_WINDOW_DAYS):
+                window |= bitmaps.get(day - timedelta(days=offset), empty)[0]
+
+            day_end = _day_start(day + timedelta(days=1))
+            active, signups = bitmaps.get(day, empty)
+            new_signups = signups.bit_count()
+            total_users += new_signups
+            dau = active.bit_count()
+            day_analyses = analyses.get(day, {})
+            day_sessions = sessions.get(day, {})
+            day_revenue = revenue.get(day, {}).get('total') or Decimal('0')
+            total_premium = sum(
+                1 for started_at, expires_at in premium
+                if started_at < day_end and (expires_at is None or expires_at >= day_end)
+            )
+
+            metrics = {
+                'date': day,
+                'new_signups': new_signups,
+                'dau': dau,
+                'mau': window.bit_count(),
+                'signup_conversion_rate': _percent(new_signups, day_sessions.get('visitors')),
+                'total_analyses_created': day_analyses.get('count', 0),
+                'avg_analyses_per_user': _ratio(day_analyses.get('count', 0), day_analyses.get('authors')),
+                'avg_session_duration_seconds': int(day_sessions.get('avg_duration') or 0),
+                'new_premium_users': new_premium.get(day, 0),
+                'total_premium_users': total_premium,
+                'free_to_premium_conversion_rate': _percent(total_premium, total_users),
+                'revenue_eur': day_revenue,
+                'arpu': _ratio(day_revenue, dau),
+                'referral_codes_used': len(referrals.get(day, ())),
+                'referral_conversion_rate': _percent(
+                    (to_bitset(referrals.get(day, ())) & signups).bit_count(), new_signups
+                ),
+            }
+            # Retention: Anteil der Kohorte von vor N Tagen, die heute aktiv ist
+            for n in RETENTION_DAYS:
+                cohort = bitmaps.get(day - timedelta(days=n), empty)[1]
+                metrics[f'retention_day{n}'] = _percent((cohort & active).bit_count(), cohort.bit_count())
+            results.append(metrics)
+        return results
+
+    @staticmethod
+    def save(rows: List[dict]) -> int:
+        """Idempotenter Upsert (ON CONFLICT (date) DO UPDATE)."""
+        DailyMetrics.objects.bulk_create(
+            [DailyMetrics(**row) for row in rows],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=METRIC_FIELDS,
+        )
+        return len(rows)
+
+    @classmethod
+    def compute_and_save(cls, start: date, end: date) -> int:
+        """Metriken und Aktivitäts-Bitmaps (für die Retention-Matrix) speichern."""
+        bitmaps = ActivityStore.collect(cls.lookback_start(start), end)
+        ActivityStore.save({day: bitmaps[day] for day in cls.days(start, end)})
+        return cls.save(cls.compute_range(start, end, bitmaps))
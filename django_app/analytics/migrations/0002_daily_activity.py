@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('active', models.BinaryField(help_text='Bitset der aktiven User-IDs (little-endian)')),
+                ('signups', models.BinaryField(help_text='Bitset der an diesem Tag registrierten User-IDs')),
+                ('active_count', models.IntegerField(default=0)),
+                ('signup_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_activity',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:07
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_daily_activity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='started_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='usersession',
+            index=models.Index(condition=models.Q(('ended_at__isnull', True)), fields=['last_seen_at'], name='user_sessions_open_seen_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usersession',
+            constraint=models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('session_id',), name='user_sessions_open_session_uniq'),
+        ),
+    ]
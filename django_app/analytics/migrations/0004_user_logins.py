@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_from_last_login(apps, schema_editor):
+    """Bestand: der letzte Login jedes Users ist das einzige bekannte Ereignis."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserLogin = apps.get_model('analytics', 'UserLogin')
+    UserLogin.objects.bulk_create(
+        (
+            UserLogin(user_id=user_id, logged_in_at=last_login)
+            for user_id, last_login in User.objects.filter(last_login__isnull=False).values_list('id', 'last_login').iterator()
+        ),
+        batch_size=5000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_session_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLogin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('logged_in_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='logins', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_logins',
+                'ordering': ['-logged_in_at'],
+            },
+        ),
+        migrations.RunPython(seed_from_last_login, migrations.RunPython.noop),
+    ]
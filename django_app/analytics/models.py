@@ -5,6 +5,7 @@ Tracking-Integration und KPI-Metriken
 from django.db import models
 from django.core.validators import RegexValidator
 from django.conf import settings
+from django.utils import timezone
 
 
 class AnalyticsSettings(models.Model):
@@ -177,6 +178,7 @@ class UserSession(models.Model):
     """
     Session-Tracking für Engagement-Metriken.
     Leichtgewichtig: nur essenzielle Daten.
+    Geschrieben gepuffert von SessionTrackingMiddleware (analytics/tracking.py).
     """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -186,7 +188,8 @@ class UserSession(models.Model):
         blank=True
     )
     session_id = models.CharField(max_length=100, db_index=True)
-    started_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     duration_seconds = models.IntegerField(null=True, blank=True)
     
@@ -200,12 +203,68 @@ class UserSession(models.Model):
         indexes = [
             models.Index(fields=['user', '-started_at']),
             models.Index(fields=['session_id']),
+            # Sweep nach inaktiven offenen Sessions
+            models.Index(
+                fields=['last_seen_at'],
+                condition=models.Q(ended_at__isnull=True),
+                name='user_sessions_open_seen_idx',
+            ),
+        ]
+        constraints = [
+            # Höchstens eine offene Session pro Session-Key (parallele Flushes)
+            models.UniqueConstraint(
+                fields=['session_id'],
+                condition=models.Q(ended_at__isnull=True),
+                name='user_sessions_open_session_uniq',
+            ),
         ]
     
     def end_session(self):
         """Beende Session und berechne Duration."""
-        from django.utils import timezone
         if not self.ended_at:
             self.ended_at = timezone.now()
             self.duration_seconds = int((self.ended_at - self.started_at).total_seconds())
             self.save(update_fields=['ended_at', 'duration_seconds'])
+
+
+class UserLogin(models.Model):
+    """
+    Login-Ereignis als Aktivitätsquelle für DAU/MAU/Retention.
+    User.last_login hält nur den letzten Login; ein Eintrag pro Login macht
+    die Aktivität vergangener Tage bei Neuberechnung stabil.
+    Geschrieben vom user_logged_in-Signal (analytics/signals.py).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='logins'
+    )
+    logged_in_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        db_table = 'user_logins'
+        ordering = ['-logged_in_at']
+    
+    def __str__(self):
+        return f"Login {self.user_id} @ {self.logged_in_at}"
+
+
+class DailyActivity(models.Model):
+    """
+    Aktivitäts-Bitmaps pro Tag für Retention-Kohorten.
+    Bit i gesetzt = User mit id i war aktiv (active) bzw. hat sich
+    registriert (signups). Retention = Popcount einer Schnittmenge.
+    Gepflegt von ActivityStore (analytics/activity.py).
+    """
+    date = models.DateField(unique=True)
+    active = models.BinaryField(help_text="Bitset der aktiven User-IDs (little-endian)")
+    signups = models.BinaryField(help_text="Bitset der an diesem Tag registrierten User-IDs")
+    active_count = models.IntegerField(default=0)
+    signup_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'daily_activity'
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Activity {self.date}: {self.active_count} aktiv, {self.signup_count} neu"
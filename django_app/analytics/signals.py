@@ -0,0 +1,13 @@
+"""
+Signals für Login-Ereignisse (Aktivitätsquelle der Retention-Bitmaps)
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .models import UserLogin
+
+
+@receiver(user_logged_in)
+def record_login(sender, request, user, **kwargs):
+    """Ein Eintrag pro Login (User.last_login wird beim nächsten Login überschrieben)."""
+    UserLogin.objects.create(user=user)
@@ -0,0 +1,345 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from analyses.models import Analysis
+from redflag_project.config import Config
+from referrals.models import ReferralCode, ReferralReward
+from subscriptions.models import CreditPurchase, Subscription, SubscriptionTier
+from .activity import ActivityStore
+from .metrics import DailyMetricsService
+from .models import DailyActivity, DailyMetrics, UserLogin, UserSession
+from .tracking import SessionTracker, SessionTrackingMiddleware
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+def strip_ids(rows):
+    """DailyMetrics-Zeilen ohne id/created_at (vergleichbar über Neuberechnungen)."""
+    return [{k: v for k, v in row.items() if k not in ('id', 'created_at')} for row in rows]
+
+
+class ComputeDailyMetricsTests(TestCase):
+    """DailyMetrics: mengenbasiert berechnet = Tag-für-Tag nachgezählt, idempotent."""
+
+    def setUp(self):
+        self.rng = random.Random(23)
+        self.start = date(2026, 3, 1)
+        self.end = date(2026, 4, 15)
+        first_day = self.start - timedelta(days=35)
+        self.activity = {}  # Tag → aktive User-IDs
+        self.signups = {}
+
+        User = get_user_model()
+        code = ReferralCode.objects.create(code='METRICS1')
+        for i in range(40):
+            joined = first_day + timedelta(days=self.rng.randrange((self.end - first_day).days + 1))
+            user = User.objects.create_user(username=f'm{i}', email=f'm{i}@example.com', password='x')
+            User.objects.filter(pk=user.pk).update(created_at=at(joined, 9))
+            self.signups.setdefault(joined, set()).add(user.pk)
+            if i % 4 == 0:
+                reward = ReferralReward.objects.create(
+                    referral_code=code, used_by=user, credits_earned=1, reward_type='signup_bonus'
+                )
+                ReferralReward.objects.filter(pk=reward.pk).update(created_at=at(joined, 10))
+
+            for n in range(self.rng.randint(1, 6)):
+                day = joined + timedelta(days=self.rng.randrange(40))
+                if self.rng.random() < 0.5:
+                    analysis = Analysis.objects.create(user=user, responses=[], score_total=Decimal('2.00'))
+                    Analysis.objects.filter(pk=analysis.pk).update(created_at=at(day, 15))
+                else:
+                    session = UserSession.objects.create(
+                        user=user, session_id=f's{i}-{n}', duration_seconds=self.rng.randint(10, 600)
+                    )
+                    UserSession.objects.filter(pk=session.pk).update(started_at=at(day, 23))
+                self.activity.setdefault(day, set()).add(user.pk)
+
+            if i % 5 == 0:
+                Subscription.objects.create(
+                    user=user, tier=SubscriptionTier.PREMIUM, is_active=True,
+                    started_at=at(joined + timedelta(days=3)),
+                    expires_at=at(joined + timedelta(days=20)) if i % 10 == 0 else None,
+                )
+            if i % 3 == 0:
+                purchase = CreditPurchase.objects.create(
+                    user=user, amount_paid=Decimal('4.99'), payment_status='completed'
+                )
+                CreditPurchase.objects.filter(pk=purchase.pk).update(purchased_at=at(joined, 11))
+
+    def test_range_matches_day_by_day_counts(self):
+        rows = {row['date']: row for row in DailyMetricsService.compute_range(self.start, self.end)}
+        self.assertEqual(len(rows), (self.end - self.start).days + 1)
+
+        for day, row in rows.items():
+            mau_users = set()
+            for offset in range(30):
+                mau_users |= self.activity.get(day - timedelta(days=offset), set())
+            self.assertEqual(row['dau'], len(self.activity.get(day, ())), day)
+            self.assertEqual(row['mau'], len(mau_users), day)
+            self.assertEqual(row['new_signups'], len(self.signups.get(day, ())), day)
+
+            cohort = self.signups.get(day - timedelta(days=7), set())
+            expected = round(Decimal(len(cohort & self.activity.get(day, set()))) * 100 / len(cohort), 2) if cohort else 0
+            self.assertEqual(row['retention_day7'], expected, day)
+
+        self.assertEqual(
+            sum(row['revenue_eur'] for row in rows.values()),
+            Decimal('4.99') * CreditPurchase.objects.filter(
+                purchased_at__gte=at(self.start, 0), purchased_at__lt=at(self.end + timedelta(days=1), 0)
+            ).count(),
+        )
+
+    def test_command_is_idempotent_across_chunkings(self):
+        call_command(
+            'compute_daily_metrics', start=str(self.start), end=str(self.end), chunk_days=7, stdout=StringIO()
+        )
+        first = list(DailyMetrics.objects.order_by('date').values())
+        call_command('compute_daily_metrics', date='2026-03-10', stdout=StringIO())
+        call_command('compute_daily_metrics', start=str(self.start), end=str(self.end), stdout=StringIO())
+        second = list(DailyMetrics.objects.order_by('date').values())
+
+        self.assertEqual(len(first), (self.end - self.start).days + 1)
+        self.assertEqual(strip_ids(first), strip_ids(second))
+
+    def test_retention_matrix_matches_set_intersections(self):
+        DailyMetricsService.compute_and_save(self.start - timedelta(days=35), self.end)
+        self.assertEqual(
+            DailyActivity.objects.get(date=self.start).active_count, len(self.activity.get(self.start, ()))
+        )
+
+        with self.assertNumQueries(1):
+            rows = ActivityStore.retention_matrix(self.end, cohorts=50, offsets=30)
+        self.assertEqual(len(rows), 50)
+        for row in rows:
+            cohort = self.signups.get(row['cohort'], set())
+            self.assertEqual(row['size'], len(cohort))
+            for offset, value in enumerate(row['cells'], start=1):
+                day = row['cohort'] + timedelta(days=offset)
+                if not cohort or day > self.end:
+                    continue
+                expected = len(cohort & self.activity.get(day, set())) * 100 / len(cohort)
+                self.assertAlmostEqual(value, expected, msg=f"{row['cohort']} +{offset}")
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_admin_retention_matrix_view(self):
+        DailyMetricsService.compute_and_save(self.start, self.end)
+        admin_user = get_user_model().objects.create_superuser(
+            username='admin', email='admin@example.com', password='x'
+        )
+        self.client.force_login(admin_user)
+        response = self.client.get(
+            reverse('admin:analytics_dailymetrics_retention_matrix'), {'until': str(self.end)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['rows']), 90)
+        self.assertContains(response, 'Retention-Matrix')
+
+
+class LoginActivityTests(TestCase):
+    """Logins zählen als Aktivität des Login-Tags, auch nach späteren Logins."""
+
+    def test_earlier_login_day_survives_later_login(self):
+        user = get_user_model().objects.create_user(username='login', email='login@example.com', password='x')
+        day = date(2026, 3, 10)
+        self.client.force_login(user)
+        UserLogin.objects.filter(user=user).update(logged_in_at=at(day))
+        first = ActivityStore.collect(day, day)[day][0]
+
+        self.client.logout()
+        self.client.force_login(user)  # späterer Login überschreibt last_login
+
+        self.assertEqual(UserLogin.objects.filter(user=user).count(), 2)
+        self.assertEqual(ActivityStore.collect(day, day)[day][0], first)
+        self.assertEqual(first, 1 << user.pk)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Worker-Prozesse brauchen eine gemeinsame Datenbank')
+class ComputeDailyMetricsWorkersTests(TransactionTestCase):
+    """--workers: geforkte Prozesse schreiben dieselben Zeilen wie ein einzelner Prozess."""
+
+    serialized_rollback = True  # Fragen aus der Daten-Migration wiederherstellen
+
+    def test_forked_workers_match_single_process(self):
+        start = date(2026, 3, 1)
+        User = get_user_model()
+        for i in range(12):
+            user = User.objects.create_user(username=f'w{i}', email=f'w{i}@example.com', password='x')
+            User.objects.filter(pk=user.pk).update(created_at=at(start + timedelta(days=i)))
+            for offset in (0, 1, 7):
+                analysis = Analysis.objects.create(user=user, responses=[], score_total=Decimal('2.00'))
+                Analysis.objects.filter(pk=analysis.pk).update(created_at=at(start + timedelta(days=i + offset)))
+
+        options = {'start': '2026-03-01', 'end': '2026-03-31', 'chunk_days': 5, 'stdout': StringIO()}
+        call_command('compute_daily_metrics', workers=3, **options)
+        forked = strip_ids(DailyMetrics.objects.order_by('date').values())
+        DailyMetrics.objects.all().delete()
+        DailyActivity.objects.all().delete()
+        call_command('compute_daily_metrics', workers=1, **options)
+
+        self.assertEqual(len(forked), 31)
+        self.assertEqual(forked, strip_ids(DailyMetrics.objects.order_by('date').values()))
+        self.assertGreater(sum(row['dau'] for row in forked), 0)
+
+
+@mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_SECONDS', 3600)
+@mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_EVENTS', 1000)
+class SessionTrackingTests(TestCase):
+    """Write-Behind: gepuffert erfassen, gesammelt schreiben, inaktive Sessions beenden."""
+
+    def setUp(self):
+        SessionTracker._buffer = {}
+        SessionTracker.dropped = 0
+        self.addCleanup(setattr, SessionTracker, '_buffer', {})
+        self.user = get_user_model().objects.create_user(username='tracked', email='t@example.com', password='x')
+
+    def request(self, session_key, method='get', htmx=False):
+        request = getattr(RequestFactory(), method)('/')
+        request.session = mock.Mock(session_key=session_key)
+        request.user = self.user
+        request.htmx = htmx
+        return request
+
+    def test_middleware_buffers_and_flush_batches_writes(self):
+        page = SessionTrackingMiddleware(lambda request: HttpResponse('<html></html>'))
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                page(self.request('a'))
+            page(self.request('a', htmx=True))  # Fragment: kein Seitenaufruf
+            page(self.request('b'))
+
+        def create_analysis(request):
+            SessionTracker.count_analysis(request)
+            return HttpResponse(status=302)
+        SessionTrackingMiddleware(create_analysis)(self.request('b', method='post'))
+
+        # SELECT offene + SELECT User + INSERT + 1 UPDATE pro Kombination (a: 3/0, b: 1/1)
+        with self.assertNumQueries(7):  # inkl. SAVEPOINT/RELEASE
+            self.assertEqual(SessionTracker.flush(), 2)
+        sessions = {s.session_id: s for s in UserSession.objects.all()}
+        self.assertEqual((sessions['a'].pages_visited, sessions['a'].analyses_created), (3, 0))
+        self.assertEqual((sessions['b'].pages_visited, sessions['b'].analyses_created), (1, 1))
+        self.assertEqual(sessions['a'].user, self.user)
+
+        page(self.request('a'))
+        SessionTracker.flush()
+        self.assertEqual(UserSession.objects.get(session_id='a').pages_visited, 4)
+        self.assertEqual(UserSession.objects.count(), 2)
+
+    @mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_THREAD', True)
+    def test_flush_thread_writes_without_further_requests(self):
+        flushed = threading.Event()
+        # Im Test-Body: Patches der Klasse (FLUSH_SECONDS) würden Methoden-Dekoratoren überschreiben
+        with mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_SECONDS', 0.05), \
+                mock.patch.object(SessionTracker, 'flush', side_effect=flushed.set) as flush:
+            self.addCleanup(SessionTracker.stop_flusher)
+            SessionTracker.record('a', self.user.pk)
+            flush.assert_not_called()  # Request schreibt nicht selbst
+            self.assertTrue(flushed.wait(5))
+            SessionTracker.stop_flusher()
+
+    def test_flush_thread_is_enabled_by_wsgi_entrypoint_only(self):
+        script = (
+            'import django, os, sys\n'
+            'os.environ.setdefault("DJANGO_SETTINGS_MODULE", "redflag_project.settings")\n'
+            'if sys.argv[1] == "wsgi": import redflag_project.wsgi\n'
+            'else: django.setup()\n'
+            'from redflag_project.config import Config\n'
+            'print(Config.SESSION_TRACKING_FLUSH_THREAD)\n'
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'SESSION_TRACKING_FLUSH_THREAD'}
+        for entrypoint, expected in (('wsgi', 'True'), ('manage', 'False')):
+            result = subprocess.run(
+                [sys.executable, '-c', script, entrypoint],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            )
+            self.assertEqual(result.stdout.strip().splitlines()[-1], expected, entrypoint)
+
+    @mock.patch.object(Config, 'SESSION_TRACKING_MAX_SESSIONS', 2)
+    def test_buffer_is_capped_when_flush_fails(self):
+        with mock.patch.object(SessionTracker, '_write', side_effect=DatabaseError), \
+                self.assertLogs('analytics.tracking', 'ERROR'):
+            for key in ('a', 'b', 'c', 'd'):
+                SessionTracker.record(key, self.user.pk)
+
+        buffered = len(SessionTracker._buffer)
+        self.assertLessEqual(buffered, 2)
+        self.assertGreater(SessionTracker.dropped, 0)
+        # Datenbank wieder erreichbar: zurückgestellte Einträge werden geschrieben
+        SessionTracker.flush()
+        self.assertEqual(UserSession.objects.count(), buffered)
+
+    def test_end_idle_sessions(self):
+        now = timezone.now()
+        idle = UserSession.objects.create(
+            session_id='idle', started_at=now - timedelta(hours=2), last_seen_at=now - timedelta(hours=1)
+        )
+        active = UserSession.objects.create(session_id='active', started_at=now - timedelta(hours=2), last_seen_at=now)
+        # Knapp über dem Timeout, aber innerhalb der Karenz (Aktivität evtl. noch gepuffert)
+        grace = UserSession.objects.create(
+            session_id='grace', started_at=now - timedelta(hours=2), last_seen_at=now - timedelta(seconds=1805)
+        )
+
+        with mock.patch.object(Config, 'SESSION_TRACKING_FLUSH_SECONDS', 5):  # Karenz 10 s
+            call_command('end_idle_sessions', idle_seconds=1800, stdout=StringIO())
+
+        idle.refresh_from_db()
+        active.refresh_from_db()
+        grace.refresh_from_db()
+        self.assertEqual(idle.ended_at, idle.last_seen_at)
+        self.assertEqual(idle.duration_seconds, 3600)
+        self.assertIsNone(active.ended_at)
+        self.assertIsNone(grace.ended_at)
+
+        # Neue Aktivität nach dem Ende startet eine neue Session
+        SessionTracker.record('idle', self.user.pk)
+        SessionTracker.flush()
+        self.assertEqual(UserSession.objects.filter(session_id='idle').count(), 2)
+
+
+@mock.patch('analytics.management.commands.run_scheduled_jobs.close_old_connections')
+class RunScheduledJobsTests(TestCase):
+    """Scheduler: jeder periodische Job läuft, ein Fehler stoppt die anderen nicht."""
+
+    def test_once_runs_every_job_despite_failures(self, _close):
+        from analytics.management.commands import run_scheduled_jobs
+
+        ran = []
+
+        def fake_call_command(name, **kwargs):
+            ran.append(name)
+            if name == 'end_idle_sessions':
+                raise DatabaseError('down')
+
+        with mock.patch.object(run_scheduled_jobs, 'call_command', fake_call_command):
+            with self.assertLogs('analytics.management.commands.run_scheduled_jobs', 'ERROR'):
+                call_command('run_scheduled_jobs', once=True, stdout=StringIO())
+        self.assertEqual(ran, [name for name, _ in run_scheduled_jobs.JOBS])
+
+    def test_jobs_run_against_database(self, _close):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        out = StringIO()
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command('run_scheduled_jobs', once=True, stdout=out)
+        self.assertIn('weight updates', out.getvalue())
+        self.assertIn('idle sessions', out.getvalue())
@@ -0,0 +1,312 @@
+"""
+Write-Behind Session-Tracking
+Die Middleware zählt Seitenaufrufe und erstellte Analysen pro Session nur im
+Speicher des Prozesses (ein Dict-Update pro Request). SessionTracker.flush()
+schreibt den Puffer gesammelt:
+
+- neue Sessions: ein bulk_create (ON CONFLICT DO NOTHING)
+- bestehende Sessions: ein UPDATE ... SET pages_visited = pages_visited + n
+  pro Kombination (n Seiten, m Analysen) statt einem save() pro Request
+
+Geschrieben wird von einem Daemon-Thread pro Prozess (gestartet beim ersten
+Event, nach einem Fork neu): alle SESSION_TRACKING_FLUSH_SECONDS, früher bei
+SESSION_TRACKING_FLUSH_EVENTS Events, und beim regulären Beenden des Prozesses.
+Requests schreiben nie selbst. Fällt ein Worker hart aus (SIGKILL,
+Worker-Timeout), gehen die Events seit dem letzten Flush verloren, bei
+erreichbarer Datenbank also höchstens ein Intervall. Ist die Datenbank nicht
+erreichbar, bleibt der Puffer erhalten, begrenzt auf
+SESSION_TRACKING_MAX_SESSIONS Sessions; darüber werden neue Sessions verworfen.
+Den Thread schaltet redflag_project/wsgi.py für gunicorn ein. Ohne Thread
+(SESSION_TRACKING_FLUSH_THREAD=False, Standard für runserver, manage.py und
+Tests) flusht record() selbst, sobald Intervall oder Event-Anzahl erreicht sind.
+
+Inaktive Sessions beendet end_idle_sessions() (manage.py end_idle_sessions);
+Sessions mit Aktivität in den letzten zwei Flush-Intervallen bleiben offen.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import User
+from redflag_project.config import Config
+
+from .models import UserSession
+
+
+logger = logging.getLogger(__name__)
+
+# Max. Session-Keys pro IN-Liste / Batch
+FLUSH_BATCH_SIZE = 1000
+
+
+class _Entry:
+    """Gepufferte Aktivität einer Session seit dem letzten Flush."""
+    __slots__ = ('user_id', 'first_seen', 'last_seen', 'pages', 'analyses')
+
+    def __init__(self, user_id, now):
+        self.user_id = user_id
+        self.first_seen = now
+        self.last_seen = now
+        self.pages = 0
+        self.analyses = 0
+
+
+class SessionTracker:
+    """
+    Prozess-lokaler Puffer für UserSession-Aktivität.
+    Fat Service Pattern: Puffer, Flush und Sweep hier, Middleware nur Erfassung.
+    """
+
+    _lock = threading.Lock()
+    _buffer: Dict[str, _Entry] = {}
+    _events = 0
+    _last_flush = time.monotonic()
+    _database = None  # Datenbank, für die der Puffer erfasst wurde
+    _exit_flush_registered = False
+    _flusher_pid = None  # Prozess, in dem der Flush-Thread läuft
+    _flusher = None
+    _wake = threading.Event()
+    dropped = 0
+
+    @classmethod
+    def record(cls, session_key: str, user_id: Optional[int], pages: int = 1, analyses: int = 0):
+        """Erfasst Aktivität einer Session im Puffer (ohne Thread: flusht bei Bedarf)."""
+        background = Config.SESSION_TRACKING_FLUSH_THREAD
+        if background:
+            cls.start_flusher()
+        elif time.monotonic() - cls._last_flush >= Config.SESSION_TRACKING_FLUSH_SECONDS:
+            # Fälliger Flush vor dem Eintragen: der Puffer umfasst nie mehr als ein Intervall
+            cls.flush()
+
+        now = timezone.now()
+        with cls._lock:
+            if not cls._buffer:
+                cls._database = connection.settings_dict['NAME']
+            entry = cls._buffer.get(session_key)
+            if entry is None:
+                if len(cls._buffer) >= Config.SESSION_TRACKING_MAX_SESSIONS:
+                    cls.dropped += 1
+                    return
+                entry = cls._buffer[session_key] = _Entry(user_id, now)
+            entry.last_seen = now
+            entry.pages += pages
+            entry.analyses += analyses
+            if user_id and not entry.user_id:
+                entry.user_id = user_id
+            cls._events += 1
+            due = (
+                cls._events >= Config.SESSION_TRACKING_FLUSH_EVENTS
+                or len(cls._buffer) >= Config.SESSION_TRACKING_MAX_SESSIONS
+            )
+        if due:
+            if background:
+                cls._wake.set()
+            else:
+                cls.flush()
+
+    @staticmethod
+    def count_analysis(request):
+        """Markiert eine im Request erstellte Analyse (Middleware bucht sie)."""
+        request.analyses_created = getattr(request, 'analyses_created', 0) + 1
+
+    @classmethod
+    def flush(cls) -> int:
+        """
+        Schreibt den Puffer in die Datenbank.
+        Bei einem Datenbankfehler wandert er zurück in den Puffer (bis zur Obergrenze).
+        Returns: Anzahl geschriebener Sessions
+        """
+        with cls._lock:
+            pending, cls._buffer = cls._buffer, {}
+            database = cls._database
+            cls._events = 0
+            cls._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        if database != connection.settings_dict['NAME']:
+            # Datenbank gewechselt (z.B. Test-Datenbank beim Prozess-Ende bereits gelöscht)
+            logger.warning('Session-Tracking: %s Sessions für %s verworfen', len(pending), database)
+            return 0
+
+        try:
+            cls._write(pending)
+        except DatabaseError:
+            logger.exception('Session-Tracking: Flush von %s Sessions fehlgeschlagen', len(pending))
+            cls._restore(pending)
+            return 0
+        return len(pending)
+
+    @classmethod
+    def _restore(cls, pending: Dict[str, _Entry]):
+        """Nicht geschriebene Einträge zurück in den Puffer (neuere Events gewinnen)."""
+        with cls._lock:
+            for session_key, entry in pending.items():
+                current = cls._buffer.get(session_key)
+                if current is None:
+                    if len(cls._buffer) >= Config.SESSION_TRACKING_MAX_SESSIONS:
+                        cls.dropped += 1
+                        continue
+                    cls._buffer[session_key] = entry
+                else:
+                    current.first_seen = entry.first_seen
+                    current.pages += entry.pages
+                    current.analyses += entry.analyses
+                    current.user_id = current.user_id or entry.user_id
+
+    @staticmethod
+    @transaction.atomic
+    def _write(pending: Dict[str, _Entry]):
+        keys = list(pending)
+        open_keys = set()
+        for start in range(0, len(keys), FLUSH_BATCH_SIZE):
+            # Gesperrt: ein paralleles end_idle_sessions wartet bis nach dem UPDATE
+            open_keys.update(UserSession.objects.select_for_update().filter(
+                session_id__in=keys[start:start + FLUSH_BATCH_SIZE], ended_at__isnull=True
+            ).values_list('session_id', flat=True))
+
+        # Neue Sessions anlegen (Zähler 0, gebucht wird unten für alle gleich).
+        # Bereits gelöschte User nicht referenzieren (FK-Fehler beim Commit).
+        new_keys = [key for key in keys if key not in open_keys]
+        user_ids = {pending[key].user_id for key in new_keys if pending[key].user_id}
+        existing_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True)) if user_ids else set()
+        UserSession.objects.bulk_create(
+            [
+                UserSession(
+                    session_id=key,
+                    user_id=pending[key].user_id if pending[key].user_id in existing_users else None,
+                    started_at=pending[key].first_seen,
+                    last_seen_at=pending[key].first_seen,
+                )
+                for key in new_keys
+            ],
+            ignore_conflicts=True,  # Parallel von einem anderen Worker angelegt
+            batch_size=FLUSH_BATCH_SIZE,
+        )
+
+        # Ein UPDATE pro (Seiten, Analysen)-Kombination
+        groups = defaultdict(list)
+        for key, entry in pending.items():
+            groups[(entry.pages, entry.analyses)].append(key)
+        for (pages, analyses), group_keys in groups.items():
+            last_seen = max(pending[key].last_seen for key in group_keys)
+            for start in range(0, len(group_keys), FLUSH_BATCH_SIZE):
+                UserSession.objects.filter(
+                    session_id__in=group_keys[start:start + FLUSH_BATCH_SIZE], ended_at__isnull=True
+                ).update(
+                    pages_visited=F('pages_visited') + pages,
+                    analyses_created=F('analyses_created') + analyses,
+                    last_seen_at=last_seen,
+                )
+
+    @classmethod
+    def start_flusher(cls):
+        """Startet den Flush-Thread dieses Prozesses (einmal, nach Fork erneut)."""
+        pid = os.getpid()
+        if cls._flusher_pid == pid:
+            return
+        with cls._lock:
+            if cls._flusher_pid == pid:
+                return
+            cls._flusher_pid = pid
+            cls._wake = threading.Event()
+            cls._flusher = threading.Thread(
+                target=cls._run_flusher, args=(pid,), name='session-tracking-flush', daemon=True
+            )
+            cls._flusher.start()
+        cls.register_exit_flush()
+
+    @classmethod
+    def stop_flusher(cls, timeout: float = 10):
+        """Beendet den Flush-Thread nach einem letzten Flush."""
+        thread, cls._flusher, cls._flusher_pid = cls._flusher, None, None
+        cls._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    @classmethod
+    def _run_flusher(cls, pid):
+        """Schreibt alle FLUSH_SECONDS (bei vollem Puffer sofort) mit eigener Connection."""
+        while cls._flusher_pid == pid:
+            cls._wake.wait(Config.SESSION_TRACKING_FLUSH_SECONDS)
+            cls._wake.clear()
+            try:
+                cls.flush()
+            except Exception:
+                logger.exception('Session-Tracking: Flush-Thread fehlgeschlagen')
+            finally:
+                close_old_connections()
+
+    @classmethod
+    def register_exit_flush(cls):
+        """Puffer beim regulären Beenden des Prozesses schreiben (Worker-Neustart)."""
+        if not cls._exit_flush_registered:
+            cls._exit_flush_registered = True
+            atexit.register(cls.flush)
+
+    @staticmethod
+    def end_idle_sessions(idle_seconds: Optional[int] = None) -> int:
+        """
+        Beendet offene Sessions ohne Aktivität seit idle_seconds
+        (ended_at = letzte Aktivität). Default: Config.SESSION_IDLE_TIMEOUT_SECONDS
+        Zwei Flush-Intervalle Karenz: noch gepufferte Aktivität eines anderen
+        Prozesses ist jünger und landet sonst in einer beendeten Session.
+        Returns: Anzahl beendeter Sessions
+        """
+        if idle_seconds is None:
+            idle_seconds = Config.SESSION_IDLE_TIMEOUT_SECONDS
+        grace = 2 * Config.SESSION_TRACKING_FLUSH_SECONDS
+        cutoff = timezone.now() - timedelta(seconds=idle_seconds + grace)
+
+        idle = UserSession.objects.filter(ended_at__isnull=True).filter(
+            Q(last_seen_at__lt=cutoff) | Q(last_seen_at__isnull=True, started_at__lt=cutoff)
+        ).only('id', 'started_at', 'last_seen_at').order_by()
+
+        ended = []
+        for session in idle.iterator(chunk_size=FLUSH_BATCH_SIZE):
+            session.ended_at = session.last_seen_at or session.started_at
+            session.duration_seconds = max(0, int((session.ended_at - session.started_at).total_seconds()))
+            ended.append(session)
+        UserSession.objects.bulk_update(ended, ['ended_at', 'duration_seconds'], batch_size=FLUSH_BATCH_SIZE)
+        return len(ended)
+
+
+class SessionTrackingMiddleware:
+    """
+    Zählt Seitenaufrufe (GET, HTML, kein HTMX-Fragment) und im Request
+    erstellte Analysen pro Session. Schreibt nicht selbst - siehe SessionTracker.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        SessionTracker.register_exit_flush()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        session_key = session.session_key if session is not None else None
+        if session_key and response.status_code < 400:
+            is_page = (
+                request.method == 'GET'
+                and not getattr(request, 'htmx', False)
+                and response.get('Content-Type', '').startswith('text/html')
+            )
+            analyses = getattr(request, 'analyses_created', 0)
+            if is_page or analyses:
+                user = getattr(request, 'user', None)
+                SessionTracker.record(
+                    session_key,
+                    user.pk if user is not None and user.is_authenticated else None,
+                    pages=int(is_page),
+                    analyses=analyses,
+                )
+        return response
@@ -0,0 +1,131 @@
+"""
+Versionierter Fragen-Katalog pro Prozess
+Alle Questions werden einmal geladen und als gemeinsamer Snapshot gehalten.
+Die Versionsnummer liegt im Cache: jede Änderung an Question (Zeile oder
+calculated_weight) erhöht sie, Worker laden lazy neu sobald sie eine neuere
+Version sehen. Im eingeschwungenen Zustand: null Question-Queries.
+Kann der Cache nichts speichern (DummyCache), wird die Version aus dem
+DB-Stand abgeleitet - eine kleine Query statt eines nie neu geladenen Katalogs.
+"""
+import hashlib
+import json
+import threading
+import time
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question
+
+
+CATALOG_VERSION_KEY = 'questionnaire:catalog_version'
+
+
+def weights_version(weights) -> int:
+    """
+    Version nur der Gewichte (key -> calculated_weight der aktiven Fragen).
+    Deterministischer Hash statt Zähler: Text-Änderungen lassen sie unverändert,
+    und jeder Prozess berechnet ohne Cache dieselbe Zahl (passt in BigInteger).
+    """
+    payload = json.dumps(sorted(weights.items())).encode()
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), 'big') >> 1
+
+
+class QuestionCatalog:
+    """
+    Snapshot aller Questions. Die Question-Instanzen teilen sich alle Requests
+    des Prozesses: nur lesen, nie ändern oder speichern.
+
+    - questions: aktive Fragen, sortiert nach id (Fragebogen-Reihenfolge)
+    - by_key / weights / short_texts: nur aktive Fragen
+    - weights_version: Hash der Gewichte (Version der Red-Flag-Impacts)
+    - categories / keys_by_id / ordinals / keys_by_ordinal: alle Fragen
+      (auch inaktive, für alte Analysen)
+    """
+
+    def __init__(self, version: int, questions):
+        active = [q for q in questions if q.is_active]
+
+        self.version = version
+        self.questions = tuple(active)
+        self.by_key = MappingProxyType({q.key: q for q in active})
+        self.weights = MappingProxyType({q.key: q.calculated_weight for q in active})
+        self.weights_version = weights_version(self.weights)
+        self.short_texts = MappingProxyType({q.key: q.text_short_de or q.text_de for q in active})
+        self.categories = MappingProxyType({q.key: q.category for q in questions})
+        self.keys_by_id = MappingProxyType({q.id: q.key for q in questions})
+        self.ordinals = MappingProxyType({q.key: q.ordinal for q in questions if q.ordinal is not None})
+        keys_by_ordinal = [None] * (max(self.ordinals.values(), default=-1) + 1)
+        for key, ordinal in self.ordinals.items():
+            keys_by_ordinal[ordinal] = key
+        self.keys_by_ordinal = tuple(keys_by_ordinal)
+
+    def __len__(self):
+        return len(self.questions)
+
+    @classmethod
+    def load(cls, version: int) -> 'QuestionCatalog':
+        """Lädt alle Questions mit einer Query."""
+        return cls(version, list(Question.objects.order_by('id')))
+
+
+_lock = threading.Lock()
+_catalog = None
+
+
+def _database_version() -> int:
+    """Version aus dem DB-Stand aller Questions (Fallback ohne speichernden Cache)."""
+    rows = Question.objects.order_by('id').values_list('id', 'updated_at', 'calculated_weight', 'is_active')
+    payload = repr(list(rows)).encode()
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), 'big') >> 1
+
+
+def current_version() -> int:
+    """
+    Aktuelle Katalog-Version aus dem Cache.
+    Fehlt sie (Cache geleert/neu), wird sie mit einem ms-Zeitstempel gesetzt,
+    damit sie nie mit einer bereits geladenen Version kollidiert. Bleibt sie
+    danach leer (DummyCache), gilt die aus der DB abgeleitete Version.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = _database_version()
+    return version
+
+
+def get_catalog() -> QuestionCatalog:
+    """
+    Liefert den Katalog dieses Prozesses, lädt neu wenn die Version veraltet ist.
+    Kostet im Normalfall einen Cache-Lookup und keine DB-Query.
+    """
+    global _catalog
+
+    version = current_version()
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = QuestionCatalog.load(version)
+        return _catalog
+
+
+def _bump_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key fehlt: neuer Zeitstempel ist immer neuer als jede alte Version
+        cache.set(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_catalog():
+    """
+    Markiert den Katalog aller Worker als veraltet.
+    Erst nach dem Commit, damit kein Worker den alten Stand neu lädt.
+    """
+    transaction.on_commit(_bump_version)
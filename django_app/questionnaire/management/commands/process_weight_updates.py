@@ -0,0 +1,26 @@
+"""
+Management Command: Process Weight Updates
+Hintergrund-Durchlauf für die gesammelten Gewichts-Änderungen.
+Läuft jede Minute in run_scheduled_jobs, damit calculated_weight höchstens
+WEIGHTS_MAX_STALENESS_SECONDS hinterherhängt - auch ohne neue Bewertungen.
+"""
+from django.core.management.base import BaseCommand
+from questionnaire.weights import WeightEngine
+
+
+class Command(BaseCommand):
+    help = 'Verarbeitet alle vorgemerkten Gewichts-Änderungen in einem Durchlauf'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--respect-staleness',
+            action='store_true',
+            help='Nur verarbeiten, wenn die älteste Änderung WEIGHTS_MAX_STALENESS_SECONDS überschreitet'
+        )
+
+    def handle(self, *args, **options):
+        max_staleness = None if options['respect_staleness'] else 0
+        processed = WeightEngine.process_pending(max_staleness=max_staleness)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully processed weight updates of {processed} users')
+        )
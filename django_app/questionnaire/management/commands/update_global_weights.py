@@ -2,11 +2,15 @@
 Management Command: Update Global Weights
 Berechnet Z-Score standardisierte globale Gewichte und speichert sie in Question.calculated_weight
 """
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 from django.db.models import Avg
+from questionnaire.catalog import invalidate_catalog
 from questionnaire.models import Question, WeightResponse
 from django.contrib.auth import get_user_model
+import resource
 import statistics
+import time
 
 
 class Command(BaseCommand):
@@ -18,16 +22,26 @@ class Command(BaseCommand):
             action='store_true',
             help='Verwende einfachen Durchschnitt statt Z-Score (nicht empfohlen)'
         )
+        parser.add_argument(
+            '--engine',
+            choices=['python', 'numpy', 'sql'],
+            default='python',
+            help='Z-Score Berechnung: python (Query pro Frage × User), numpy (eine Query, vektorisiert) '
+                 'oder sql (Window Functions in PostgreSQL)'
+        )
 
     def handle(self, *args, **options):
         use_z_score = not options['no_z_score']
         
+        if use_z_score and options['engine'] == 'sql' and connection.vendor != 'postgresql':
+            raise CommandError('--engine=sql benötigt PostgreSQL (Window Functions)')
+        
         self.stdout.write(self.style.SUCCESS('\n' + '='*80))
         self.stdout.write(self.style.SUCCESS('GLOBALE GEWICHTE AKTUALISIEREN'))
         self.stdout.write(self.style.SUCCESS('='*80 + '\n'))
         
         if use_z_score:
-            self.stdout.write('📊 Modus: Z-SCORE STANDARDISIERUNG\n')
+            self.stdout.write(f'📊 Modus: Z-SCORE STANDARDISIERUNG (Engine: {options["engine"]})\n')
         else:
             self.stdout.write('📊 Modus: EINFACHER DURCHSCHNITT\n')
         
@@ -66,6 +80,10 @@ class Command(BaseCommand):
                     self.stdout.write(
                         f'  ✓ {question.key:40} → {question.calculated_weight:.2f}'
                     )
+        elif options['engine'] == 'numpy':
+            updated_count = self._update_with_numpy(questions)
+        elif options['engine'] == 'sql':
+            updated_count = self._update_with_sql()
         else:
             # Z-SCORE STANDARDISIERUNG
             self.stdout.write('Berechne Z-Score standardisierte Gewichte...\n')
@@ -126,6 +144,9 @@ class Command(BaseCommand):
                             f'(Z-Scores: {len(z_scores)} Benutzer)'
                         )
         
+        # Bulk-Updates lösen keine Signals aus: Katalog-Version explizit erhöhen
+        invalidate_catalog()
+        
         self.stdout.write(self.style.SUCCESS(f'\n✓ {updated_count} Gewichte erfolgreich aktualisiert!\n'))
         
         # Zeige Zusammenfassung
@@ -144,3 +165,68 @@ class Command(BaseCommand):
             self.stdout.write(f'Höchstes Gewicht: {max_weight:.2f}')
         
         self.stdout.write(self.style.SUCCESS('\n✓ ABGESCHLOSSEN\n'))
+
+    def _update_with_numpy(self, questions):
+        """
+        Z-Score Standardisierung vektorisiert: eine gestreamte Query zum Lesen,
+        ein bulk_update zum Schreiben. Gibt Laufzeit- und Speicher-Statistik aus.
+        """
+        import numpy as np
+        from questionnaire.weight_matrix import compute_weights, load_ratings
+
+        self.stdout.write('Berechne Z-Score standardisierte Gewichte (NumPy)...\n')
+
+        started = time.perf_counter()
+        user_ids, question_ids, importances = load_ratings()
+        loaded = time.perf_counter()
+
+        results = compute_weights(user_ids, question_ids, importances)
+        computed = time.perf_counter()
+
+        changed = []
+        for question in questions:
+            result = results.get(question.id)
+            if result is None:
+                continue
+            self.stdout.write(
+                f'  ✓ {question.key:40} → {result["weight"]:.2f} '
+                f'(Z-Scores: {result["z_count"]} Benutzer)'
+            )
+            if question.calculated_weight != result['weight']:
+                question.calculated_weight = result['weight']
+                changed.append(question)
+        Question.objects.bulk_update(changed, ['calculated_weight'])
+        written = time.perf_counter()
+
+        users = len(np.unique(user_ids))
+        matrix_mb = users * len(np.unique(question_ids)) * 8 / 1024 / 1024
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        self.stdout.write('\n⏱  Laufzeit')
+        self.stdout.write(f'  Lesen:     {(loaded - started) * 1000:8.1f} ms ({len(importances)} Bewertungen, {users} Benutzer)')
+        self.stdout.write(f'  Rechnen:   {(computed - loaded) * 1000:8.1f} ms')
+        self.stdout.write(f'  Schreiben: {(written - computed) * 1000:8.1f} ms ({len(changed)} geänderte Gewichte)')
+        self.stdout.write('💾 Speicher')
+        self.stdout.write(f'  Matrix:    {matrix_mb:8.1f} MB')
+        self.stdout.write(f'  Peak RSS:  {peak_mb:8.1f} MB')
+
+        return sum(1 for question in questions if question.id in results)
+
+    def _update_with_sql(self):
+        """
+        Z-Score Standardisierung in PostgreSQL: ein Statement (Window Functions)
+        liefert eine Zeile pro Frage, gerundet wird wie in den anderen Engines.
+        """
+        from questionnaire.weight_sql import update_weights_in_database
+
+        self.stdout.write('Berechne Z-Score standardisierte Gewichte (SQL)...\n')
+
+        started = time.perf_counter()
+        rows = update_weights_in_database()
+        finished = time.perf_counter()
+
+        for _, key, weight, z_count in sorted(rows, key=lambda row: row[1]):
+            self.stdout.write(f'  ✓ {key:40} → {weight:.2f} (Z-Scores: {z_count} Benutzer)')
+
+        self.stdout.write(f'\n⏱  Laufzeit: {(finished - started) * 1000:.1f} ms (1 Statement + bulk_update)')
+        return len(rows)
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_alter_user_credits_alter_userbadge_points_and_more'),
+        ('questionnaire', '0005_add_short_text_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionWeightStatistics',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='weight_statistics', serialize=False, to='questionnaire.question')),
+                ('z_sum', models.FloatField(default=0.0)),
+                ('z_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'question_weight_statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserWeightStatistics',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='weight_statistics', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('total_squares', models.IntegerField(default=0)),
+                ('ratings', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'user_weight_statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='WeightStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+                ('total_squares', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Weight Statistics',
+                'verbose_name_plural': 'Weight Statistics',
+                'db_table': 'weight_statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0006_weight_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userweightstatistics',
+            name='dirty_since',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Seit wann Bewertungen auf Neuberechnung warten (null = aktuell)', null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+def assign_ordinals(apps, schema_editor):
+    Question = apps.get_model('questionnaire', 'Question')
+    questions = list(Question.objects.order_by('id'))
+    for ordinal, question in enumerate(questions):
+        question.ordinal = ordinal
+    Question.objects.bulk_update(questions, ['ordinal'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaire', '0007_userweightstatistics_dirty_since'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='ordinal',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text='Stable position in packed analysis responses', null=True, unique=True),
+        ),
+        migrations.RunPython(assign_ordinals, migrations.RunPython.noop),
+    ]
@@ -39,6 +39,14 @@ class Question(models.Model):
     text_en = models.TextField(help_text="English question text")
     text_short_de = models.CharField(max_length=100, blank=True, help_text="Kompakte deutsche Version")
     text_short_en = models.CharField(max_length=100, blank=True, help_text="Short English version")
+    # Stabile Position für gepackte Antworten (Analysis.responses_packed), nie wiederverwendet
+    ordinal = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Stable position in packed analysis responses"
+    )
     
     # Metadaten
     is_active = models.BooleanField(default=True)
@@ -57,6 +65,13 @@ class Question(models.Model):
     def __str__(self):
         return f"{self.key} ({self.category})"
     
+    def save(self, *args, **kwargs):
+        # Neue Fragen hinten anhängen: bestehende Ordinals bleiben stabil
+        if self.ordinal is None:
+            last = Question.objects.aggregate(last=models.Max('ordinal'))['last']
+            self.ordinal = 0 if last is None else last + 1
+        super().save(*args, **kwargs)
+    
     @classmethod
     def get_active_by_category(cls):
         """Business Logic: Gruppiere aktive Fragen nach Kategorie."""
@@ -110,14 +125,111 @@ class WeightResponse(models.Model):
         Business Logic: Hole alle Gewichtungen eines Users.
         Returns: {question_key: importance_value}
         """
-        weights = cls.objects.filter(user=user).select_related('question')
-        return {wr.question.key: wr.importance for wr in weights}
+        from .catalog import get_catalog
+        
+        keys_by_id = get_catalog().keys_by_id
+        weights = cls.objects.filter(user=user).values_list('question_id', 'importance')
+        return {
+            keys_by_id[question_id]: importance
+            for question_id, importance in weights
+            if question_id in keys_by_id
+        }
     
     @classmethod
     def has_completed_importance_questionnaire(cls, user) -> bool:
         """
         Business Logic: Prüfe ob User Importance Questionnaire ausgefüllt hat.
         """
-        active_questions_count = Question.objects.filter(is_active=True).count()
+        from .catalog import get_catalog
+        
+        active_questions_count = len(get_catalog())
         user_weights_count = cls.objects.filter(user=user).count()
         return user_weights_count == active_questions_count
+
+
+class WeightStatistics(models.Model):
+    """
+    Globale laufende Statistik über alle Importance-Bewertungen (Singleton).
+    Liefert Mittelwert und StdDev für die Rücktransformation der Z-Scores.
+    """
+    count = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    total_squares = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'weight_statistics'
+        verbose_name = 'Weight Statistics'
+        verbose_name_plural = 'Weight Statistics'
+    
+    def save(self, *args, **kwargs):
+        """Singleton Pattern: Nur ein Statistik-Objekt erlaubt."""
+        self.pk = 1
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"Weight Statistics (n={self.count})"
+    
+    @classmethod
+    def load(cls):
+        """Lade oder erstelle Statistik."""
+        obj, created = cls.objects.get_or_create(pk=1)
+        return obj
+
+
+class UserWeightStatistics(models.Model):
+    """
+    Laufende Statistik der Bewertungen eines Users (n, Summe, Quadratsumme).
+    ratings hält den Stand, der aktuell in die Fragen-Statistik eingerechnet ist.
+    
+    Kein FK-Constraint: Die Zeile muss das Löschen des Users überleben,
+    bis seine Z-Scores wieder aus der Fragen-Statistik ausgebucht sind.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='weight_statistics'
+    )
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    total_squares = models.IntegerField(default=0)
+    # Format: {"<question_id>": importance, ...}
+    ratings = models.JSONField(default=dict)
+    dirty_since = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Seit wann Bewertungen auf Neuberechnung warten (null = aktuell)"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'user_weight_statistics'
+    
+    def __str__(self):
+        return f"Weight Statistics of user {self.user_id} (n={self.count})"
+
+
+class QuestionWeightStatistics(models.Model):
+    """
+    Summe und Anzahl der Z-Scores pro Frage.
+    calculated_weight = global_mean + (z_sum / z_count) × global_std
+    """
+    question = models.OneToOneField(
+        Question,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='weight_statistics'
+    )
+    z_sum = models.FloatField(default=0.0)
+    z_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'question_weight_statistics'
+    
+    def __str__(self):
+        return f"{self.question_id}: Σz={self.z_sum:.3f} (n={self.z_count})"
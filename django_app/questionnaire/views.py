@@ -8,10 +8,13 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpResponse
 from django.contrib import messages
-from .models import Question, WeightResponse
-from analyses.models import Analysis, CategoryScore
-from analyses.services import ScoreCalculator
+from django.db import transaction
+from .catalog import get_catalog
+from .models import WeightResponse
+from analyses.models import Analysis
+from analyses.services import score_responses
 from accounts.models import User
+from analytics.tracking import SessionTracker
 
 
 class HomeView(TemplateView):
@@ -23,7 +26,7 @@ class HomeView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_questions'] = Question.objects.filter(is_active=True).count()
+        context['total_questions'] = len(get_catalog())
         
         # Social Proof Counter
         from django.utils import timezone
@@ -63,8 +66,8 @@ class QuestionnaireView(LoginRequiredMixin, TemplateView):
         # Hole aktuelle Fragen-Index aus Query-Parameter
         current_index = int(request.GET.get('q', 1))
         
-        # Hole alle aktiven Fragen
-        questions = list(Question.objects.filter(is_active=True).order_by('id'))
+        # Alle aktiven Fragen aus dem Prozess-Katalog (keine Query)
+        questions = get_catalog().questions
         total_questions = len(questions)
         
         # Validiere Index
@@ -141,32 +144,25 @@ class QuestionnaireView(LoginRequiredMixin, TemplateView):
             messages.error(request, 'Bitte beantworte mindestens eine Frage.')
             return redirect('questionnaire:questionnaire')
         
-        # Konvertiere zu Liste-Format für ScoreCalculator
+        # Konvertiere zu Liste-Format für score_responses
         responses = [{'key': key, 'value': value} for key, value in responses_dict.items()]
         
-        # Berechne Scores
-        calculator = ScoreCalculator(responses)
-        score_total = calculator.calculate_total_score()
-        category_scores_dict = calculator.calculate_category_scores()
+        # Berechne alle Scores in einem Durchlauf
+        scores = score_responses(responses)
+        score_total = scores['score_total']
+        category_scores_dict = scores['category_scores']
         
-        # Erstelle Analysis
-        analysis = Analysis.objects.create(
+        # Erstelle Analysis + Category Scores in einer Transaktion
+        analysis = Analysis.create_with_scores(
             user=request.user,
+            responses=responses,
+            score_total=score_total,
+            category_scores=category_scores_dict,
             partner_name=partner_data.get('partner_name'),
             partner_age=partner_data.get('partner_age'),
             partner_country=partner_data.get('partner_country'),
-            responses=responses,
-            score_total=score_total,
-            is_unlocked=False
         )
-        
-        # Erstelle Category Scores
-        for category, score in category_scores_dict.items():
-            CategoryScore.objects.create(
-                analysis=analysis,
-                category=category,
-                score=score
-            )
+        SessionTracker.count_analysis(request)
         
         # Clear Session
         request.session.pop('questionnaire_responses', None)
@@ -229,22 +225,23 @@ class QuestionnaireSubmitView(LoginRequiredMixin, View):
         partner_age = int(partner_age_str) if partner_age_str else None
         partner_country = request.POST.get('partner_country', '').strip() or None
         
-        # Berechne Scores DYNAMISCH mit aktuellen Question.calculated_weight
-        calculator = ScoreCalculator(responses)
-        score_total = calculator.calculate_total_score()
-        category_scores_dict = calculator.calculate_category_scores()
+        # Berechne Scores DYNAMISCH mit aktuellen Question.calculated_weight (ein Durchlauf)
+        scores = score_responses(responses)
+        score_total = scores['score_total']
+        category_scores_dict = scores['category_scores']
         
-        # Erstelle Analysis (Fat Model Pattern)
+        # Erstelle Analysis + Category Scores atomar (Fat Model Pattern)
         # KEIN snapshot_weights mehr - verwendet immer aktuelle calculated_weights
-        analysis = Analysis.objects.create(
+        analysis = Analysis.create_with_scores(
             user=request.user,
+            responses=responses,
+            score_total=score_total,
+            category_scores=category_scores_dict,
             partner_name=partner_name,
             partner_age=partner_age,
             partner_country=partner_country,
-            responses=responses,
-            score_total=score_total,
-            is_unlocked=False  # User muss Credits verwenden
         )
+        SessionTracker.count_analysis(request)
         
         # Session cleanup
         if 'partner_name' in request.session:
@@ -252,14 +249,6 @@ class QuestionnaireSubmitView(LoginRequiredMixin, View):
         if 'partner_age' in request.session:
             del request.session['partner_age']
         
-        # Erstelle Category Scores (Normalisiert in separater Tabelle)
-        for category, score in category_scores_dict.items():
-            CategoryScore.objects.create(
-                analysis=analysis,
-                category=category,
-                score=score
-            )
-        
         messages.success(request, 'Analyse erfolgreich erstellt!')
         
         # HTMX: Redirect zu Results
@@ -282,8 +271,8 @@ class ImportanceQuestionnaireView(LoginRequiredMixin, TemplateView):
         # Hole aktuelle Fragen-Index
         current_index = int(request.GET.get('q', 1))
         
-        # Hole alle aktiven Fragen
-        questions = list(Question.objects.filter(is_active=True).order_by('id'))
+        # Alle aktiven Fragen aus dem Prozess-Katalog (keine Query)
+        questions = get_catalog().questions
         total_questions = len(questions)
         
         # Validiere Index
@@ -355,25 +344,27 @@ class ImportanceQuestionnaireView(LoginRequiredMixin, TemplateView):
             messages.error(request, 'Bitte bewerte mindestens eine Frage.')
             return redirect('questionnaire:importance')
         
-        # Hole alle aktiven Questions
-        questions = {q.key: q for q in Question.objects.filter(is_active=True)}
+        # Alle aktiven Questions aus dem Prozess-Katalog
+        questions = get_catalog().by_key
         
         # Erstelle oder aktualisiere WeightResponses
         created_count = 0
         updated_count = 0
         
-        for question_key, importance in importance_ratings.items():
-            question = questions.get(question_key)
-            if question:
-                weight_response, created = WeightResponse.objects.update_or_create(
-                    user=request.user,
-                    question=question,
-                    defaults={'importance': importance}
-                )
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
+        # Eine Transaktion: Gewichts-Neuberechnung läuft einmal nach dem Commit
+        with transaction.atomic():
+            for question_key, importance in importance_ratings.items():
+                question = questions.get(question_key)
+                if question:
+                    weight_response, created = WeightResponse.objects.update_or_create(
+                        user=request.user,
+                        question=question,
+                        defaults={'importance': importance}
+                    )
+                    if created:
+                        created_count += 1
+                    else:
+                        updated_count += 1
         
         # Clear Session
         request.session.pop('importance_ratings', None)
@@ -406,25 +397,27 @@ class ImportanceQuestionnaireSubmitView(LoginRequiredMixin, View):
             messages.error(request, 'Bitte bewerte mindestens eine Frage.')
             return redirect('questionnaire:importance')
         
-        # Hole alle aktiven Questions
-        questions = {q.key: q for q in Question.objects.filter(is_active=True)}
+        # Alle aktiven Questions aus dem Prozess-Katalog
+        questions = get_catalog().by_key
         
         # Erstelle oder aktualisiere WeightResponses
         created_count = 0
         updated_count = 0
         
-        for rating in importance_ratings:
-            question = questions.get(rating['key'])
-            if question:
-                weight_response, created = WeightResponse.objects.update_or_create(
-                    user=request.user,
-                    question=question,
-                    defaults={'importance': rating['importance']}
-                )
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
+        # Eine Transaktion: Gewichts-Neuberechnung läuft einmal nach dem Commit
+        with transaction.atomic():
+            for rating in importance_ratings:
+                question = questions.get(rating['key'])
+                if question:
+                    weight_response, created = WeightResponse.objects.update_or_create(
+                        user=request.user,
+                        question=question,
+                        defaults={'importance': rating['importance']}
+                    )
+                    if created:
+                        created_count += 1
+                    else:
+                        updated_count += 1
         
         messages.success(
             request, 
@@ -0,0 +1,97 @@
+"""
+Vektorisierte Z-Score Gewichtsberechnung mit NumPy
+Liest alle Bewertungen mit einer gestreamten Query in eine dichte
+User × Fragen Matrix (NaN = keine Bewertung) und rechnet komplett in NumPy.
+
+Regeln identisch zum Python-Pfad:
+- User mit <2 Bewertungen oder StdDev 0 werden übersprungen
+- Fragen ohne Z-Scores behalten ihr bisheriges Gewicht
+- Begrenzung und Rundung über weights.weight_from_z (Python round())
+"""
+from array import array
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .models import WeightResponse
+from .weights import weight_from_z
+
+
+def load_ratings(chunk_size: int = 50000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Streamt alle (user_id, question_id, importance) Tripel in einer Query.
+    Returns: drei gleich lange Arrays
+    """
+    user_ids, question_ids, importances = array('q'), array('q'), array('b')
+    rows = WeightResponse.objects.order_by().values_list('user_id', 'question_id', 'importance')
+    for user_id, question_id, importance in rows.iterator(chunk_size=chunk_size):
+        user_ids.append(user_id)
+        question_ids.append(question_id)
+        importances.append(importance)
+
+    return (
+        np.frombuffer(user_ids, dtype=np.int64),
+        np.frombuffer(question_ids, dtype=np.int64),
+        np.frombuffer(importances, dtype=np.int8),
+    )
+
+
+def _mean_std(counts: np.ndarray, sums: np.ndarray, squares: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mittelwert und Stichproben-StdDev aus n, Summe und Quadratsumme (NaN bei n < 2)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts
+        variance = (counts * squares - sums * sums) / (counts * (counts - 1))
+        return mean, np.sqrt(variance)
+
+
+def compute_weights(user_ids: np.ndarray, question_ids: np.ndarray, importances: np.ndarray) -> Dict[int, dict]:
+    """
+    Berechnet die Z-Score Gewichte aller Fragen.
+
+    Returns:
+        {question_id: {'weight': float, 'z_count': int, 'avg_z_score': float}}
+        nur für Fragen mit mindestens einem Z-Score
+    """
+    if len(importances) == 0:
+        return {}
+
+    unique_users, user_index = np.unique(user_ids, return_inverse=True)
+    unique_questions, question_index = np.unique(question_ids, return_inverse=True)
+    values = importances.astype(np.float64)
+
+    # Dichte Matrix: Zeile = User, Spalte = Frage, NaN = keine Bewertung
+    matrix = np.full((len(unique_users), len(unique_questions)), np.nan)
+    matrix[user_index, question_index] = values
+
+    # Pro User: n, Summe, Quadratsumme (ganzzahlig, daher exakt in float64)
+    counts = np.bincount(user_index, minlength=len(unique_users)).astype(np.float64)
+    sums = np.bincount(user_index, weights=values, minlength=len(unique_users))
+    squares = np.bincount(user_index, weights=values * values, minlength=len(unique_users))
+    user_mean, user_std = _mean_std(counts, sums, squares)
+
+    # User mit <2 Bewertungen oder StdDev 0 überspringen
+    valid = (counts >= 2) & (user_std > 0)
+    z = (matrix[valid] - user_mean[valid, None]) / user_std[valid, None]
+
+    z_count = np.count_nonzero(~np.isnan(z), axis=0)
+    z_sum = np.nansum(z, axis=0)
+
+    # Rücktransformation auf die globale Skala: X = μ + (Z × σ)
+    total = float(values.sum())
+    n = float(len(values))
+    global_mean = total / n
+    if len(values) > 1:
+        _, global_std = _mean_std(np.array([n]), np.array([total]), np.array([float((values * values).sum())]))
+        global_std = float(global_std[0])
+    else:
+        global_std = 1
+
+    results = {}
+    for column in np.flatnonzero(z_count):
+        avg_z_score = float(z_sum[column] / z_count[column])
+        results[int(unique_questions[column])] = {
+            'weight': weight_from_z(avg_z_score, global_mean, global_std),
+            'z_count': int(z_count[column]),
+            'avg_z_score': avg_z_score,
+        }
+    return results
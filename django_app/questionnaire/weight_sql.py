@@ -0,0 +1,105 @@
+"""
+Z-Score Gewichtsberechnung direkt in PostgreSQL
+Ein Statement: Window Functions über weight_responses für Mittelwert/StdDev
+pro User, Z-Score pro Antwort, Durchschnitt pro Frage und globale Skala.
+
+Die Bewertungen verlassen die Datenbank nicht - zurück kommt eine Zeile pro
+Frage. Rücktransformation und Rundung macht weights.weight_from_z wie in den
+anderen Engines: Python round() rundet Gleichstände zur geraden Ziffer,
+ROUND(numeric) in PostgreSQL von null weg (2,125 → 2,12 vs. 2,13).
+"""
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+
+from .models import Question, WeightResponse
+from .weights import weight_from_z
+
+
+# Mittelwert/StdDev aus n, Summe und Quadratsumme (ganzzahlig summiert),
+# damit das Ergebnis dem Python-Pfad (statistics.mean/stdev) entspricht.
+Z_SCORES_SQL = """
+WITH ratings AS (
+    SELECT
+        question_id,
+        importance,
+        COUNT(*) OVER w AS user_count,
+        SUM(importance) OVER w AS user_total,
+        SUM(importance * importance) OVER w AS user_squares
+    FROM {weight_responses}
+    WINDOW w AS (PARTITION BY user_id)
+),
+user_z AS (
+    SELECT
+        question_id,
+        importance,
+        user_total::float8 / user_count AS user_mean,
+        SQRT(
+            (user_count * user_squares - user_total * user_total)::float8
+            / (user_count * (user_count - 1))
+        ) AS user_std
+    FROM ratings
+    WHERE user_count >= 2
+),
+question_z AS (
+    SELECT
+        question_id,
+        AVG((importance - user_mean) / user_std) AS avg_z_score,
+        COUNT(*) AS z_count
+    FROM user_z
+    WHERE user_std > 0
+    GROUP BY question_id
+),
+global_scale AS (
+    SELECT
+        SUM(importance)::float8 / COUNT(*) AS global_mean,
+        CASE WHEN COUNT(*) > 1 THEN SQRT(
+            (COUNT(*) * SUM(importance * importance) - SUM(importance) * SUM(importance))::float8
+            / (COUNT(*) * (COUNT(*) - 1))
+        ) ELSE 1 END AS global_std
+    FROM {weight_responses}
+)
+SELECT z.question_id, z.avg_z_score, z.z_count, g.global_mean, g.global_std
+FROM question_z AS z, global_scale AS g
+"""
+
+
+def weights_from_rows(rows) -> Dict[int, dict]:
+    """
+    Gewichte aus den Zeilen von Z_SCORES_SQL (Rundung wie weight_matrix.compute_weights).
+
+    Returns:
+        {question_id: {'weight': float, 'z_count': int, 'avg_z_score': float}}
+    """
+    return {
+        question_id: {
+            'weight': weight_from_z(avg_z_score, global_mean, global_std),
+            'z_count': z_count,
+            'avg_z_score': avg_z_score,
+        }
+        for question_id, avg_z_score, z_count, global_mean, global_std in rows
+    }
+
+
+@transaction.atomic
+def update_weights_in_database() -> List[Tuple[int, str, float, int]]:
+    """
+    Berechnet alle Gewichte mit einem Statement (nur PostgreSQL) und schreibt
+    die geänderten per bulk_update. Fragen ohne Z-Scores werden nicht angefasst.
+
+    Returns: Liste von (question_id, key, calculated_weight, z_count) aktiver Fragen
+    """
+    sql = Z_SCORES_SQL.format(weight_responses=connection.ops.quote_name(WeightResponse._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        results = weights_from_rows(cursor.fetchall())
+
+    rows, changed = [], []
+    for question in Question.objects.filter(is_active=True, id__in=results):
+        result = results[question.id]
+        rows.append((question.id, question.key, result['weight'], result['z_count']))
+        if question.calculated_weight != result['weight']:
+            question.calculated_weight = result['weight']
+            changed.append(question)
+    Question.objects.bulk_update(changed, ['calculated_weight'])
+    return rows
@@ -0,0 +1,345 @@
+"""
+Inkrementelle Z-Score Gewichts-Engine
+Hält laufende Statistiken (global, pro User, pro Frage) statt bei jeder
+Bewertung alle User × Fragen neu zu berechnen.
+
+Rechenweg identisch zum bisherigen Algorithmus:
+1. Pro User (≥2 Bewertungen, StdDev > 0): z = (X - μ_user) / σ_user
+2. Pro Frage: Durchschnitt der Z-Scores
+3. Rücktransformation: X = μ_global + (Z × σ_global), begrenzt auf 1-5
+"""
+import math
+import threading
+from datetime import timedelta
+from fractions import Fraction
+from typing import Dict, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from redflag_project.config import Config
+
+from .catalog import invalidate_catalog
+from .models import (
+    Question,
+    QuestionWeightStatistics,
+    UserWeightStatistics,
+    WeightResponse,
+    WeightStatistics,
+)
+
+
+def mean_and_std(count: int, total: int, total_squares: int) -> Optional[Tuple[float, float]]:
+    """
+    Mittelwert und Stichproben-StdDev aus n, Summe und Quadratsumme.
+    Exakt gerechnet (Bruch), damit das Ergebnis statistics.mean/stdev entspricht.
+    Returns None bei weniger als 2 Werten.
+    """
+    if count < 2:
+        return None
+    mean = total / count
+    variance = Fraction(count * total_squares - total * total, count * (count - 1))
+    return mean, math.sqrt(variance)
+
+
+def z_scores(ratings: Dict[int, int]) -> Dict[int, float]:
+    """
+    Z-Scores aller Bewertungen eines Users.
+    Leer, wenn der User nicht zählt (<2 Bewertungen oder StdDev 0).
+    """
+    values = ratings.values()
+    stats = mean_and_std(len(ratings), sum(values), sum(v * v for v in values))
+    if stats is None:
+        return {}
+    mean, std = stats
+    if std <= 0:
+        return {}
+    return {
+        question_id: (float(importance) - mean) / std
+        for question_id, importance in ratings.items()
+    }
+
+
+def global_scale(global_stats: WeightStatistics) -> Tuple[float, float]:
+    """Globaler Mittelwert und StdDev aller Bewertungen (σ = 1 bei nur einer Bewertung)."""
+    if global_stats.count > 1:
+        return mean_and_std(global_stats.count, global_stats.total, global_stats.total_squares)
+    return global_stats.total / global_stats.count, 1
+
+
+def weight_from_z(avg_z_score: float, global_mean: float, global_std: float) -> float:
+    """Rücktransformation eines durchschnittlichen Z-Scores auf die 1-5 Skala."""
+    # Rücktransformation: X = μ + (Z × σ)
+    weight = global_mean + (avg_z_score * global_std)
+
+    # Begrenze auf 1-5 Skala
+    weight = max(1.0, min(5.0, weight))
+    return round(weight, 2)
+
+
+class WeightEngine:
+    """
+    Service für inkrementelle Gewichts-Updates.
+    Eine Bewertung ändert global n/Summe/Quadratsumme in O(1) und die
+    Z-Scores genau dieses Users in O(Antworten des Users).
+    
+    Coalescing: Signals markieren User nur als "dirty". Verarbeitet werden sie
+    gesammelt im Hintergrund-Durchlauf (manage.py process_weight_updates, läuft
+    in run_scheduled_jobs jede Minute). Bei Config.WEIGHTS_MAX_STALENESS_SECONDS = 0
+    rechnet der Request nach dem Commit die User seiner eigenen Transaktion.
+    Ist der Rückstand älter als die Staleness (kein Scheduler aktiv), arbeitet
+    jeder Request höchstens WEIGHTS_REQUEST_CATCHUP_USERS der ältesten User ab.
+    """
+
+    _local = threading.local()
+
+    @classmethod
+    def mark_dirty(cls, user_id: int):
+        """
+        Merkt einen User für die Neuberechnung vor (Signal-Handler).
+        Die eigentliche Arbeit läuft einmal pro Transaktion nach dem Commit:
+        der Callback wird nur registriert, wenn er noch nicht aussteht
+        (ein Submit speichert ~65 WeightResponses).
+        """
+        pending = getattr(cls._local, 'pending', None)
+        if pending is None:
+            pending = cls._local.pending = set()
+        pending.add(user_id)
+        # Registriert bis zum Flush - außer ein Rollback hat den Callback verworfen
+        registered = getattr(cls._local, 'registered', False) and any(
+            entry[1] == cls._flush_marked for entry in transaction.get_connection().run_on_commit
+        )
+        if not registered:
+            cls._local.registered = True
+            transaction.on_commit(cls._flush_marked)
+
+    @classmethod
+    def _flush_marked(cls):
+        """on_commit Callback: schreibt die Dirty-Markierungen und verarbeitet begrenzt."""
+        cls._local.registered = False
+        pending = getattr(cls._local, 'pending', None)
+        if not pending:
+            return
+        cls._local.pending = set()
+
+        now = timezone.now()
+        UserWeightStatistics.objects.filter(
+            user_id__in=pending, dirty_since__isnull=True
+        ).update(dirty_since=now)
+        UserWeightStatistics.objects.bulk_create(
+            [UserWeightStatistics(user_id=user_id, dirty_since=now) for user_id in pending],
+            ignore_conflicts=True,
+        )
+
+        if Config.WEIGHTS_MAX_STALENESS_SECONDS == 0:
+            cls.process_users(pending)
+        elif Config.WEIGHTS_REQUEST_CATCHUP_USERS > 0:
+            cls.process_pending(limit=Config.WEIGHTS_REQUEST_CATCHUP_USERS)
+
+    @classmethod
+    def process_pending(cls, max_staleness: Optional[int] = None, limit: Optional[int] = None) -> int:
+        """
+        Verarbeitet alle als dirty markierten User in einem Durchlauf und
+        veröffentlicht die Gewichte einmal.
+        
+        Args:
+            max_staleness: Sekunden, die calculated_weight hinterherhängen darf.
+                0 = sofort verarbeiten. Default: Config.WEIGHTS_MAX_STALENESS_SECONDS
+            limit: höchstens so viele User (die ältesten zuerst), None = alle
+        
+        Returns: Anzahl verarbeiteter User (0 wenn noch innerhalb der Staleness)
+        """
+        if max_staleness is None:
+            max_staleness = Config.WEIGHTS_MAX_STALENESS_SECONDS
+
+        dirty = UserWeightStatistics.objects.filter(dirty_since__isnull=False)
+        oldest = dirty.aggregate(oldest=Min('dirty_since'))['oldest']
+        if oldest is None:
+            return 0
+        if max_staleness > 0 and oldest > timezone.now() - timedelta(seconds=max_staleness):
+            return 0
+
+        user_ids = dirty.order_by('dirty_since', 'user_id').values_list('user_id', flat=True)
+        return cls.process_users(list(user_ids[:limit] if limit else user_ids))
+
+    @classmethod
+    @transaction.atomic
+    def process_users(cls, user_ids) -> int:
+        """Gleicht die genannten User ab und veröffentlicht die Gewichte einmal."""
+        for user_id in user_ids:
+            cls.sync_user(user_id, publish=False)
+        cls.publish_weights()
+        return len(user_ids)
+
+    @classmethod
+    @transaction.atomic
+    def sync_user(cls, user_id: int, publish: bool = True) -> bool:
+        """
+        Gleicht die Statistik eines Users mit seinen aktuellen WeightResponses ab.
+        Idempotent - repariert auch Änderungen ohne Signal (bulk, raw SQL).
+        Returns True wenn sich die Statistik geändert hat.
+        """
+        # Globale Zeile sperren: serialisiert parallele Updates
+        global_stats = WeightStatistics.objects.select_for_update().filter(pk=1).first()
+        if global_stats is None:
+            # Erste Nutzung: Statistik aus dem aktuellen Datenbestand aufbauen
+            cls.rebuild()
+            return True
+
+        user_stats = UserWeightStatistics.objects.select_for_update().filter(user_id=user_id).first()
+        if user_stats is None:
+            user_stats = UserWeightStatistics(user_id=user_id)
+
+        old_ratings = {int(question_id): value for question_id, value in user_stats.ratings.items()}
+        new_ratings = dict(
+            WeightResponse.objects.filter(user_id=user_id).order_by().values_list('question_id', 'importance')
+        )
+
+        if new_ratings == old_ratings:
+            if user_stats.dirty_since is not None:
+                UserWeightStatistics.objects.filter(user_id=user_id).update(dirty_since=None)
+            if not new_ratings and not user_stats._state.adding:
+                user_stats.delete()
+            return False
+
+        # Z-Scores des Users: alte ausbuchen, neue einbuchen
+        deltas = {}
+        for question_id, z in z_scores(old_ratings).items():
+            z_sum, z_count = deltas.get(question_id, (0.0, 0))
+            deltas[question_id] = (z_sum - z, z_count - 1)
+        for question_id, z in z_scores(new_ratings).items():
+            z_sum, z_count = deltas.get(question_id, (0.0, 0))
+            deltas[question_id] = (z_sum + z, z_count + 1)
+        cls._apply_question_deltas(deltas)
+
+        # Globale und User-Statistik in O(1) über die Differenz aktualisieren
+        old_count, old_total, old_squares = user_stats.count, user_stats.total, user_stats.total_squares
+        user_stats.count = len(new_ratings)
+        user_stats.total = sum(new_ratings.values())
+        user_stats.total_squares = sum(v * v for v in new_ratings.values())
+        user_stats.ratings = {str(question_id): value for question_id, value in new_ratings.items()}
+        user_stats.dirty_since = None
+
+        global_stats.count += user_stats.count - old_count
+        global_stats.total += user_stats.total - old_total
+        global_stats.total_squares += user_stats.total_squares - old_squares
+        global_stats.save()
+
+        if new_ratings:
+            user_stats.save(force_insert=user_stats._state.adding)
+        elif not user_stats._state.adding:
+            user_stats.delete()
+
+        if publish:
+            cls.publish_weights(global_stats)
+        return True
+
+    @staticmethod
+    def _apply_question_deltas(deltas):
+        """Addiert Z-Score Deltas auf die Fragen-Statistik (fehlende Zeilen werden angelegt)."""
+        deltas = {question_id: delta for question_id, delta in deltas.items() if delta != (0.0, 0)}
+        if not deltas:
+            return
+
+        existing = {
+            stats.question_id: stats
+            for stats in QuestionWeightStatistics.objects.filter(question_id__in=deltas)
+        }
+        # Nur noch existierende Fragen (gelöschte Fragen werden ignoriert)
+        missing = set(deltas) - set(existing)
+        if missing:
+            for question_id in Question.objects.filter(id__in=missing).values_list('id', flat=True):
+                existing[question_id] = QuestionWeightStatistics(question_id=question_id)
+
+        to_create, to_update = [], []
+        for question_id, stats in existing.items():
+            z_delta, count_delta = deltas[question_id]
+            stats.z_count += count_delta
+            # Ohne Beiträge exakt auf 0 setzen (keine Float-Rundungsreste)
+            stats.z_sum = stats.z_sum + z_delta if stats.z_count > 0 else 0.0
+            if stats._state.adding:
+                to_create.append(stats)
+            else:
+                to_update.append(stats)
+
+        QuestionWeightStatistics.objects.bulk_create(to_create)
+        QuestionWeightStatistics.objects.bulk_update(to_update, ['z_sum', 'z_count'])
+
+    @staticmethod
+    def publish_weights(global_stats: Optional[WeightStatistics] = None) -> int:
+        """
+        Schreibt Question.calculated_weight aus der laufenden Statistik (O(Fragen)).
+        Fragen ohne Z-Scores behalten ihr bisheriges Gewicht.
+        Returns: Anzahl geänderter Fragen
+        """
+        global_stats = global_stats or WeightStatistics.load()
+        if global_stats.count == 0:
+            return 0
+
+        question_stats = {
+            stats.question_id: stats
+            for stats in QuestionWeightStatistics.objects.filter(z_count__gt=0)
+        }
+
+        global_mean, global_std = global_scale(global_stats)
+        changed = []
+        for question in Question.objects.filter(is_active=True, id__in=question_stats):
+            stats = question_stats[question.id]
+            weight = weight_from_z(stats.z_sum / stats.z_count, global_mean, global_std)
+            if weight != question.calculated_weight:
+                question.calculated_weight = weight
+                changed.append(question)
+
+        if changed:
+            Question.objects.bulk_update(changed, ['calculated_weight'])
+            invalidate_catalog()
+        return len(changed)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls) -> int:
+        """
+        Baut die komplette Statistik aus allen WeightResponses neu auf.
+        Eine Query zum Lesen, Bulk-Writes zum Schreiben.
+        Returns: Anzahl geänderter Fragen
+        """
+        ratings_by_user = {}
+        for user_id, question_id, importance in WeightResponse.objects.values_list(
+            'user_id', 'question_id', 'importance'
+        ).order_by().iterator(chunk_size=10000):
+            ratings_by_user.setdefault(user_id, {})[question_id] = importance
+
+        global_stats = WeightStatistics.objects.select_for_update().filter(pk=1).first() or WeightStatistics()
+        global_stats.count = global_stats.total = global_stats.total_squares = 0
+
+        user_rows = []
+        question_sums = {}
+        for user_id, ratings in ratings_by_user.items():
+            values = ratings.values()
+            user_rows.append(UserWeightStatistics(
+                user_id=user_id,
+                count=len(ratings),
+                total=sum(values),
+                total_squares=sum(v * v for v in values),
+                ratings={str(question_id): value for question_id, value in ratings.items()},
+            ))
+            global_stats.count += user_rows[-1].count
+            global_stats.total += user_rows[-1].total
+            global_stats.total_squares += user_rows[-1].total_squares
+
+            for question_id, z in z_scores(ratings).items():
+                z_sum, z_count = question_sums.get(question_id, (0.0, 0))
+                question_sums[question_id] = (z_sum + z, z_count + 1)
+
+        UserWeightStatistics.objects.all().delete()
+        UserWeightStatistics.objects.bulk_create(user_rows, batch_size=1000)
+
+        QuestionWeightStatistics.objects.all().delete()
+        QuestionWeightStatistics.objects.bulk_create([
+            QuestionWeightStatistics(question_id=question_id, z_sum=z_sum, z_count=z_count)
+            for question_id, (z_sum, z_count) in question_sums.items()
+        ])
+
+        global_stats.save()
+        return cls.publish_weights(global_stats)
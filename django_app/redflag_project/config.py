@@ -23,6 +23,44 @@ class Config:
     BADGE_FIRST_ANALYSIS_POINTS = int(os.getenv('BADGE_FIRST_ANALYSIS_POINTS', '50'))
     BADGE_POWER_USER_POINTS = int(os.getenv('BADGE_POWER_USER_POINTS', '100'))
     
+    # Gewichts-Berechnung: Max. Sekunden, die calculated_weight hinterherhängen darf,
+    # eingehalten von "process_weight_updates" (run_scheduled_jobs, jede Minute)
+    # (0 = nach jedem Commit die User dieses Requests sofort neu berechnen)
+    WEIGHTS_MAX_STALENESS_SECONDS = int(os.getenv('WEIGHTS_MAX_STALENESS_SECONDS', '60'))
+    # Fallback ohne Scheduler: User, die ein Request nach dem Commit abarbeitet,
+    # sobald der Rückstand älter als die Staleness ist (0 = nie im Request)
+    WEIGHTS_REQUEST_CATCHUP_USERS = int(os.getenv('WEIGHTS_REQUEST_CATCHUP_USERS', '10'))
+    
+    # Analysen: Antworten kompakt als Bytes speichern (1 Byte pro Frage statt JSON)
+    PACK_ANALYSIS_RESPONSES = os.getenv('PACK_ANALYSIS_RESPONSES', 'False') == 'True'
+    
+    # Analytics: Cache-Dauer der Altersgruppen-Statistik in Sekunden
+    AGE_GROUP_STATS_CACHE_SECONDS = int(os.getenv('AGE_GROUP_STATS_CACHE_SECONDS', '900'))
+    
+    # Analyse-Detailseite: Cache-Dauer des gerenderten Ergebnis-Blocks in Sekunden
+    # (Keys sind versioniert, die Dauer begrenzt nur den Speicher)
+    ANALYSIS_DETAIL_CACHE_SECONDS = int(os.getenv('ANALYSIS_DETAIL_CACHE_SECONDS', '3600'))
+    
+    # Nachgeladene Fragmente der Detailseite (HTMX): max-age im Cache-Control-Header
+    FRAGMENT_MAX_AGE_SECONDS = int(os.getenv('FRAGMENT_MAX_AGE_SECONDS', '300'))
+    
+    # Downloads (Share-Grafiken, PDFs) per X-Accel-Redirect über nginx: interne
+    # Location, z.B. /protected-media/ (leer = Django streamt die Datei selbst)
+    X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX', '')
+    
+    # Trends: max. Punkte pro Chart-Serie (mehr werden per LTTB reduziert, 0 = alle)
+    TREND_MAX_POINTS = int(os.getenv('TREND_MAX_POINTS', '120'))
+    
+    # Session-Tracking: Puffer pro Prozess, geschrieben alle N Sekunden oder N Events
+    SESSION_TRACKING_FLUSH_SECONDS = int(os.getenv('SESSION_TRACKING_FLUSH_SECONDS', '5'))
+    SESSION_TRACKING_FLUSH_EVENTS = int(os.getenv('SESSION_TRACKING_FLUSH_EVENTS', '500'))
+    SESSION_TRACKING_MAX_SESSIONS = int(os.getenv('SESSION_TRACKING_MAX_SESSIONS', '10000'))
+    # Flush per Hintergrund-Thread pro Prozess; Standard aus (Flush im Request),
+    # eingeschaltet von redflag_project/wsgi.py für gunicorn
+    SESSION_TRACKING_FLUSH_THREAD = os.getenv('SESSION_TRACKING_FLUSH_THREAD', 'False') == 'True'
+    # Sessions ohne Aktivität seit N Sekunden werden beendet (end_idle_sessions)
+    SESSION_IDLE_TIMEOUT_SECONDS = int(os.getenv('SESSION_IDLE_TIMEOUT_SECONDS', '1800'))
+    
     # Pagination
     PAGINATION_ANALYSES_LIST = int(os.getenv('PAGINATION_ANALYSES_LIST', '20'))
     PAGINATION_BLOG_POSTS = int(os.getenv('PAGINATION_BLOG_POSTS', '12'))
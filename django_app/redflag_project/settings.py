@@ -67,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'analytics.tracking.SessionTrackingMiddleware',  # Gepuffertes Session-Tracking
     'django_ratelimit.middleware.RatelimitMiddleware',  # Rate Limiting
 ]
 
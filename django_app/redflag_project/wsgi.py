@@ -12,5 +12,8 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'redflag_project.settings')
+# Session-Tracking per Hintergrund-Thread flushen (nur im WSGI-Server, nicht in
+# manage.py-Prozessen und Tests); per Umgebung weiterhin abschaltbar
+os.environ.setdefault('SESSION_TRACKING_FLUSH_THREAD', 'True')
 
 application = get_wsgi_application()
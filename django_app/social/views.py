@@ -9,8 +9,7 @@ from django.urls import reverse
 from django.conf import settings
 from .models import SharedAnalysis
 from analyses.models import Analysis
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
+from analyses.image_generator import ShareImageGenerator
 from django.core.files.base import ContentFile
 
 
@@ -101,47 +100,9 @@ def my_shares(request):
 def generate_share_image(analysis):
     """
     Generiert OG-Image mit Score und Branding.
-    PIL/Pillow für Image-Generation.
+    Fonts und statische Teile sind prozessweit gecacht (ShareImageGenerator).
     """
-    # Image dimensions (optimal für Social Media)
-    width, height = 1200, 630
-    
-    # Create image
-    img = Image.new('RGB', (width, height), color='#1F2937')  # Tailwind gray-800
-    draw = ImageDraw.Draw(img)
-    
-    # Try to load font, fallback to default
-    try:
-        title_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 80)
-        score_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 120)
-        subtitle_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 40)
-    except:
-        title_font = ImageFont.load_default()
-        score_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-    
-    # Draw branding
-    draw.text((60, 60), "=© RedFlag Analyzer", fill='#EF4444', font=title_font)
-    
-    # Draw score
-    score = float(analysis.score_total)
-    score_color = '#10B981' if score < 2.0 else '#EF4444' if score > 3.5 else '#F59E0B'
-    draw.text((60, 200), f"{score:.1f}", fill=score_color, font=score_font)
-    
-    # Draw subtitle
-    subtitle = "Red Flag Score"
-    draw.text((60, 360), subtitle, fill='#9CA3AF', font=subtitle_font)
-    
-    # Draw CTA
-    cta = "Analysiere deine Beziehung "
-    draw.text((60, 500), cta, fill='#FFFFFF', font=subtitle_font)
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    return buffer.getvalue()
+    return ShareImageGenerator.generate_og_image(analysis)
 
 
 @login_required
@@ -0,0 +1,80 @@
+#!/bin/bash
+# Worker-Belegung pro Download im docker-compose-Stack messen
+#
+# Voraussetzung: Stack mit docker-compose.downloads.yml gestartet (Access-Log mit
+# Request-Dauer), eingeloggter User mit entsperrter Analyse.
+#
+#   ./measure_download_occupancy.sh <sessionid> <pfad> [downloads] [rate]
+#   ./measure_download_occupancy.sh abc123 /analyses/42/export/pdf/ 20 200k
+#
+# sessionid: Wert des Cookies "sessionid" aus dem Browser
+# downloads: parallele Downloads (Standard 20)
+# rate:      Bandbreite pro Client für curl --limit-rate (Standard 200k, langsamer Client)
+#
+# Einmal mit X_ACCEL_REDIRECT_PREFIX=/protected-media/ und einmal mit leerem
+# Präfix (FileResponse) starten und die Ausgaben vergleichen.
+#
+# Ohne Docker: ACCESS_LOG=<datei> auf das Access-Log eines lokal gestarteten
+# gunicorn (gleiches --access-logformat wie docker-compose.downloads.yml) und
+# BASE_URL auf gunicorn setzen. Ohne nginx davor liefert X-Accel-Redirect nur
+# den Header aus; gemessen wird dann allein die Belegung des Workers.
+set -euo pipefail
+
+SESSION_ID=${1:?sessionid fehlt}
+DOWNLOAD_PATH=${2:?Pfad fehlt, z.B. /analyses/42/export/pdf/}
+DOWNLOADS=${3:-20}
+RATE=${4:-200k}
+BASE_URL=${BASE_URL:-http://localhost:3000}
+COMPOSE="docker-compose -f docker-compose.yml -f docker-compose.downloads.yml"
+
+# Lokal ohne nginx: den Header setzen, den sonst nginx an gunicorn schickt
+SENDFILE_HEADER=()
+if [ -n "${ACCESS_LOG:-}" ] && [ -n "${X_ACCEL_REDIRECT_PREFIX:-}" ]; then
+    SENDFILE_HEADER=(-H 'X-Sendfile-Type: X-Accel-Redirect')
+fi
+
+fetch() {
+    curl -sSL -o /dev/null --cookie "sessionid=$SESSION_ID" --limit-rate "$1" "${SENDFILE_HEADER[@]}" \
+        -w '%{http_code} %{size_download} %{time_total}\n' "$BASE_URL$DOWNLOAD_PATH"
+}
+
+access_log() {
+    if [ -n "${ACCESS_LOG:-}" ]; then
+        tail -n +"$((log_start + 1))" "$ACCESS_LOG"
+    else
+        $COMPOSE logs --no-color --since "$since" web
+    fi
+}
+
+if [ -n "${ACCESS_LOG:-}" ]; then
+    echo "Modus: X_ACCEL_REDIRECT_PREFIX=${X_ACCEL_REDIRECT_PREFIX:-} (lokal, $ACCESS_LOG)"
+else
+    echo "Modus: X_ACCEL_REDIRECT_PREFIX=$($COMPOSE exec -T web printenv X_ACCEL_REDIRECT_PREFIX || true)"
+fi
+
+# Aufwärmen: Datei rendern, damit nur die Auslieferung gemessen wird
+fetch 0 >/dev/null
+
+since=$(date -u +%Y-%m-%dT%H:%M:%S)
+log_start=$( [ -n "${ACCESS_LOG:-}" ] && wc -l < "$ACCESS_LOG" || echo 0)
+sleep 1
+echo "$DOWNLOADS parallele Downloads mit $RATE/s: $BASE_URL$DOWNLOAD_PATH"
+for _ in $(seq "$DOWNLOADS"); do
+    fetch "$RATE" &
+done > /tmp/download_occupancy_clients.txt
+wait
+
+awk '{ total += $3 } END { printf "Client:  %d Downloads, %.0f Bytes, Ø %.2f s\n", NR, $2, total / NR }' \
+    /tmp/download_occupancy_clients.txt
+
+# Zeit im Worker aus dem gunicorn Access-Log (Format "occupancy METHOD PFAD STATUS BYTES SEKUNDEN"),
+# nur Auslieferungen (200) - Redirects der Share-Grafiken auf ?v=<hash> zählen nicht
+sleep 1
+access_log \
+    | grep -F "occupancy GET ${DOWNLOAD_PATH%/}" \
+    | sed 's/^.*occupancy /occupancy /' \
+    | awk '$4 == 200 { n++; total += $NF; if ($NF > max) max = $NF }
+           END {
+               if (n == 0) { print "Keine Requests im Access-Log gefunden"; exit 1 }
+               printf "Worker:  %d Requests, Ø %.1f ms, max %.1f ms belegt\n", n, total / n * 1000, max * 1000
+           }'